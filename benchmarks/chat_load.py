@@ -0,0 +1,239 @@
+"""Offline load test for /chat/business-analyst.
+
+Boots src.api.main:app in a uvicorn subprocess wired to a local fake OpenAI streaming server and
+a fake PostgREST, drives concurrent multi-turn sessions and reports latency percentiles,
+throughput and memory per stream. Nothing leaves 127.0.0.1.
+
+    python -m benchmarks.chat_load --sessions 50 --turns 3
+    python -m benchmarks.chat_load --sessions 200 --tokens 400 --json > bench.json
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+import uvicorn
+from jose import jwt
+from benchmarks.fake_services import create_fake_openai, create_fake_postgrest
+
+JWT_SECRET = "benchmark-jwt-secret"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of a process (Linux /proc, psutil elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    return 0
+
+
+async def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+def start_app(port: int, openai_port: int, postgrest_port: int, extra_env: Dict[str, str], log_path: Optional[str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.pop("REDIS_URL", None)
+    env.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "SUPABASE_URL": f"http://127.0.0.1:{postgrest_port}",
+        "SUPABASE_KEY": "benchmark-anon-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=open(log_path, "w") if log_path else subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("API did not become ready in time")
+
+
+async def run_turn(client: httpx.AsyncClient, url: str, token: str, message: str, session_id: Optional[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result = {"ttft": None, "total": None, "tokens": 0, "error": None, "session_id": session_id}
+    payload = {"message": message, "session_id": session_id}
+    async with client.stream("POST", url, json=payload, headers={"Authorization": f"Bearer {token}"}) as response:
+        if response.status_code != 200:
+            result["error"] = f"HTTP {response.status_code}"
+            await response.aread()
+            return result
+        event, data_lines = None, []
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data: "):])
+            elif line == "" and data_lines:
+                data = "\n".join(data_lines)
+                if event == "done":
+                    result["session_id"] = json.loads(data).get("session_id")
+                elif event == "error":
+                    result["error"] = data
+                else:
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    result["tokens"] += len(data.split())
+                event, data_lines = None, []
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+async def run_session(client: httpx.AsyncClient, url: str, index: int, turns: int, think_time: float) -> List[Dict[str, Any]]:
+    user_id = str(uuid.uuid4())
+    token = jwt.encode({"sub": user_id, "role": "authenticated", "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256")
+    session_id = None
+    results = []
+    for turn in range(turns):
+        result = await run_turn(client, url, token, f"Session {index} turn {turn}: how should we size the market?", session_id)
+        session_id = result["session_id"] or session_id
+        results.append(result)
+        if think_time:
+            await asyncio.sleep(think_time)
+    return results
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    openai_port, postgrest_port, app_port = free_port(), free_port(), free_port()
+    fake_openai = await start_server(
+        create_fake_openai(args.tokens, args.first_token_ms / 1000, args.token_delay_ms / 1000), openai_port
+    )
+    fake_postgrest = await start_server(create_fake_postgrest(args.db_latency_ms / 1000), postgrest_port)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    app_process = start_app(app_port, openai_port, postgrest_port, extra_env, args.app_log)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await wait_until_ready(base_url)
+        baseline_rss = rss_bytes(app_process.pid)
+        peak_rss = baseline_rss
+        sampling = True
+
+        async def sample_memory():
+            nonlocal peak_rss
+            while sampling:
+                peak_rss = max(peak_rss, rss_bytes(app_process.pid))
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(sample_memory())
+        limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+            sessions = await asyncio.gather(*[
+                run_session(client, f"{base_url}/chat/business-analyst", i, args.turns, args.think_ms / 1000)
+                for i in range(args.sessions)
+            ])
+        elapsed = time.perf_counter() - started
+        sampling = False
+        await sampler
+    finally:
+        app_process.terminate()
+        # Keep the fakes serving while the API drains its write-behind queue on shutdown
+        await asyncio.to_thread(app_process.wait, 60)
+        fake_openai.should_exit = True
+        fake_postgrest.should_exit = True
+
+    turns = [turn for session in sessions for turn in session]
+    ok = [turn for turn in turns if turn["error"] is None]
+    ttfts = [turn["ttft"] for turn in ok if turn["ttft"] is not None]
+    totals = [turn["total"] for turn in ok if turn["total"] is not None]
+    tokens = sum(turn["tokens"] for turn in ok)
+    return {
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "requests": len(turns),
+        "errors": len(turns) - len(ok),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "throughput_tokens_per_s": tokens / elapsed if elapsed else 0.0,
+        "ttft_s": {p: percentile(ttfts, p) for p in (50, 95, 99)},
+        "total_s": {p: percentile(totals, p) for p in (50, 95, 99)},
+        "ttft_mean_s": statistics.mean(ttfts) if ttfts else None,
+        "rss_baseline_mb": baseline_rss / 2 ** 20,
+        "rss_peak_mb": peak_rss / 2 ** 20,
+        "memory_per_stream_kb": (peak_rss - baseline_rss) / 1024 / max(args.sessions, 1),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:8.1f} ms"
+
+    print(f"requests        {report['requests']} ({report['errors']} errors) in {report['elapsed_s']:.2f}s")
+    print(f"throughput      {report['throughput_rps']:.1f} req/s, {report['throughput_tokens_per_s']:.0f} tokens/s")
+    for label, key in (("ttft", "ttft_s"), ("total", "total_s")):
+        values = report[key]
+        print(f"{label:<15} p50 {ms(values[50])}  p95 {ms(values[95])}  p99 {ms(values[99])}")
+    print(f"memory          baseline {report['rss_baseline_mb']:.1f} MB, peak {report['rss_peak_mb']:.1f} MB, "
+          f"{report['memory_per_stream_kb']:.1f} KB/stream")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test for the business-analyst chat endpoint")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per fake LLM response")
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="fake LLM time to first token")
+    parser.add_argument("--token-delay-ms", type=float, default=10.0, help="fake LLM delay between tokens")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="fake PostgREST latency per request")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between turns of a session")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra settings for the API process")
+    parser.add_argument("--app-log", help="write the API process output to this file")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Local stand-ins for OpenAI and Supabase PostgREST used by the benchmark harness.
+
+Both are small FastAPI apps that run on 127.0.0.1, so a benchmark never touches the network.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+def create_fake_openai(tokens_per_response: int = 200, first_token_delay: float = 0.2, token_delay: float = 0.01) -> FastAPI:
+    """OpenAI-compatible /v1/chat/completions that streams a fixed number of tokens"""
+    app = FastAPI()
+
+    def completion_chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = [f"token{i} " for i in range(tokens_per_response)]
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_delay)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": tokens_per_response, "total_tokens": tokens_per_response},
+            })
+
+        async def stream():
+            await asyncio.sleep(first_token_delay)
+            yield completion_chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for word in words:
+                yield completion_chunk(completion_id, model, {"content": word})
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield completion_chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def _matches(row: Dict[str, Any], column: str, condition: str) -> bool:
+    operator, _, value = condition.partition(".")
+    actual = row.get(column)
+    if operator == "is":
+        return actual is None if value == "null" else str(actual).lower() == value
+    if operator == "in":
+        return str(actual) in value.strip("()").split(",")
+    rendered = str(actual).lower() if isinstance(actual, bool) else str(actual)
+    return {
+        "eq": rendered == value,
+        "neq": rendered != value,
+        "gt": rendered > value,
+        "gte": rendered >= value,
+        "lt": rendered < value,
+        "lte": rendered <= value,
+    }.get(operator, True)
+
+
+def create_fake_postgrest(latency: float = 0.005) -> FastAPI:
+    """In-memory PostgREST subset: eq/range filters, select, order, limit, bulk insert and upsert"""
+    app = FastAPI()
+    tables: Dict[str, List[Dict[str, Any]]] = {}
+    app.state.tables = tables
+    counter = {"id": 0}
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        await asyncio.sleep(latency)
+        rows = tables.get(table, [])
+        reserved = {"select", "order", "limit", "offset", "or", "and"}
+        for column, condition in request.query_params.multi_items():
+            if column not in reserved:
+                rows = [row for row in rows if _matches(row, column, condition)]
+        order = request.query_params.get("order")
+        if order:
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                rows = sorted(rows, key=lambda row: str(row.get(column)), reverse=direction == "desc")
+        offset = int(request.query_params.get("offset", 0))
+        limit = request.query_params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+        columns = request.query_params.get("select")
+        if columns and columns != "*":
+            wanted = columns.split(",")
+            rows = [{column: row.get(column) for column in wanted} for row in rows]
+        return rows
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        await asyncio.sleep(latency)
+        payload = await request.json()
+        rows = payload if isinstance(payload, list) else [payload]
+        stored = tables.setdefault(table, [])
+        conflict = request.query_params.get("on_conflict")
+        for row in rows:
+            row = dict(row)
+            if conflict:
+                keys = conflict.split(",")
+                existing = next((r for r in stored if all(r.get(k) == row.get(k) for k in keys)), None)
+                if existing is not None:
+                    existing.update(row)
+                    continue
+            counter["id"] += 1
+            row.setdefault("id", counter["id"])
+            stored.append(row)
+        if "return=minimal" in request.headers.get("prefer", ""):
+            return Response(status_code=201)
+        return JSONResponse(rows, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        await asyncio.sleep(latency)
+        changes = await request.json()
+        rows = tables.get(table, [])
+        for column, condition in request.query_params.multi_items():
+            rows = [row for row in rows if _matches(row, column, condition)]
+        for row in rows:
+            row.update(changes)
+        return rows
+
+    return app
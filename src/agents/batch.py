@@ -0,0 +1,303 @@
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Set
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import json
+import logging
+import time
+import uuid
+from langchain.schema import BaseMessage, HumanMessage
+from src.agents.business_analyst import BusinessAnalystAgent, get_business_analyst
+from src.config.settings import settings
+from src.memory.memory_manager import MemoryManager, get_memory_manager
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchChatRunner:
+    """Answers many independent business-analyst prompts for offline jobs.
+
+    Prompts go through the model's batch path with at most max_concurrency in flight and
+    results are yielded in completion order. Every prompt is a one-turn exchange that starts
+    a new session, unless the item names one: then the session's history and summary are
+    loaded into the prompt like a chat turn. Items are answered concurrently, so two items of
+    one session don't see each other. The user and assistant rows are written with bulk
+    inserts of insert_size rows, off the result path; once rows of a continued session are
+    in, the agent's cached state for it (history cache, graph checkpoint) is brought up to date.
+    """
+
+    def __init__(
+        self,
+        agent: Optional[BusinessAnalystAgent] = None,
+        max_concurrency: Optional[int] = None,
+        insert_size: Optional[int] = None,
+    ):
+        self.agent = agent or get_business_analyst()
+        self.max_concurrency = max_concurrency or settings.BATCH_LLM_CONCURRENCY
+        self.insert_size = insert_size or settings.BATCH_INSERT_SIZE
+        self._jobs = set()
+
+    async def run(
+        self,
+        items: List[Dict[str, Any]],
+        user_id: str,
+        jwt_token: str,
+        memory: Optional[MemoryManager] = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield one result per item as it finishes, then a final summary with "done": true"""
+        started_at = time.perf_counter()
+        memory = memory or self.agent.memory
+        session_ids = [item.get("session_id") or str(uuid.uuid4()) for item in items]
+        continued = {item["session_id"] for item in items if item.get("session_id")}
+        if self.agent.retrieval is not None:
+            # Concurrent searches share embedding batches in the retrieval service
+            contexts = await asyncio.gather(*(self.agent.get_document_context(item["message"]) for item in items))
+        else:
+            contexts = [""] * len(items)
+        prompts = await asyncio.gather(*(
+            self._prompt(item, context, user_id, jwt_token, memory) for item, context in zip(items, contexts)
+        ))
+
+        rows: List[Dict[str, Any]] = []
+        writes: List[asyncio.Task] = []
+        completed = failed = 0
+        async for index, message in self.agent.llm.abatch_as_completed(prompts, max_concurrency=self.max_concurrency):
+            item = items[index]
+            result = {"index": index, "custom_id": item.get("custom_id"), "session_id": session_ids[index]}
+            if isinstance(message, Exception):
+                failed += 1
+                metrics.BATCH_CHAT_ITEMS.labels(outcome="error").inc()
+                result["error"] = str(message)
+                yield result
+                continue
+            completed += 1
+            metrics.BATCH_CHAT_ITEMS.labels(outcome="success").inc()
+            result["response"] = message.content
+            new_session = not item.get("session_id")
+            rows.append(self.agent.conversation_row(
+                session_ids[index], user_id, {"role": "user", "content": item["message"]}, is_first_message=new_session
+            ))
+            rows.append(self.agent.conversation_row(
+                session_ids[index], user_id, {"role": "assistant", "content": message.content}
+            ))
+            if len(rows) >= self.insert_size:
+                writes.append(asyncio.create_task(self._insert(rows, user_id, jwt_token, memory, continued)))
+                rows = []
+            yield result
+        if rows:
+            writes.append(asyncio.create_task(self._insert(rows, user_id, jwt_token, memory, continued)))
+        persisted = sum(await asyncio.gather(*writes))
+        yield {
+            "done": True,
+            "completed": completed,
+            "failed": failed,
+            "rows_persisted": persisted,
+            "elapsed_s": round(time.perf_counter() - started_at, 3),
+        }
+
+    async def _prompt(
+        self,
+        item: Dict[str, Any],
+        document_context: str,
+        user_id: str,
+        jwt_token: str,
+        memory: MemoryManager,
+    ) -> List[BaseMessage]:
+        system_message = self.agent.build_system_message(document_context)
+        session_id = item.get("session_id")
+        if not session_id:
+            return [system_message, HumanMessage(content=item["message"])]
+        history, summary = await asyncio.gather(
+            self.agent.get_conversation_history(session_id, user_id, jwt_token, memory=memory),
+            self.agent.get_session_summary(session_id, user_id, jwt_token, memory=memory)
+        )
+        # Turns that overflow the window are folded into the summary by the session's next chat turn
+        messages, _ = self.agent.context_builder.build(system_message, history, item["message"], summary)
+        return messages
+
+    async def _insert(
+        self,
+        rows: List[Dict[str, Any]],
+        user_id: str,
+        jwt_token: str,
+        memory: MemoryManager,
+        continued: Set[str],
+    ) -> int:
+        try:
+            await memory.store_long_term(table="conversations", data=rows, jwt_token=jwt_token, return_representation=False)
+        except Exception as e:
+            logger.error(f"Bulk insert of {len(rows)} batch conversation rows failed: {str(e)}")
+            return 0
+        sessions: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            if row["session_id"] in continued:
+                sessions.setdefault(row["session_id"], []).append(
+                    {"role": row["role"], "content": row["content"], "created_at": row["created_at"]}
+                )
+        for session_id, messages in sessions.items():
+            try:
+                await self.agent.sync_session(session_id, user_id, messages, memory=memory)
+            except Exception as e:
+                logger.warning(f"Refreshing session {session_id} after a batch insert failed: {str(e)}")
+        return len(rows)
+
+    async def start_job(
+        self,
+        jobs: "BatchJobStore",
+        items: List[Dict[str, Any]],
+        user_id: str,
+        jwt_token: str,
+        memory: Optional[MemoryManager] = None,
+        on_finish: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Run a batch in the background, recording progress and results in jobs.
+
+        on_finish is awaited once the job has ended, however it ended.
+        """
+        # Taken before the first await so the tenant's pool can't be evicted before the job starts
+        release = memory.hold() if memory is not None else None
+        try:
+            job = await jobs.create(user_id, len(items))
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+
+        async def execute():
+            try:
+                await jobs.update(job["job_id"], status="running")
+                async for result in self.run(items, user_id, jwt_token, memory=memory):
+                    if result.get("done"):
+                        await jobs.update(job["job_id"], status="completed", rows_persisted=result["rows_persisted"])
+                    else:
+                        await jobs.add_result(job["job_id"], result)
+            except Exception as e:
+                logger.error(f"Batch job {job['job_id']} failed: {str(e)}")
+                await jobs.update(job["job_id"], status="failed", error=str(e))
+            finally:
+                if on_finish is not None:
+                    await asyncio.shield(on_finish())
+
+        task = asyncio.create_task(execute())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+        if release is not None:
+            # Runs even if the job is cancelled before it starts
+            task.add_done_callback(lambda _: release())
+        return job
+
+    async def aclose(self) -> None:
+        """Cancel jobs still running at shutdown; their status stays "running" until it expires"""
+        for task in list(self._jobs):
+            task.cancel()
+        if self._jobs:
+            await asyncio.gather(*self._jobs, return_exceptions=True)
+
+
+class BatchJobStore:
+    """Status and results of async batch jobs.
+
+    With Redis every worker can answer a poll for a job another worker is running: the
+    counters live in a hash and results in a list appended once per result. Without Redis
+    jobs are kept in-process, up to max_local_jobs, so poll the worker that accepted the job.
+    """
+
+    def __init__(self, redis_client=None, ttl: Optional[int] = None, max_local_jobs: Optional[int] = None):
+        self.redis = redis_client
+        self.ttl = ttl or settings.BATCH_JOB_TTL
+        self.max_local_jobs = max_local_jobs or settings.BATCH_MAX_LOCAL_JOBS
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        return f"batch_job:{job_id}"
+
+    async def create(self, user_id: str, total: int) -> Dict[str, Any]:
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": "queued",
+            "total": total,
+            "completed": 0,
+            "failed": 0,
+            "rows_persisted": 0,
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if self.redis is not None:
+            key = self.key(job["job_id"])
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={name: json.dumps(value) for name, value in job.items()})
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        else:
+            self._local[job["job_id"]] = dict(job, results=[])
+            while len(self._local) > self.max_local_jobs:
+                self._local.popitem(last=False)
+        return job
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if self.redis is not None:
+            await self.redis.hset(self.key(job_id), mapping={name: json.dumps(value) for name, value in fields.items()})
+        elif job_id in self._local:
+            self._local[job_id].update(fields)
+
+    async def add_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        counter = "failed" if "error" in result else "completed"
+        if self.redis is not None:
+            key = self.key(job_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(f"{key}:results", json.dumps(result))
+                pipe.hincrby(key, counter, 1)
+                pipe.expire(f"{key}:results", self.ttl)
+                await pipe.execute()
+        elif job_id in self._local:
+            job = self._local[job_id]
+            job["results"].append(result)
+            job[counter] += 1
+
+    async def get(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """The job's status plus results[offset:offset + limit] in completion order, or None"""
+        if self.redis is not None:
+            key = self.key(job_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(key)
+                pipe.lrange(f"{key}:results", offset, offset + limit - 1)
+                raw, results = await pipe.execute()
+            if not raw:
+                return None
+            # Counters bumped by hincrby are still valid JSON
+            job = {name: json.loads(value) for name, value in raw.items()}
+            job["results"] = [json.loads(result) for result in results]
+            return job
+        job = self._local.get(job_id)
+        if job is None:
+            return None
+        return dict(job, results=job["results"][offset:offset + limit])
+
+
+_batch_runner: Optional[BatchChatRunner] = None
+_batch_jobs: Optional[BatchJobStore] = None
+
+
+def get_batch_runner() -> BatchChatRunner:
+    """Process-wide batch runner over the shared business-analyst agent"""
+    global _batch_runner
+    if _batch_runner is None:
+        _batch_runner = BatchChatRunner()
+    return _batch_runner
+
+
+def get_batch_jobs() -> BatchJobStore:
+    """Process-wide job store sharing the memory manager's Redis client"""
+    global _batch_jobs
+    if _batch_jobs is None:
+        _batch_jobs = BatchJobStore(get_memory_manager().redis_client)
+    return _batch_jobs
+
+
+async def close_batch_runner() -> None:
+    if _batch_runner is not None:
+        await _batch_runner.aclose()
@@ -1,23 +1,44 @@
-from typing import AsyncGenerator, Dict, Any
-from langchain_community.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from src.memory.memory_manager import memory_manager
+from typing import AsyncGenerator, Dict, Any, List, Optional, Tuple
+from langchain.schema import SystemMessage
+from langchain_core.messages import AIMessage
+from src.agents.tools import ToolExecutor, build_tools, parse_tool_calls
+from src.memory.memory_manager import MemoryManager, get_memory_manager, tenant_of
+from src.memory.history_cache import HistoryCache, get_history_cache
+from src.memory.write_behind import WriteBehindQueue, get_write_behind
+from src.memory.context_builder import ContextBuilder, get_context_builder
+from src.llm.response_cache import ResponseCache, cache_key, get_response_cache
+from src.llm.single_flight import single_flight
+from src.retrieval.service import RetrievalService, format_context, get_retrieval_service
+from src.llm.router import create_router
 from src.config.settings import settings
+from src.monitoring import metrics
+from src.monitoring.structured_logging import bind, payload_fields, sampled, unbind
+import asyncio
 import json
+import logging
+import time
 from datetime import datetime
-import traceback
+
+logger = logging.getLogger(__name__)
 
 class BusinessAnalystAgent:
-    def __init__(self):
+    def __init__(
+        self,
+        memory: Optional[MemoryManager] = None,
+        history_cache: Optional[HistoryCache] = None,
+        write_behind: Optional[WriteBehindQueue] = None,
+        context_builder: Optional[ContextBuilder] = None,
+        response_cache: Optional[ResponseCache] = None,
+        retrieval: Optional[RetrievalService] = None,
+        tools: Optional[ToolExecutor] = None,
+    ):
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is not set in environment variables")
             
-        self.llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.7,
-            streaming=True,
-            api_key=settings.OPENAI_API_KEY
-        )
+        self.model_name = "gpt-4o"
+        self.llm_params = {"temperature": 0.7}
+        # Router with per-provider adaptive concurrency and pre-first-token failover
+        self.llm = create_router(self.model_name, **self.llm_params)
         
         self.system_message = SystemMessage(content="""You are an experienced Business Analyst Consultant. 
         Your role is to help clients understand their business needs, analyze problems, and propose solutions.
@@ -27,107 +48,348 @@ class BusinessAnalystAgent:
         - Explain complex concepts in simple terms
         - Be professional but conversational
         - Focus on practical, actionable advice""")
+        self.memory = memory or get_memory_manager()
+        self.history_cache = history_cache or get_history_cache()
+        self.write_behind = write_behind or get_write_behind()
+        self.context_builder = context_builder or get_context_builder()
+        self.response_cache = response_cache or get_response_cache()
+        self.retrieval = retrieval or (get_retrieval_service() if settings.RETRIEVAL_ENABLED else None)
+        if tools is None and settings.AGENT_TOOLS:
+            available = build_tools(settings.AGENT_TOOLS)
+            # An empty tool list is rejected by the API, so without any tool the agent just chats
+            tools = ToolExecutor(available) if available else None
+        self.tools = tools
+        self._summaries_in_progress = set()
+        self._background_tasks = set()
+
+    async def aclose(self) -> None:
+        """Let background summary updates finish before shutdown"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self.tools is not None:
+            self.tools.close()
 
-    async def get_conversation_history(self, session_id: str, user_id: str, jwt_token: str) -> list:
-        """Retrieve conversation history from Supabase"""
+    async def get_conversation_history(self, session_id: str, user_id: str, jwt_token: str, memory: Optional[MemoryManager] = None) -> list:
+        """Retrieve the most recent messages from the hot cache, falling back to Supabase"""
+        cached = await self.history_cache.get(user_id, session_id, tenant_of(memory))
+        if cached is not None:
+            return cached
         try:
-            history = await memory_manager.get_long_term(
+            # Newest first so the limit keeps the latest turns, then flip back to chronological order
+            rows = await (memory or self.memory).get_long_term(
                 table="conversations",
                 query={
                     "session_id": session_id,
                     "user_id": user_id,
                     "is_archived": False
                 },
-                jwt_token=jwt_token
+                jwt_token=jwt_token,
+                select="role,content,created_at",
+                order="created_at.desc,id.desc",
+                limit=self.history_cache.max_messages
             )
-            return history if history else []
+            history = [
+                {"role": msg["role"], "content": msg["content"], "created_at": msg.get("created_at")}
+                for msg in reversed(rows or [])
+            ]
+            if history:
+                await self.history_cache.set(user_id, session_id, history, tenant_of(memory))
+            return history
         except Exception as e:
-            print(f"Error retrieving conversation history: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception(f"Error retrieving conversation history: {str(e)}")
             return []
 
-    async def save_conversation(self, session_id: str, user_id: str, message: Dict[str, Any], jwt_token: str, is_first_message: bool = False):
-        """Save conversation to Supabase"""
-        try:
-            metadata = {
-                "message_type": "text",
-                "formatting": "markdown",
-                "is_first_message": is_first_message
-            }
-            title = None
-            if is_first_message:
-                title = message["content"][:100] + "..." if len(message["content"]) > 100 else message["content"]
-            data_to_insert = {
+    async def get_history_page(self, session_id: str, user_id: str, jwt_token: str, before: Optional[Tuple[str, Any]] = None, limit: int = 50, memory: Optional[MemoryManager] = None) -> Dict[str, Any]:
+        """Page backwards through a session's history using a (created_at, id) keyset cursor"""
+        rows = await (memory or self.memory).get_long_term(
+            table="conversations",
+            query={
                 "session_id": session_id,
                 "user_id": user_id,
+                "is_archived": False
+            },
+            jwt_token=jwt_token,
+            select="id,role,content,created_at",
+            order="created_at.desc,id.desc",
+            limit=limit,
+            before=before
+        )
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]}
+        return {"messages": list(reversed(rows)), "next_cursor": next_cursor}
+
+    async def get_session_summary(self, session_id: str, user_id: str, jwt_token: str, memory: Optional[MemoryManager] = None) -> Dict[str, Any]:
+        """Retrieve the rolling summary of turns that no longer fit in the context window"""
+        try:
+            return await self.context_builder.summary_store.get(user_id, session_id, jwt_token, memory=memory)
+        except Exception as e:
+            logger.warning(f"Error retrieving session summary: {str(e)}")
+            return {"summary": "", "summarized_until": None}
+
+    async def sync_session(self, session_id: str, user_id: str, messages: List[Dict[str, Any]], memory: Optional[MemoryManager] = None) -> None:
+        """Bring cached session state up to date with messages written without save_conversation"""
+        # The next read refills from Supabase, where the messages now are
+        await self.history_cache.invalidate(user_id, session_id, tenant_of(memory))
+
+    async def get_document_context(self, user_input: str) -> str:
+        """Excerpts from the indexed client documents that match the question, if retrieval is on"""
+        if self.retrieval is None:
+            return ""
+        try:
+            return format_context(await self.retrieval.search(user_input))
+        except Exception as e:
+            logger.warning(f"Error retrieving documents: {str(e)}")
+            return ""
+
+    def build_system_message(self, document_context: str = "") -> SystemMessage:
+        """The analyst persona, plus matching document excerpts when there are any"""
+        if not document_context:
+            return self.system_message
+        return SystemMessage(
+            content=f"{self.system_message.content}\n\nRelevant excerpts from the client's documents:\n{document_context}"
+        )
+
+    def schedule_summary_update(self, session_id: str, user_id: str, jwt_token: str, summary: Dict[str, Any], overflow: list, memory: Optional[MemoryManager] = None):
+        """Update the session summary in the background, at most one update per session at a time"""
+        key = (user_id, session_id)
+        if key in self._summaries_in_progress:
+            return
+        self._summaries_in_progress.add(key)
+        # The tenant's manager must outlive the request that scheduled the update
+        release = memory.hold() if memory is not None else None
+
+        async def update():
+            try:
+                await self.context_builder.fold_into_summary(user_id, session_id, jwt_token, summary, overflow, memory=memory)
+            except Exception as e:
+                logger.warning(f"Error updating session summary: {str(e)}")
+            finally:
+                self._summaries_in_progress.discard(key)
+                if release is not None:
+                    release()
+
+        task = asyncio.create_task(update())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def conversation_row(session_id: str, user_id: str, message: Dict[str, Any], is_first_message: bool = False) -> Dict[str, Any]:
+        """A conversations table row for one message"""
+        metadata = {
+            "message_type": "text",
+            "formatting": "markdown",
+            "is_first_message": is_first_message
+        }
+        if message.get("interrupted"):
+            # The generation was cancelled part-way; content is what had been streamed
+            metadata["interrupted"] = True
+        title = None
+        if is_first_message:
+            title = message["content"][:100] + "..." if len(message["content"]) > 100 else message["content"]
+        return {
+            "session_id": session_id,
+            "user_id": user_id,
+            "role": message["role"],
+            "content": message["content"],
+            "title": title,
+            # Structured so it lands in the jsonb column as an object, not a quoted string
+            "metadata": metadata,
+            "created_at": datetime.utcnow().isoformat(),
+            "last_updated_at": datetime.utcnow().isoformat()
+        }
+
+    async def save_conversation(self, session_id: str, user_id: str, message: Dict[str, Any], jwt_token: str, is_first_message: bool = False, durable: Optional[bool] = None, memory: Optional[MemoryManager] = None):
+        """Save conversation to Supabase, either awaiting the insert (durable) or enqueueing it (fast)"""
+        if durable is None:
+            durable = settings.CONVERSATION_WRITE_MODE == "durable"
+        try:
+            data_to_insert = self.conversation_row(session_id, user_id, message, is_first_message)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Saving conversation message", extra={
+                    "role": message["role"], "durable": durable, **payload_fields("content", message["content"])
+                })
+            await self.write_behind.enqueue(
+                table="conversations",
+                row=data_to_insert,
+                jwt_token=jwt_token,
+                durable=durable,
+                memory=memory
+            )
+            # Write through so the next turn is served from the cache
+            cached_message = {
                 "role": message["role"],
                 "content": message["content"],
-                "title": title,
-                "metadata": json.dumps(metadata),
-                "created_at": datetime.utcnow().isoformat(),
-                "last_updated_at": datetime.utcnow().isoformat()
+                "created_at": data_to_insert["created_at"]
             }
-            print(f"[save_conversation] Inserting data: {data_to_insert}")
-            await memory_manager.store_long_term(
-                table="conversations",
-                data=data_to_insert,
-                jwt_token=jwt_token
-            )
+            if is_first_message:
+                await self.history_cache.set(user_id, session_id, [cached_message], tenant_of(memory))
+            else:
+                await self.history_cache.append(user_id, session_id, cached_message, tenant_of(memory))
         except Exception as e:
-            print(f"Error saving conversation: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception(f"Error saving conversation: {str(e)}")
+
+    async def stream_completion(self, messages: list, tenant: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Stream the answer for a message list, replaying it from the response cache when possible.
+
+        tenant keeps cached and shared answers within one Supabase project.
+        """
+        if self.tools is not None:
+            # Tool results (web search above all) make answers unrepeatable, so neither cache applies
+            async for content in self._stream_with_tools(messages):
+                yield content
+            return
+        if self.response_cache is not None:
+            cached = await self.response_cache.lookup(self.model_name, self.llm_params, messages, tenant)
+            if cached is not None:
+                async for content in self.response_cache.replay(cached):
+                    yield content
+                return
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            async for content in self._generate_and_cache(messages, tenant):
+                yield content
+            return
+        # Identical concurrent requests share one upstream generation
+        key = cache_key(self.model_name, self.llm_params, messages, tenant)
+        async for content in single_flight.stream(key, lambda: self._generate_and_cache(messages, tenant)):
+            yield content
+
+    async def _stream_with_tools(self, messages: list) -> AsyncGenerator[str, None]:
+        """Stream model steps, running each step's tool calls concurrently until the model answers"""
+        messages = list(messages)
+        for step in range(settings.AGENT_TOOL_MAX_STEPS):
+            # The last step gets no tools, so the model has to answer with what it has
+            kwargs = {"tools": self.tools.schemas()} if step < settings.AGENT_TOOL_MAX_STEPS - 1 else {}
+            message = None
+            async for chunk in self.llm.astream(messages, **kwargs):
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    yield chunk.content
+            tool_calls = parse_tool_calls(message)
+            if not tool_calls:
+                return
+            messages.append(AIMessage(
+                content=message.content,
+                tool_calls=[{key: call[key] for key in ("name", "args", "id", "type")} for call in tool_calls],
+                # The OpenAI wire format, which the community chat model sends back as-is
+                additional_kwargs={"tool_calls": [
+                    {"id": call["id"], "type": "function",
+                     "function": {"name": call["name"], "arguments": json.dumps(call["args"])}}
+                    for call in tool_calls
+                ]}
+            ))
+            messages.extend(await self.tools.run(tool_calls))
+
+    async def _generate_and_cache(self, messages: list, tenant: Optional[str] = None) -> AsyncGenerator[str, None]:
+        parts = []
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        # Only complete generations are cached; an interrupted stream never gets here
+        if self.response_cache is not None:
+            await self.response_cache.store(self.model_name, self.llm_params, messages, "".join(parts), tenant)
 
-    async def generate_response(self, user_input: str, session_id: str, user_id: str, jwt_token: str) -> AsyncGenerator[str, None]:
-        """Generate streaming response from the agent"""
+    async def generate_response(self, user_input: str, session_id: str, user_id: str, jwt_token: str, memory: Optional[MemoryManager] = None) -> AsyncGenerator[str, None]:
+        """Generate streaming response from the agent; memory selects the tenant's Supabase project"""
+        started_at = time.perf_counter()
+        metrics.IN_FLIGHT_STREAMS.inc()
+        log_token = bind(session_id=session_id)
+        response_parts: List[str] = []
+        answer_saved = False
         try:
-            print(f"Starting response generation for session {session_id}")
-            
-            # Get conversation history
-            history = await self.get_conversation_history(session_id, user_id, jwt_token)
-            print(f"Retrieved {len(history)} messages from history")
+            # Get conversation history, the rolling summary of older turns and matching documents
+            with metrics.HISTORY_FETCH_SECONDS.time():
+                history, summary, document_context = await asyncio.gather(
+                    self.get_conversation_history(session_id, user_id, jwt_token, memory=memory),
+                    self.get_session_summary(session_id, user_id, jwt_token, memory=memory),
+                    self.get_document_context(user_input)
+                )
             
             # Check if this is the first message
             is_first_message = len(history) == 0
             
-            # Prepare messages for the LLM
-            messages = [self.system_message]
-            
-            # Add conversation history
-            for msg in history:
-                if msg["role"] == "user":
-                    messages.append(HumanMessage(content=msg["content"]))
-                else:
-                    messages.append(SystemMessage(content=msg["content"]))
-            
-            # Add current user input
-            messages.append(HumanMessage(content=user_input))
+            # Prepare a token-bounded message list: summary + recent turns + current input
+            system_message = self.build_system_message(document_context)
+            messages, overflow = self.context_builder.build(system_message, history, user_input, summary)
             
             # Save user message
-            await self.save_conversation(session_id, user_id, {
-                "role": "user",
-                "content": user_input
-            }, jwt_token=jwt_token, is_first_message=is_first_message)
+            with metrics.USER_MESSAGE_SAVE_SECONDS.time():
+                await self.save_conversation(session_id, user_id, {
+                    "role": "user",
+                    "content": user_input
+                }, jwt_token=jwt_token, is_first_message=is_first_message, memory=memory)
             
-            print("Generating response from LLM...")
             # Generate and stream response
-            response_content = ""
-            async for chunk in self.llm.astream(messages):
-                if chunk.content:
-                    response_content += chunk.content
-                    yield chunk.content
+            first_token_at = None
+            chunk_count = 0
+            async for content in self.stream_completion(messages, tenant_of(memory)):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - started_at)
+                chunk_count += 1
+                response_parts.append(content)
+                yield content
+            if first_token_at is not None:
+                streaming_time = time.perf_counter() - first_token_at
+                if streaming_time > 0:
+                    metrics.CHUNKS_PER_SECOND.observe(chunk_count / streaming_time)
             
-            print("Saving response to database...")
             # Save agent response
-            await self.save_conversation(session_id, user_id, {
-                "role": "assistant",
-                "content": response_content
-            }, jwt_token=jwt_token)
+            with metrics.FINAL_SAVE_SECONDS.time():
+                await self.save_conversation(session_id, user_id, {
+                    "role": "assistant",
+                    "content": "".join(response_parts)
+                }, jwt_token=jwt_token, memory=memory)
+            answer_saved = True
+
+            # Fold turns that left the window into the summary, off the response path
+            if overflow:
+                self.schedule_summary_update(session_id, user_id, jwt_token, summary, overflow, memory=memory)
+            logger.info("Response generated", extra={
+                "history_messages": len(history),
+                "chunks": chunk_count,
+                "duration_s": round(time.perf_counter() - started_at, 3),
+                **sampled()
+            })
             
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned mid-answer: keep what was streamed so the session history stays whole
+            if response_parts and not answer_saved:
+                await asyncio.shield(self.save_conversation(session_id, user_id, {
+                    "role": "assistant",
+                    "content": "".join(response_parts),
+                    "interrupted": True
+                }, jwt_token=jwt_token, memory=memory))
+            raise
         except Exception as e:
-            error_message = f"Error generating response: {str(e)}"
-            print(error_message)
-            print(traceback.format_exc())
-            yield error_message
+            metrics.STREAM_ERRORS.inc()
+            logger.exception(f"Error generating response: {str(e)}")
+            # Surfaced to the client as an SSE error event
+            raise
+        finally:
+            metrics.STREAM_DURATION_SECONDS.observe(time.perf_counter() - started_at)
+            metrics.IN_FLIGHT_STREAMS.dec()
+            unbind(log_token)
+
+_business_analyst: Optional[BusinessAnalystAgent] = None
+
+
+def get_business_analyst() -> BusinessAnalystAgent:
+    """Process-wide agent for the configured engine, built on first use (normally during app startup)"""
+    global _business_analyst
+    if _business_analyst is None:
+        if settings.BUSINESS_ANALYST_ENGINE == "graph":
+            from src.agents.business_analyst_graph import BusinessAnalystGraphAgent
+            _business_analyst = BusinessAnalystGraphAgent()
+        else:
+            _business_analyst = BusinessAnalystAgent()
+    return _business_analyst
+
 
-# Create a singleton instance
-business_analyst = BusinessAnalystAgent() 
\ No newline at end of file
+async def close_business_analyst() -> None:
+    """Release the agent's resources if it was ever built"""
+    if _business_analyst is not None:
+        await _business_analyst.aclose()
+ 
\ No newline at end of file
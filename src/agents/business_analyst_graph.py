@@ -0,0 +1,317 @@
+from typing import Annotated, Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple, TypedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+import asyncio
+import logging
+import os
+import time
+import weakref
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.types import StreamWriter
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.config.settings import settings
+from src.memory.context_builder import parse_timestamp
+from src.memory.memory_manager import MemoryManager, tenant_of
+from src.monitoring import metrics
+from src.monitoring.structured_logging import bind, unbind
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class AnalystState(TypedDict):
+    # Only the turns inside the context window; older ones live on in the summary
+    messages: Annotated[List[BaseMessage], add_messages]
+    summary: str
+
+
+@asynccontextmanager
+async def open_checkpointer(backend: Optional[str] = None) -> AsyncIterator[Any]:
+    """Async LangGraph checkpointer for the configured backend"""
+    backend = backend or settings.AGENT_CHECKPOINTER
+    if backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        yield MemorySaver()
+    elif backend == "sqlite":
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        directory = os.path.dirname(settings.AGENT_CHECKPOINT_SQLITE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        async with AsyncSqliteSaver.from_conn_string(settings.AGENT_CHECKPOINT_SQLITE_PATH) as saver:
+            yield saver
+    elif backend == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+        if not settings.AGENT_CHECKPOINT_POSTGRES_URL:
+            raise ValueError("AGENT_CHECKPOINT_POSTGRES_URL must be set for the postgres checkpointer")
+        # prepare_threshold=0 keeps it working behind Supabase's transaction-mode pooler
+        async with AsyncConnectionPool(
+            settings.AGENT_CHECKPOINT_POSTGRES_URL,
+            max_size=settings.AGENT_CHECKPOINT_POOL_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        ) as pool:
+            saver = AsyncPostgresSaver(pool)
+            await saver.setup()
+            yield saver
+    else:
+        raise ValueError(f"Unknown checkpointer backend: {backend}")
+
+
+def message_to_dict(message: BaseMessage) -> Dict[str, Any]:
+    return {"role": "user" if isinstance(message, HumanMessage) else "assistant", "content": message.content}
+
+
+class BusinessAnalystGraphAgent(BusinessAnalystAgent):
+    """The business analyst as a LangGraph StateGraph with checkpointed session state.
+
+    Each session is a graph thread whose state holds the turns inside the context window
+    plus a rolling summary, so a turn loads one checkpoint instead of re-reading history
+    rows from Supabase; Supabase is only read to seed sessions that predate the graph.
+    Turns that leave the window are folded into the summary and removed from the state,
+    which keeps every checkpoint write bounded by the window rather than the session.
+    With the Postgres saver only the channels that changed in a step are written.
+    """
+
+    def __init__(self, checkpointer=None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._checkpointer = checkpointer
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._graph = None
+        self._graph_lock = asyncio.Lock()
+        # One run per thread at a time, including a summary still finishing after the stream ended
+        self._thread_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def get_graph(self):
+        """Compile the graph on first use, opening the configured checkpointer"""
+        if self._graph is None:
+            async with self._graph_lock:
+                if self._graph is None:
+                    checkpointer = self._checkpointer
+                    if checkpointer is None:
+                        self._exit_stack = AsyncExitStack()
+                        checkpointer = await self._exit_stack.enter_async_context(open_checkpointer())
+                    self._graph = self.build_graph().compile(checkpointer=checkpointer)
+        return self._graph
+
+    def build_graph(self) -> StateGraph:
+        graph = StateGraph(AnalystState)
+        graph.add_node("respond", self._respond)
+        graph.add_node("summarize", self._summarize)
+        graph.add_edge(START, "respond")
+        graph.add_conditional_edges("respond", self._route_after_respond, ["summarize", END])
+        graph.add_edge("summarize", END)
+        return graph
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._graph = None
+
+    @staticmethod
+    def thread_id(user_id: str, session_id: str, tenant: Optional[str] = None) -> str:
+        # Scoped by user so a leaked session id can't resume someone else's thread, and by tenant project
+        if tenant:
+            return f"{tenant}:{user_id}:{session_id}"
+        return f"{user_id}:{session_id}"
+
+    def _system_messages(self, summary: str, document_context: str) -> List[BaseMessage]:
+        messages = [self.build_system_message(document_context)]
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        return messages
+
+    def _split_window(self, state: AnalystState) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """(turns that no longer fit, turns that do), newest kept first"""
+        counter = self.context_builder.counter
+        messages = state["messages"]
+        budget = self.context_builder.max_tokens - counter.count_message(self.system_message.content)
+        if state.get("summary"):
+            budget -= counter.count_message(state["summary"])
+        kept = 0
+        for message in reversed(messages):
+            cost = counter.count_message(message.content)
+            # Always keep the newest message, even if it alone is over budget
+            if cost > budget and kept:
+                break
+            budget -= cost
+            kept += 1
+        return messages[:len(messages) - kept], messages[len(messages) - kept:]
+
+    async def _respond(self, state: AnalystState, config: RunnableConfig, writer: StreamWriter) -> Dict[str, Any]:
+        _, recent = self._split_window(state)
+        configurable = config.get("configurable", {})
+        document_context = configurable.get("document_context", "")
+        messages = self._system_messages(state.get("summary", ""), document_context) + recent
+        parts = []
+        async for content in self.stream_completion(messages, configurable.get("tenant")):
+            parts.append(content)
+            writer(content)
+        return {"messages": [AIMessage(content="".join(parts))]}
+
+    def _route_after_respond(self, state: AnalystState) -> str:
+        overflow, _ = self._split_window(state)
+        return "summarize" if overflow else END
+
+    async def _summarize(self, state: AnalystState) -> Dict[str, Any]:
+        overflow, _ = self._split_window(state)
+        summary = await self.context_builder.summarize(
+            state.get("summary", ""), [message_to_dict(message) for message in overflow]
+        )
+        return {"summary": summary, "messages": [RemoveMessage(id=message.id) for message in overflow]}
+
+    async def _append_to_thread(self, thread_id: str, messages: List[BaseMessage]) -> None:
+        """Record messages that did not come out of a graph run, so the thread's next turn sees them"""
+        graph = await self.get_graph()
+        config = {"configurable": {"thread_id": thread_id}}
+        async with self._thread_locks.setdefault(thread_id, asyncio.Lock()):
+            snapshot = await graph.aget_state(config)
+            # Threads without a checkpoint are seeded from Supabase, which already has the messages
+            if not snapshot.values:
+                return
+            # As if written by the last step, so nothing is left pending for the next run
+            await graph.aupdate_state(config, {"messages": messages}, as_node="summarize")
+
+    async def sync_session(self, session_id: str, user_id: str, messages: List[Dict[str, Any]], memory: Optional[MemoryManager] = None) -> None:
+        await super().sync_session(session_id, user_id, messages, memory=memory)
+        thread_id = self.thread_id(user_id, session_id, tenant_of(memory))
+        await self._append_to_thread(thread_id, [self.context_builder.to_message(message) for message in messages])
+
+    async def _keep_partial_answer(self, turn: asyncio.Task, thread_id: str, content: str, add_to_thread: bool,
+                                   session_id: str, user_id: str, jwt_token: str,
+                                   memory: Optional[MemoryManager]) -> None:
+        """Save a cancelled turn's partial answer, and put it in the thread so its question isn't left unanswered"""
+        await self.save_conversation(session_id, user_id, {
+            "role": "assistant",
+            "content": content,
+            "interrupted": True
+        }, jwt_token=jwt_token, memory=memory)
+        if not add_to_thread:
+            return
+        # The cancelled turn holds the thread lock until it has unwound
+        await asyncio.gather(turn, return_exceptions=True)
+        try:
+            await self._append_to_thread(thread_id, [AIMessage(content=content)])
+        except Exception as e:
+            logger.warning(f"Failed to add the interrupted answer to thread {thread_id}: {str(e)}")
+
+    async def _seed_input(self, graph, config: RunnableConfig, session_id: str, user_id: str, jwt_token: str,
+                          memory: Optional[MemoryManager]) -> Tuple[Dict[str, Any], bool]:
+        """Graph input for this turn; sessions without a checkpoint are seeded from Supabase once"""
+        snapshot = await graph.aget_state(config)
+        if snapshot.values:
+            return {}, False
+        history, summary = await asyncio.gather(
+            self.get_conversation_history(session_id, user_id, jwt_token, memory=memory),
+            self.get_session_summary(session_id, user_id, jwt_token, memory=memory)
+        )
+        # Turns the stored summary already covers stay out of the state
+        summarized_until = parse_timestamp(summary.get("summarized_until"))
+        seeded = [
+            self.context_builder.to_message(message) for message in history
+            if summarized_until is None or (parse_timestamp(message.get("created_at")) or summarized_until) > summarized_until
+        ]
+        return {"messages": seeded, "summary": summary.get("summary") or ""}, not history
+
+    async def generate_response(self, user_input: str, session_id: str, user_id: str, jwt_token: str, memory: Optional[MemoryManager] = None) -> AsyncGenerator[str, None]:
+        """Stream one turn through the graph; summarizing continues after the answer is delivered"""
+        started_at = time.perf_counter()
+        metrics.IN_FLIGHT_STREAMS.inc()
+        log_token = bind(session_id=session_id)
+        thread_id = self.thread_id(user_id, session_id, tenant_of(memory))
+        lock = self._thread_locks.setdefault(thread_id, asyncio.Lock())
+        queue: asyncio.Queue = asyncio.Queue()
+        response_parts: List[str] = []
+        # responded: the answer is in the checkpoint; answered: it is saved to Supabase too
+        responded = answered = False
+        task = None
+        try:
+            graph = await self.get_graph()
+            with metrics.HISTORY_FETCH_SECONDS.time():
+                document_context = await self.get_document_context(user_input)
+            config = {"configurable": {
+                "thread_id": thread_id, "document_context": document_context, "tenant": tenant_of(memory)
+            }}
+
+            async def run_turn():
+                nonlocal responded, answered
+                try:
+                    async with lock:
+                        with metrics.HISTORY_FETCH_SECONDS.time():
+                            graph_input, is_first_message = await self._seed_input(
+                                graph, config, session_id, user_id, jwt_token, memory
+                            )
+                        graph_input.setdefault("messages", []).append(HumanMessage(content=user_input))
+                        with metrics.USER_MESSAGE_SAVE_SECONDS.time():
+                            await self.save_conversation(session_id, user_id, {
+                                "role": "user",
+                                "content": user_input
+                            }, jwt_token=jwt_token, is_first_message=is_first_message, memory=memory)
+                        async for mode, chunk in graph.astream(graph_input, config, stream_mode=["custom", "updates"]):
+                            if mode == "custom":
+                                await queue.put(("token", chunk))
+                            elif "respond" in chunk:
+                                responded = True
+                                # Saved here rather than by the consumer, so a dropped client still gets its answer recorded
+                                with metrics.FINAL_SAVE_SECONDS.time():
+                                    await self.save_conversation(session_id, user_id, {
+                                        "role": "assistant",
+                                        "content": chunk["respond"]["messages"][-1].content
+                                    }, jwt_token=jwt_token, memory=memory)
+                                answered = True
+                                await queue.put(("answer", None))
+                except Exception as e:
+                    await queue.put(("error", e))
+                finally:
+                    await queue.put((_DONE, None))
+
+            task = asyncio.create_task(run_turn())
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+            first_token_at = None
+            chunk_count = 0
+            while True:
+                kind, value = await queue.get()
+                if kind == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - started_at)
+                    chunk_count += 1
+                    response_parts.append(value)
+                    yield value
+                elif kind == "answer":
+                    # The summarize step, if any, finishes in the background under the thread lock
+                    break
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+            if first_token_at is not None:
+                streaming_time = time.perf_counter() - first_token_at
+                if streaming_time > 0:
+                    metrics.CHUNKS_PER_SECOND.observe(chunk_count / streaming_time)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned mid-answer: stop the model and keep what was streamed
+            if task is not None and not answered:
+                task.cancel()
+                if response_parts:
+                    await asyncio.shield(self._keep_partial_answer(
+                        task, thread_id, "".join(response_parts), not responded,
+                        session_id, user_id, jwt_token, memory
+                    ))
+            raise
+        except Exception as e:
+            metrics.STREAM_ERRORS.inc()
+            logger.exception(f"Error generating response: {str(e)}")
+            raise
+        finally:
+            metrics.STREAM_DURATION_SECONDS.observe(time.perf_counter() - started_at)
+            metrics.IN_FLIGHT_STREAMS.dec()
+            unbind(log_token)
@@ -0,0 +1,200 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional, TypedDict
+import logging
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import StreamWriter
+from src.config.settings import settings
+from src.llm.router import create_chat_model, create_router
+from src.retrieval.service import RetrievalService, get_retrieval_service
+
+logger = logging.getLogger(__name__)
+
+GRADE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a grader assessing relevance of a retrieved document to a user question.
+    If the document contains keyword(s) or semantic meaning related to the question, grade it as relevant.
+    Answer with a single word, 'yes' or 'no', to indicate whether the document is relevant to the question."""),
+    ("human", "Retrieved document: \n\n {document} \n\n User question: {question}"),
+])
+
+REWRITE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You a question re-writer that converts an input question to a better version that is optimized
+    for web search. Look at the input and try to reason about the underlying semantic intent / meaning.
+    Reply with the improved question only."""),
+    ("human", "Here is the initial question: \n\n {question} \n Formulate an improved question."),
+])
+
+# rlm/rag-prompt, inlined so serving does not depend on the LangChain hub
+RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
+Question: {question}
+Context: {context}
+Answer:"""),
+])
+
+
+class CragState(TypedDict, total=False):
+    question: str
+    # Retrieved chunks that passed grading
+    documents: List[Document]
+    # True when any retrieved chunk was graded irrelevant (or none were found)
+    web_search: bool
+    search_query: str
+    web_documents: List[Document]
+    generation: str
+
+
+def search_results_to_documents(results: Any) -> List[Document]:
+    """Normalize a search tool's output (text, or a list of result dicts) to Documents"""
+    if not results:
+        return []
+    if isinstance(results, str):
+        return [Document(page_content=results, metadata={"source": "web"})]
+    documents = []
+    for result in results:
+        if isinstance(result, str):
+            documents.append(Document(page_content=result, metadata={"source": "web"}))
+            continue
+        content = result.get("content") or result.get("snippet") or ""
+        documents.append(Document(page_content=content, metadata={"source": result.get("link") or result.get("url") or "web"}))
+    return documents
+
+
+def is_relevant(grade: Any) -> bool:
+    return isinstance(grade, str) and grade.strip().strip("'\".").lower().startswith("yes")
+
+
+class CragAgent:
+    """Corrective RAG: retrieve, grade the chunks, fall back to web search, then answer.
+
+    Every retrieved chunk is graded concurrently with one abatch call (capped at
+    grade_concurrency), so grading costs about one LLM round trip instead of k. With
+    speculative_search the query rewrite and web search start alongside retrieval and are
+    only used when grading asks for them, which takes them off the critical path at the
+    price of a search per question; otherwise they run after grading, as in the tutorial.
+    """
+
+    def __init__(
+        self,
+        retrieval: Optional[RetrievalService] = None,
+        search_tool=None,
+        grader_llm=None,
+        llm=None,
+        grade_concurrency: Optional[int] = None,
+        speculative_search: Optional[bool] = None,
+    ):
+        self.retrieval = retrieval or get_retrieval_service()
+        self._search_tool = search_tool
+        grader_llm = grader_llm or create_chat_model("openai", settings.CRAG_GRADER_MODEL, temperature=0)
+        self.grader = GRADE_PROMPT | grader_llm | StrOutputParser()
+        self.rewriter = REWRITE_PROMPT | grader_llm | StrOutputParser()
+        self.llm = llm or create_router(settings.CRAG_MODEL, temperature=0)
+        self.grade_concurrency = grade_concurrency or settings.CRAG_GRADE_CONCURRENCY
+        self.speculative_search = settings.CRAG_SPECULATIVE_SEARCH if speculative_search is None else speculative_search
+        self.graph = self.build_graph().compile()
+
+    @property
+    def search_tool(self):
+        if self._search_tool is None:
+            from langchain_community.tools import DuckDuckGoSearchResults
+            self._search_tool = DuckDuckGoSearchResults(max_results=settings.CRAG_WEB_RESULTS)
+        return self._search_tool
+
+    def build_graph(self) -> StateGraph:
+        graph = StateGraph(CragState)
+        graph.add_node("retrieve", self.retrieve)
+        graph.add_node("grade_documents", self.grade_documents)
+        graph.add_node("transform_query", self.transform_query)
+        graph.add_node("web_search_node", self.web_search)
+        graph.add_node("generate", self.generate)
+        graph.add_edge(START, "retrieve")
+        graph.add_edge("retrieve", "grade_documents")
+        graph.add_edge("transform_query", "web_search_node")
+        if self.speculative_search:
+            graph.add_edge(START, "transform_query")
+            # generate waits for both branches
+            graph.add_edge(["grade_documents", "web_search_node"], "generate")
+        else:
+            graph.add_conditional_edges("grade_documents", self.decide_to_generate, ["transform_query", "generate"])
+            graph.add_edge("web_search_node", "generate")
+        graph.add_edge("generate", END)
+        return graph
+
+    async def retrieve(self, state: CragState) -> Dict[str, Any]:
+        hits = await self.retrieval.search(state["question"])
+        return {"documents": [
+            Document(page_content=hit["content"], metadata=dict(hit["metadata"], doc_id=hit["doc_id"], score=hit["score"]))
+            for hit in hits
+        ]}
+
+    async def grade_documents(self, state: CragState) -> Dict[str, Any]:
+        documents = state.get("documents") or []
+        grades = await self.grader.abatch(
+            [{"question": state["question"], "document": document.page_content} for document in documents],
+            config={"max_concurrency": self.grade_concurrency},
+            return_exceptions=True,
+        )
+        for grade in grades:
+            if isinstance(grade, Exception):
+                # An ungraded chunk counts as irrelevant, which brings in web results
+                logger.warning(f"Document grading failed: {str(grade)}")
+        relevant = [document for document, grade in zip(documents, grades) if is_relevant(grade)]
+        return {"documents": relevant, "web_search": not documents or len(relevant) < len(documents)}
+
+    def decide_to_generate(self, state: CragState) -> str:
+        return "transform_query" if state.get("web_search") else "generate"
+
+    async def transform_query(self, state: CragState) -> Dict[str, Any]:
+        return {"search_query": (await self.rewriter.ainvoke({"question": state["question"]})).strip()}
+
+    async def web_search(self, state: CragState) -> Dict[str, Any]:
+        query = state.get("search_query") or state["question"]
+        try:
+            results = await self.search_tool.ainvoke({"query": query})
+        except Exception as e:
+            logger.warning(f"Web search failed: {str(e)}")
+            results = []
+        return {"web_documents": search_results_to_documents(results)}
+
+    def context_documents(self, state: CragState) -> List[Document]:
+        documents = list(state.get("documents") or [])
+        if state.get("web_search"):
+            documents.extend(state.get("web_documents") or [])
+        return documents
+
+    async def generate(self, state: CragState, writer: StreamWriter) -> Dict[str, Any]:
+        context = "\n\n".join(document.page_content for document in self.context_documents(state))
+        messages = RAG_PROMPT.format_messages(question=state["question"], context=context)
+        parts = []
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                parts.append(chunk.content)
+                writer(chunk.content)
+        return {"generation": "".join(parts)}
+
+    async def ainvoke(self, question: str) -> CragState:
+        return await self.graph.ainvoke({"question": question})
+
+    async def astream_answer(self, question: str, result: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """Stream the answer tokens; result, if given, receives the sources and whether the web was used"""
+        final: CragState = {}
+        async for mode, chunk in self.graph.astream({"question": question}, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                yield chunk
+            else:
+                final = chunk
+        if result is not None:
+            result["web_search"] = bool(final.get("web_search"))
+            result["sources"] = [document.metadata.get("source") for document in self.context_documents(final)]
+
+
+_crag_agent: Optional[CragAgent] = None
+
+
+def get_crag_agent() -> CragAgent:
+    """Process-wide CRAG agent over the shared retrieval service"""
+    global _crag_agent
+    if _crag_agent is None:
+        _crag_agent = CragAgent()
+    return _crag_agent
@@ -0,0 +1,218 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import io
+import json
+import logging
+import time
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool, tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from src.config.settings import settings
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AgentTool:
+    """A LangChain tool plus how the agent runs it"""
+
+    def __init__(self, tool: BaseTool, timeout: Optional[float] = None, cacheable: bool = False):
+        self.tool = tool
+        self.name = tool.name
+        self.timeout = timeout or settings.AGENT_TOOL_TIMEOUT
+        # Only tools whose answer depends on nothing but their arguments may be cached
+        self.cacheable = cacheable
+        if isinstance(tool, StructuredTool):
+            self.is_async = tool.coroutine is not None
+        else:
+            self.is_async = type(tool)._arun is not BaseTool._arun
+
+
+def parse_tool_calls(message: Any) -> List[Dict[str, Any]]:
+    """Tool calls of a streamed model step, rebuilt from its merged OpenAI tool_call deltas.
+
+    The community ChatOpenAI only concatenates argument fragments into
+    additional_kwargs["tool_calls"], so the parsed message.tool_calls are left empty.
+    """
+    raw_calls = (getattr(message, "additional_kwargs", None) or {}).get("tool_calls")
+    if not raw_calls:
+        return list(getattr(message, "tool_calls", None) or [])
+    calls = []
+    for raw in raw_calls:
+        function = raw.get("function") or {}
+        call = {"name": function.get("name") or "", "args": {}, "id": raw.get("id"), "type": "tool_call"}
+        try:
+            call["args"] = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError as e:
+            call["error"] = f"invalid arguments for {call['name']}: {str(e)}"
+        calls.append(call)
+    return calls
+
+
+class ToolResultCache:
+    """In-process TTL cache of tool results keyed by tool name and arguments"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def key(name: str, args: Dict[str, Any]) -> str:
+        return f"{name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ToolExecutor:
+    """Runs the tool calls of one model step concurrently.
+
+    Async tools run on the event loop and sync tools (most community tools wrap blocking
+    clients) on a bounded thread pool, so one slow lookup never holds up the others or the
+    loop. Each call has a timeout; a failed or timed-out call becomes an error ToolMessage
+    the model can react to instead of failing the turn. A timed-out sync tool keeps its
+    thread until it returns, which the pool size bounds.
+    """
+
+    def __init__(
+        self,
+        tools: List[AgentTool],
+        max_threads: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+        cache_max_entries: Optional[int] = None,
+    ):
+        self.tools = {agent_tool.name: agent_tool for agent_tool in tools}
+        self._pool = ThreadPoolExecutor(max_threads or settings.AGENT_TOOL_THREADS, thread_name_prefix="agent-tool")
+        self.cache = ToolResultCache(
+            cache_ttl or settings.AGENT_TOOL_CACHE_TTL, cache_max_entries or settings.AGENT_TOOL_CACHE_MAX_ENTRIES
+        )
+        self._schemas = [convert_to_openai_tool(agent_tool.tool) for agent_tool in tools]
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """OpenAI tool definitions to send with the model request"""
+        return self._schemas
+
+    async def run(self, tool_calls: List[Dict[str, Any]]) -> List[ToolMessage]:
+        """One ToolMessage per call, in call order"""
+        return list(await asyncio.gather(*[self._run_one(call) for call in tool_calls]))
+
+    async def _run_one(self, call: Dict[str, Any]) -> ToolMessage:
+        name, args = call["name"], call.get("args") or {}
+        if call.get("error"):
+            metrics.TOOL_CALLS.labels(tool=name, outcome="error").inc()
+            return ToolMessage(content=f"Error: {call['error']}", tool_call_id=call["id"], name=name, status="error")
+        agent_tool = self.tools.get(name)
+        if agent_tool is None:
+            return ToolMessage(content=f"Error: unknown tool {name}", tool_call_id=call["id"], name=name, status="error")
+        cache_key = self.cache.key(name, args) if agent_tool.cacheable else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                metrics.TOOL_CALLS.labels(tool=name, outcome="cached").inc()
+                return ToolMessage(content=cached, tool_call_id=call["id"], name=name)
+
+        started_at = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._invoke(agent_tool, args), agent_tool.timeout)
+        except asyncio.TimeoutError:
+            metrics.TOOL_CALLS.labels(tool=name, outcome="timeout").inc()
+            logger.warning(f"Tool {name} timed out after {agent_tool.timeout}s")
+            return ToolMessage(content=f"Error: {name} timed out after {agent_tool.timeout}s",
+                               tool_call_id=call["id"], name=name, status="error")
+        except Exception as e:
+            metrics.TOOL_CALLS.labels(tool=name, outcome="error").inc()
+            logger.warning(f"Tool {name} failed: {str(e)}")
+            return ToolMessage(content=f"Error: {str(e)}", tool_call_id=call["id"], name=name, status="error")
+        finally:
+            metrics.TOOL_SECONDS.labels(tool=name).observe(time.perf_counter() - started_at)
+
+        content = result if isinstance(result, str) else json.dumps(result, default=str)
+        metrics.TOOL_CALLS.labels(tool=name, outcome="ok").inc()
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return ToolMessage(content=content, tool_call_id=call["id"], name=name)
+
+    async def _invoke(self, agent_tool: AgentTool, args: Dict[str, Any]) -> Any:
+        if agent_tool.is_async:
+            return await agent_tool.tool.ainvoke(args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(agent_tool.tool.invoke, args))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _calculator() -> BaseTool:
+    import numexpr
+
+    @tool
+    def calculator(expression: str) -> str:
+        """Evaluate a numeric expression, e.g. '(1200 * 0.15) / 12' or 'sqrt(2) * 10'"""
+        return str(numexpr.evaluate(expression.strip()).item())
+
+    return calculator
+
+
+def _wikipedia() -> BaseTool:
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+    return WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper(top_k_results=2, doc_content_chars_max=2000))
+
+
+def _web_search() -> BaseTool:
+    from langchain_community.tools import DuckDuckGoSearchResults
+    return DuckDuckGoSearchResults(name="web_search", max_results=4)
+
+
+def _describe_table() -> BaseTool:
+    import pandas
+
+    @tool
+    def describe_table(csv_text: str) -> str:
+        """Summary statistics (count, mean, spread, quartiles, most frequent values) of a CSV table given as text"""
+        frame = pandas.read_csv(io.StringIO(csv_text))
+        return frame.describe(include="all").to_string()
+
+    return describe_table
+
+
+# name -> (factory, cacheable); web search results change, so they are never cached
+TOOL_FACTORIES: Dict[str, Tuple[Callable[[], BaseTool], bool]] = {
+    "calculator": (_calculator, True),
+    "wikipedia": (_wikipedia, True),
+    "web_search": (_web_search, False),
+    "describe_table": (_describe_table, True),
+}
+
+
+def build_tools(names: List[str]) -> List[AgentTool]:
+    """The named tools whose optional packages are installed"""
+    tools = []
+    for name in names:
+        if name not in TOOL_FACTORIES:
+            raise ValueError(f"Unknown agent tool: {name}")
+        factory, cacheable = TOOL_FACTORIES[name]
+        try:
+            tools.append(AgentTool(factory(), cacheable=cacheable))
+        except (ImportError, ValueError) as e:
+            # Community tools report a missing package as a validation error
+            logger.warning(f"Agent tool {name} is unavailable: {str(e)}")
+    return tools
@@ -0,0 +1,340 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+import uuid
+from src.config.settings import settings
+from src.memory.memory_manager import get_memory_manager
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# A user at their in-flight limit is told to retry after this long; their next answer usually ends by then
+IN_FLIGHT_RETRY_AFTER = 1.0
+
+# Refill the user's bucket, drop leases of crashed workers, then take a token and a lease or say why not
+ADMIT_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local max_in_flight, lease_ms = tonumber(ARGV[3]), tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[2]) >= max_in_flight then
+    return {0, 'in_flight', 0}
+end
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+if tokens < 1 then
+    return {0, 'rate', math.ceil((1 - tokens) / rate)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate))
+redis.call('ZADD', KEYS[2], now + lease_ms, ARGV[5])
+redis.call('PEXPIRE', KEYS[2], lease_ms)
+return {1, 'ok', 0}
+"""
+
+# Push a running request's lease expiry out by another lease_ms
+REFRESH_SCRIPT = """
+local lease_ms = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZADD', KEYS[1], now + lease_ms, ARGV[2])
+redis.call('PEXPIRE', KEYS[1], lease_ms)
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """The request is over the user's budget or the worker is saturated; retry after retry_after seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LocalAdmissionBackend:
+    """Per-process token buckets and in-flight counts, used when REDIS_URL is unset or Redis fails.
+
+    Leases expire after lease_seconds like the Redis ones, so a missed release frees its slot in time.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        # Lease expiry by lease id, per user
+        self._leases: Dict[str, Dict[str, float]] = {}
+
+    async def acquire(self, user_id: str, lease_id: str, rate: float, burst: int,
+                      max_in_flight: int, lease_seconds: float) -> Tuple[str, float]:
+        now = time.monotonic()
+        leases = self._leases.get(user_id, {})
+        for expired in [lease for lease, expires_at in leases.items() if expires_at <= now]:
+            del leases[expired]
+        if len(leases) >= max_in_flight:
+            return "in_flight", IN_FLIGHT_RETRY_AFTER
+        tokens, updated_at = self._buckets.get(user_id, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            return "rate", (1 - tokens) / rate
+        self._buckets[user_id] = (tokens - 1, now)
+        self._buckets.move_to_end(user_id)
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        self._leases.setdefault(user_id, {})[lease_id] = now + lease_seconds
+        return "ok", 0.0
+
+    async def refresh(self, user_id: str, lease_id: str, lease_seconds: float) -> None:
+        self._leases.setdefault(user_id, {})[lease_id] = time.monotonic() + lease_seconds
+
+    async def release(self, user_id: str, lease_id: str) -> None:
+        leases = self._leases.get(user_id)
+        if leases is not None:
+            leases.pop(lease_id, None)
+            if not leases:
+                del self._leases[user_id]
+
+
+class RedisAdmissionBackend:
+    """Token buckets and in-flight leases in Redis, so limits hold across workers.
+
+    Leases expire after lease_seconds unless refreshed, so a worker that dies mid-stream
+    cannot hold a user's slots forever.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._admit_script = redis_client.register_script(ADMIT_SCRIPT)
+        self._refresh_script = redis_client.register_script(REFRESH_SCRIPT)
+
+    @staticmethod
+    def keys(user_id: str) -> List[str]:
+        return [f"admission:{user_id}:bucket", f"admission:{user_id}:leases"]
+
+    async def acquire(self, user_id: str, lease_id: str, rate: float, burst: int,
+                      max_in_flight: int, lease_seconds: float) -> Tuple[str, float]:
+        # The script works in milliseconds
+        admitted, reason, retry_after_ms = await self._admit_script(
+            keys=self.keys(user_id),
+            args=[rate / 1000, burst, max_in_flight, int(lease_seconds * 1000), lease_id],
+        )
+        if reason == "in_flight":
+            return reason, IN_FLIGHT_RETRY_AFTER
+        return reason, int(retry_after_ms) / 1000
+
+    async def refresh(self, user_id: str, lease_id: str, lease_seconds: float) -> None:
+        await self._refresh_script(keys=self.keys(user_id)[1:], args=[int(lease_seconds * 1000), lease_id])
+
+    async def release(self, user_id: str, lease_id: str) -> None:
+        await self.redis.zrem(self.keys(user_id)[1], lease_id)
+
+
+class FairQueue:
+    """Process-wide stream slots handed out by weighted fair queuing once they run out.
+
+    Each waiter gets a virtual finish tag of max(virtual time, the user's last tag) + 1/weight
+    and freed slots go to the smallest tag, so a user with many queued requests is served
+    in turn with everyone else instead of ahead of them.
+    """
+
+    def __init__(self, capacity: int, max_queued: int, weights: Optional[Dict[str, float]] = None):
+        self.capacity = capacity
+        self.max_queued = max_queued
+        self.weights = weights or {}
+        self.active = 0
+        self.waiting = 0
+        self._heap: List[Tuple[float, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+    async def acquire(self, user_id: str, timeout: float) -> None:
+        """Take a slot, waiting in fair order for at most timeout seconds"""
+        if self.active < self.capacity and not self.waiting:
+            self.active += 1
+            return
+        if self.waiting >= self.max_queued:
+            raise AdmissionRejected("queue_full", timeout)
+        start = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        finish = start + 1.0 / self.weights.get(user_id, 1.0)
+        self._last_finish[user_id] = finish
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._sequence), waiter))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                # Left in the heap and skipped when it reaches the top
+                waiter.cancel()
+                self.waiting -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("queue_timeout", timeout)
+            raise
+
+    def release(self) -> None:
+        """Return a slot, handing it straight to the waiter with the smallest finish tag"""
+        while self._heap:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if waiter.done():
+                continue
+            self.waiting -= 1
+            self._virtual_time = finish
+            waiter.set_result(None)
+            return
+        self.active -= 1
+        # Idle again: old tags can no longer affect ordering
+        self._virtual_time = 0.0
+        self._last_finish.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "active": self.active, "queued": self.waiting}
+
+
+class AdmissionTicket:
+    """A granted request: one of the user's in-flight leases plus a process stream slot"""
+
+    def __init__(self, controller: "AdmissionController", backend, user_id: str, lease_id: str):
+        self.controller = controller
+        self.backend = backend
+        self.user_id = user_id
+        self.lease_id = lease_id
+        self.has_slot = False
+        self.released = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def keep_alive(self) -> None:
+        """Refresh the lease until the ticket is released, so long work keeps counting against the limits"""
+        if self._heartbeat is None and not self.released:
+            self._heartbeat = asyncio.create_task(self._refresh_lease())
+
+    async def _refresh_lease(self) -> None:
+        lease_seconds = self.controller.lease_seconds
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            try:
+                await self.backend.refresh(self.user_id, self.lease_id, lease_seconds)
+            except Exception as e:
+                # Retried on the next beat; two misses in a row let the lease lapse
+                logger.warning(f"Refreshing admission lease failed: {str(e)}")
+
+    async def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        if self._heartbeat is not None:
+            # Stopped first so a late refresh can't put the lease back after it is removed
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+        if self.has_slot:
+            self.controller.queue.release()
+        try:
+            await self.backend.release(self.user_id, self.lease_id)
+        except Exception as e:
+            # The lease expires on its own
+            logger.warning(f"Releasing admission lease failed: {str(e)}")
+
+    async def guard(self, source: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        """Pass source through, keeping the lease alive and releasing the ticket when the generation ends"""
+        self.keep_alive()
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            await asyncio.shield(self.release())
+
+
+class AdmissionController:
+    """Per-user admission for chat streams: rate and in-flight limits, then fair queuing.
+
+    The user's token bucket and in-flight count are checked first and answered at once, so an
+    over-budget request costs one Redis round trip. Admitted requests then take one of the
+    worker's stream slots, queuing fairly by user for at most queue_timeout when all are busy.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        rate_per_minute: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.rate = (rate_per_minute or settings.ADMISSION_RATE_PER_MINUTE) / 60
+        self.burst = burst or settings.ADMISSION_BURST
+        self.max_in_flight = max_in_flight or settings.ADMISSION_MAX_IN_FLIGHT_PER_USER
+        self.queue_timeout = settings.ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.lease_seconds = settings.ADMISSION_LEASE_SECONDS
+        self.local = LocalAdmissionBackend(settings.ADMISSION_MAX_LOCAL_USERS)
+        self.backend = RedisAdmissionBackend(redis_client) if redis_client is not None else self.local
+        self.queue = FairQueue(
+            max_concurrent or settings.ADMISSION_MAX_CONCURRENT_STREAMS,
+            settings.ADMISSION_MAX_QUEUED if max_queued is None else max_queued,
+            settings.ADMISSION_USER_WEIGHTS if weights is None else weights,
+        )
+
+    async def admit(self, user_id: str) -> AdmissionTicket:
+        """Admit one chat stream for user_id or raise AdmissionRejected"""
+        lease_id = uuid.uuid4().hex
+        backend = self.backend
+        try:
+            reason, retry_after = await backend.acquire(
+                user_id, lease_id, self.rate, self.burst, self.max_in_flight, self.lease_seconds
+            )
+        except Exception as e:
+            # Limits degrade to per-worker rather than off when Redis is unavailable
+            logger.warning(f"Admission check failed, using local limits: {str(e)}")
+            backend = self.local
+            reason, retry_after = await backend.acquire(
+                user_id, lease_id, self.rate, self.burst, self.max_in_flight, self.lease_seconds
+            )
+        if reason != "ok":
+            metrics.ADMISSION_REJECTIONS.labels(reason=reason).inc()
+            raise AdmissionRejected(reason, retry_after)
+
+        ticket = AdmissionTicket(self, backend, user_id, lease_id)
+        started_at = time.perf_counter()
+        try:
+            await self.queue.acquire(user_id, self.queue_timeout)
+        except AdmissionRejected as e:
+            metrics.ADMISSION_REJECTIONS.labels(reason=e.reason).inc()
+            await ticket.release()
+            raise
+        except BaseException:
+            await ticket.release()
+            raise
+        ticket.has_slot = True
+        metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started_at)
+        return ticket
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis" if isinstance(self.backend, RedisAdmissionBackend) else "local", **self.queue.stats()}
+
+
+def retry_after_header(retry_after: float) -> Dict[str, str]:
+    """Retry-After takes whole seconds; never tell a client to retry immediately"""
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide admission controller sharing the memory manager's Redis client"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(get_memory_manager().redis_client)
+    return _admission_controller
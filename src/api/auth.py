@@ -0,0 +1,65 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+import hashlib
+import time
+from jose import jwt
+from src.config.settings import settings
+
+
+class JWTVerifier:
+    """Verifies Supabase HS256 access tokens and caches the claims until the token expires"""
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        algorithms: Optional[List[str]] = None,
+        max_entries: Optional[int] = None,
+        default_ttl: Optional[int] = None,
+    ):
+        # Resolved once instead of reading the environment on every request
+        self.secret = secret or settings.SUPABASE_JWT_SECRET
+        self.algorithms = algorithms or ["HS256"]
+        self.max_entries = max_entries or settings.JWT_CACHE_MAX_ENTRIES
+        self.default_ttl = default_ttl or settings.JWT_CACHE_DEFAULT_TTL
+        self._cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(token: str) -> bytes:
+        # Only the digest is kept so raw tokens never sit in memory longer than the request
+        return hashlib.sha256(token.encode()).digest()
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the token claims, decoding and checking the signature only on a cache miss"""
+        key = self._cache_key(token)
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires_at, claims = entry
+            if now < expires_at:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._cache[key]
+
+        self.misses += 1
+        if not self.secret:
+            raise ValueError("SUPABASE_JWT_SECRET is not set in environment variables")
+        claims = jwt.decode(token, self.secret, algorithms=self.algorithms, options={"verify_aud": False})
+        if not claims.get("sub"):
+            raise ValueError("Invalid token payload")
+
+        exp = claims.get("exp")
+        expires_at = float(exp) if exp is not None else now + self.default_ttl
+        self._cache[key] = (expires_at, claims)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return claims
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+# Create a singleton instance
+jwt_verifier = JWTVerifier()
@@ -0,0 +1,45 @@
+import re
+import uuid
+from src.monitoring.structured_logging import bind, unbind
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Client-supplied ids are echoed into logs and headers, so only accept plain tokens
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+class CorrelationIdMiddleware:
+    """Binds a request id to the log context and echoes it in the X-Request-ID response header.
+
+    Pure ASGI rather than BaseHTTPMiddleware, so streaming responses are passed through
+    untouched and the id stays bound while the body is being generated.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1").lower() == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode(), request_id.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        token = bind(request_id=request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            unbind(token)
@@ -1,25 +1,122 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-import os
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
-from fastapi.responses import StreamingResponse
-from src.agents.business_analyst import business_analyst
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+from src.memory.memory_manager import get_memory_manager
+from src.memory.write_behind import get_write_behind
+from src.memory.tenants import get_tenant_registry, release_when_done
+from src.memory.session_catalog import get_session_catalog
+from src.retrieval.service import get_retrieval_service
+from contextlib import asynccontextmanager
+import asyncio
+import importlib
+import json
+import logging
+import sys
 import uuid
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import create_client
-from jose import jwt
+from jose import JWTError
+from src.api.auth import jwt_verifier
+from src.api.admission import AdmissionRejected, get_admission_controller, retry_after_header
+from src.api.correlation import CorrelationIdMiddleware
+from src.api.resumable import get_resumable_streams
+from src.api.sse import sse_stream
 from src.config.settings import settings
-import traceback
+from src.monitoring import metrics
+from src.monitoring.structured_logging import bind, configure_logging, payload_fields, sampled, stop_logging
+import time
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+async def get_business_analyst():
+    """Dependency provider; the agent module (LangChain, OpenAI) is only imported on first use"""
+    from src.agents.business_analyst import get_business_analyst as provide_agent
+    return provide_agent()
+
+async def get_crag_agent():
+    """Dependency provider for the corrective-RAG agent, imported and built on first use"""
+    from src.agents.crag import get_crag_agent as provide_agent
+    return provide_agent()
+
+async def get_batch_runner():
+    """Dependency provider for offline batch chat, imported and built on first use"""
+    from src.agents.batch import get_batch_runner as provide_runner
+    return provide_runner()
+
+async def get_batch_jobs():
+    from src.agents.batch import get_batch_jobs as provide_jobs
+    return provide_jobs()
+
+async def warm_up(app: FastAPI):
+    """Build the agent and prime connection pools, then mark the app ready"""
+    try:
+        # Heavy imports run in a worker thread so the loop keeps serving /health meanwhile
+        await asyncio.to_thread(importlib.import_module, "src.agents.business_analyst")
+        await get_business_analyst()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+        app.state.warmup_error = str(e)
+        return
+    try:
+        if settings.RETRIEVAL_ENABLED:
+            # Map the vector index now rather than on the first question
+            await asyncio.to_thread(lambda: get_retrieval_service().index)
+        await get_memory_manager().warm_up()
+    except Exception as e:
+        # Cold pools or an unmapped index only cost latency; the first requests load them
+        logger.warning(f"Pool and index warm-up failed: {str(e)}")
+    app.state.ready = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Log writes happen on a listener thread, never on the event loop
+    configure_logging()
+    app.state.ready = not settings.WARMUP_ENABLED
+    app.state.warmup_error = None
+    # One pooled Supabase client per process instead of one per request
+    memory_manager = get_memory_manager()
+    write_behind = get_write_behind()
+    tenant_registry = get_tenant_registry()
+    metrics.bind_pool_gauges(memory_manager, write_behind, tenant_registry)
+    await memory_manager.start()
+    await write_behind.start()
+    warmup_task = asyncio.create_task(warm_up(app)) if settings.WARMUP_ENABLED else None
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+            try:
+                await warmup_task
+            except asyncio.CancelledError:
+                pass
+        # Cancelled generations save their partial answers, so this runs before the write queue drains
+        await get_resumable_streams().close()
+        batch_module = sys.modules.get("src.agents.batch")
+        if batch_module is not None:
+            await batch_module.close_batch_runner()
+        agent_module = sys.modules.get("src.agents.business_analyst")
+        if agent_module is not None:
+            await agent_module.close_business_analyst()
+        # Both agents search through the shared service; stopping one that never started is a no-op
+        await get_retrieval_service().stop()
+        # Drain queued conversation rows before the pool goes away
+        await write_behind.stop()
+        await tenant_registry.close()
+        await memory_manager.close()
+        stop_logging()
+
 app = FastAPI(
     title="LLM Agent API",
     description="API for LLM Agents with LangChain and LangGraph",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -31,6 +128,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request ids for log correlation, echoed back as X-Request-ID
+app.add_middleware(CorrelationIdMiddleware)
+
 # Security
 security = HTTPBearer()
 
@@ -40,96 +140,350 @@ class ChatRequest(BaseModel):
     supabase_url: Optional[str] = None
     supabase_key: Optional[str] = None
 
+class BatchChatItem(BaseModel):
+    message: str
+    # Continue an existing session; by default each item starts a new one
+    session_id: Optional[str] = None
+    # Echoed back with the result so callers can match them up
+    custom_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    messages: List[BatchChatItem]
+    supabase_url: Optional[str] = None
+    supabase_key: Optional[str] = None
+
+class CragRequest(BaseModel):
+    question: str
+
+class ArchiveSessionsRequest(BaseModel):
+    session_ids: List[str]
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    request: ChatRequest = None
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> str:
     """Get the current user's ID from the JWT token"""
+    started_at = time.perf_counter()
     try:
-        # Use provided Supabase credentials if available, otherwise fall back to environment variables
-        supabase_url = request.supabase_url if request and request.supabase_url else settings.SUPABASE_URL
-        supabase_key = request.supabase_key if request and request.supabase_key else settings.SUPABASE_KEY
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("Supabase credentials not provided")
-            
-        # Create Supabase client
-        supabase = create_client(supabase_url, supabase_key)
-        
-        # Get the JWT secret from Supabase
-        jwt_secret = os.getenv("SUPABASE_JWT_SECRET")
-        print(f"JWT Secret being used: {jwt_secret}")
-        if not jwt_secret:
-            raise ValueError("SUPABASE_JWT_SECRET is not set in environment variables")
-        
-        # Verify the JWT token
-        token = credentials.credentials
-        try:
-            # Attempt to decode the token using the JWT secret
-            payload = jwt.decode(token, jwt_secret, algorithms=["HS256"], options={"verify_aud": False})
-            user_id = payload.get("sub")
-            if not user_id:
-                raise ValueError("Invalid token payload")
-            return user_id
-        except jwt.JWTError as e:
-            print(f"JWT verification failed: {str(e)}")
-            raise HTTPException(
-                status_code=401,
-                detail=f"Invalid token: {str(e)}"
-            )
-            
+        # Verified claims are cached until the token expires, so repeat turns skip the decode
+        claims = jwt_verifier.verify(credentials.credentials)
+        return claims["sub"]
+    except JWTError as e:
+        logger.warning(f"JWT verification failed: {str(e)}")
+        raise HTTPException(
+            status_code=401,
+            detail=f"Invalid token: {str(e)}"
+        )
     except Exception as e:
-        print(f"Authentication failed: {str(e)}")
+        logger.warning(f"Authentication failed: {str(e)}")
         raise HTTPException(
             status_code=401,
             detail=f"Authentication failed: {str(e)}"
         )
+    finally:
+        metrics.AUTH_SECONDS.observe(time.perf_counter() - started_at)
+
+async def admit_chat_stream(user_id: str = Depends(get_current_user)):
+    """Admit one chat stream for the user, or answer 429 with Retry-After straight away"""
+    if not settings.ADMISSION_ENABLED:
+        return None
+    try:
+        return await get_admission_controller().admit(user_id)
+    except AdmissionRejected as e:
+        logger.info(f"Chat request rejected: {e.reason}", extra={"user_id": user_id})
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
 
 # Basic health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+# Readiness probe: 503 until warm-up has built the agent and primed the pools
+@app.get("/ready")
+async def readiness_check():
+    if getattr(app.state, "ready", False):
+        return {"status": "ready"}
+    error = getattr(app.state, "warmup_error", None)
+    if error:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": error})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
 # Business Analyst Chat endpoint with streaming
 @app.post("/chat/business-analyst")
 async def chat_with_business_analyst(
     request: ChatRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    business_analyst = Depends(get_business_analyst),
+    # Resolved last, so a failing dependency above can't leave a ticket nobody releases
+    ticket = Depends(admit_chat_stream)
 ):
+    release_memory = None
     try:
-        print(f"Received chat request from user {user_id}")
-        print(f"Message: {request.message}")
-        print(f"Session ID: {request.session_id}")
-        
         # Generate a new session ID if not provided
         session_id = request.session_id or str(uuid.uuid4())
+        bind(user_id=user_id, session_id=session_id)
+        logger.info("Chat request received", extra={
+            "new_session": request.session_id is None, **payload_fields("message", request.message), **sampled()
+        })
         
-        # Update Supabase settings if credentials are provided
-        if request.supabase_url and request.supabase_key:
-            print("Updating Supabase settings with provided credentials")
-            settings.SUPABASE_URL = request.supabase_url
-            settings.SUPABASE_KEY = request.supabase_key
+        # Requests that bring their own Supabase project get that tenant's pooled client
+        memory = await get_tenant_registry().get(request.supabase_url, request.supabase_key)
+        # Held until the stream ends, so tenant eviction can't close the pool under the generation
+        release_memory = memory.hold()
         
-        print("Creating streaming response...")
-        # Create streaming response
+        generation = release_when_done(business_analyst.generate_response(
+            request.message,
+            session_id,
+            user_id,
+            credentials.credentials,
+            memory=memory
+        ), release_memory)
+        if ticket is not None:
+            # The user's lease and the stream slot are held until the generation ends
+            generation = ticket.guard(generation)
+        if not settings.RESUMABLE_STREAMS_ENABLED:
+            # A client gone before the first byte means the generation never starts to release
+            # these; both releases are idempotent, so running them again afterwards is harmless
+            background = BackgroundTasks()
+            background.add_task(release_memory)
+            if ticket is not None:
+                background.add_task(ticket.release)
+            return StreamingResponse(
+                sse_stream(generation, done_data={"session_id": session_id}),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS,
+                background=background
+            )
+
+        # Generation runs on its own task; this connection is only one listener of its buffer
+        streams = get_resumable_streams()
+        stream_id = await streams.start(generation, meta={"user_id": user_id, "session_id": session_id})
         return StreamingResponse(
-            business_analyst.generate_response(
-                request.message,
-                session_id,
-                user_id,
-                credentials.credentials
+            sse_stream(
+                streams.subscribe(stream_id),
+                done_data={"session_id": session_id, "stream_id": stream_id},
+                source_ids=True
             ),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
+            headers={**SSE_HEADERS, "X-Stream-ID": stream_id}
+        )
+    except Exception as e:
+        if ticket is not None:
+            await ticket.release()
+        if release_memory is not None:
+            release_memory()
+        logger.exception(f"Error in chat endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Reconnect to a chat stream: replays what came after Last-Event-ID, then follows the generation live
+@app.get("/chat/business-analyst/streams/{stream_id}")
+async def resume_business_analyst_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user_id: str = Depends(get_current_user)
+):
+    streams = get_resumable_streams()
+    meta = await streams.meta(stream_id)
+    # Someone else's stream looks the same as an expired one
+    if meta is None or meta.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    bind(user_id=user_id, session_id=meta.get("session_id"), stream_id=stream_id)
+    return StreamingResponse(
+        sse_stream(
+            streams.subscribe(stream_id, last_event_id_header or last_event_id),
+            done_data={"session_id": meta.get("session_id"), "stream_id": stream_id},
+            source_ids=True
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+def batch_items(request: BatchChatRequest) -> List[Dict[str, Any]]:
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="messages must not be empty")
+    if len(request.messages) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_ITEMS} messages per batch")
+    return [item.model_dump() for item in request.messages]
+
+async def ndjson_stream(results: AsyncIterator[Dict[str, Any]]) -> AsyncGenerator[str, None]:
+    async for result in results:
+        yield json.dumps(result) + "\n"
+
+# Offline bulk chat: one NDJSON line per message as it finishes, then a summary line
+@app.post("/chat/business-analyst/batch")
+async def batch_chat_with_business_analyst(
+    request: BatchChatRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user),
+    batch_runner = Depends(get_batch_runner),
+    ticket = Depends(admit_chat_stream)
+):
+    # A batch is admitted as one stream: it counts against the user's limits like a chat turn
+    try:
+        items = batch_items(request)
+        memory = await get_tenant_registry().get(request.supabase_url, request.supabase_key)
+    except BaseException:
+        if ticket is not None:
+            await ticket.release()
+        raise
+    release_memory = memory.hold()
+    results = release_when_done(batch_runner.run(items, user_id, credentials.credentials, memory=memory), release_memory)
+    background = BackgroundTasks()
+    background.add_task(release_memory)
+    if ticket is not None:
+        results = ticket.guard(results)
+        background.add_task(ticket.release)
+    return StreamingResponse(
+        ndjson_stream(results),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+        background=background
+    )
+
+# Same batch as a background job; poll the returned status URL for progress and results
+@app.post("/chat/business-analyst/batch/jobs", status_code=202)
+async def create_batch_job(
+    request: BatchChatRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user),
+    batch_runner = Depends(get_batch_runner),
+    batch_jobs = Depends(get_batch_jobs),
+    ticket = Depends(admit_chat_stream)
+):
+    # The job holds its ticket until it finishes, so queued jobs can't sidestep the stream limits
+    try:
+        items = batch_items(request)
+        memory = await get_tenant_registry().get(request.supabase_url, request.supabase_key)
+        job = await batch_runner.start_job(batch_jobs, items, user_id, credentials.credentials, memory=memory,
+                                           on_finish=ticket.release if ticket is not None else None)
+        if ticket is not None:
+            ticket.keep_alive()
+    except BaseException:
+        if ticket is not None:
+            await ticket.release()
+        raise
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/chat/business-analyst/batch/jobs/{job['job_id']}"
+    }
+
+@app.get("/chat/business-analyst/batch/jobs/{job_id}")
+async def get_batch_job(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(get_current_user),
+    batch_jobs = Depends(get_batch_jobs)
+):
+    job = await batch_jobs.get(job_id, offset=offset, limit=limit)
+    # Someone else's job looks the same as a missing one
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+# Corrective RAG over the document index with web-search fallback, streamed as SSE
+@app.post("/chat/crag")
+async def chat_with_crag(
+    request: CragRequest,
+    user_id: str = Depends(get_current_user),
+    crag_agent = Depends(get_crag_agent),
+    ticket = Depends(admit_chat_stream)
+):
+    # Filled in when the graph finishes and sent with the done event
+    result: Dict[str, Any] = {}
+    answer = crag_agent.astream_answer(request.question, result)
+    background = None
+    if ticket is not None:
+        answer = ticket.guard(answer)
+        background = BackgroundTask(ticket.release)
+    return StreamingResponse(
+        sse_stream(answer, done_data=result),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        background=background
+    )
+
+# The user's sessions from the catalog, most recently updated first
+@app.get("/sessions")
+async def list_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    before_last_updated_at: Optional[str] = None,
+    before_session_id: Optional[str] = None,
+    archived: bool = False,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user)
+):
+    if (before_last_updated_at is None) != (before_session_id is None):
+        raise HTTPException(status_code=400, detail="before_last_updated_at and before_session_id must be provided together")
+    before = (before_last_updated_at, before_session_id) if before_last_updated_at is not None else None
+    try:
+        return await get_session_catalog().list_page(
+            user_id,
+            credentials.credentials,
+            before=before,
+            limit=limit,
+            archived=archived
+        )
+    except Exception as e:
+        logger.exception(f"Error in sessions endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Archive several sessions at once; their messages stay stored but leave history and listings
+@app.post("/sessions/archive")
+async def archive_sessions(
+    request: ArchiveSessionsRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user)
+):
+    session_ids = list(dict.fromkeys(request.session_ids))
+    if not session_ids:
+        raise HTTPException(status_code=400, detail="session_ids must not be empty")
+    if len(session_ids) > settings.SESSION_ARCHIVE_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.SESSION_ARCHIVE_MAX_IDS} sessions per request")
+    try:
+        archived = await get_session_catalog().archive(user_id, session_ids, credentials.credentials)
+        return {"archived": archived}
+    except Exception as e:
+        logger.exception(f"Error in archive sessions endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Paginated message history for a session, newest page first
+@app.get("/sessions/{session_id}/messages")
+async def get_session_messages(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before_created_at: Optional[str] = None,
+    before_id: Optional[str] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user),
+    business_analyst = Depends(get_business_analyst)
+):
+    if (before_created_at is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before_created_at and before_id must be provided together")
+    before = (before_created_at, before_id) if before_created_at is not None else None
+    try:
+        return await business_analyst.get_history_page(
+            session_id,
+            user_id,
+            credentials.credentials,
+            before=before,
+            limit=limit
         )
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error in session messages endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -0,0 +1,280 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+import time
+import uuid
+from src.config.settings import settings
+from src.memory.memory_manager import get_memory_manager
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[str, str, str]
+
+
+class StreamNotFound(Exception):
+    """The stream never existed, belongs to someone else or has expired"""
+
+
+class StreamFailed(Exception):
+    """The generation behind a stream ended with an error or was cancelled"""
+
+
+class _LocalStream:
+    def __init__(self, meta: Dict[str, Any], ttl: float):
+        self.meta = meta
+        self.entries: List[Entry] = []
+        self.condition = asyncio.Condition()
+        self.expires_at = time.monotonic() + ttl
+        self.listener_until = 0.0
+
+
+class LocalStreamBackend:
+    """In-process stream buffers, used when REDIS_URL is unset; reconnects must reach the same worker"""
+
+    def __init__(self, max_streams: int):
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, _LocalStream]" = OrderedDict()
+
+    def _get(self, stream_id: str) -> Optional[_LocalStream]:
+        stream = self._streams.get(stream_id)
+        if stream is not None and stream.expires_at < time.monotonic():
+            del self._streams[stream_id]
+            return None
+        return stream
+
+    async def create(self, stream_id: str, meta: Dict[str, Any], ttl: float) -> None:
+        self._streams[stream_id] = _LocalStream(meta, ttl)
+        while len(self._streams) > self.max_streams:
+            self._streams.popitem(last=False)
+
+    async def meta(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        stream = self._get(stream_id)
+        return stream.meta if stream is not None else None
+
+    async def append(self, stream_id: str, kind: str, data: str) -> Optional[str]:
+        stream = self._get(stream_id)
+        if stream is None:
+            return None
+        entry_id = str(len(stream.entries) + 1)
+        async with stream.condition:
+            stream.entries.append((entry_id, kind, data))
+            stream.condition.notify_all()
+        return entry_id
+
+    async def read(self, stream_id: str, after: Optional[str], block_ms: int) -> List[Entry]:
+        stream = self._get(stream_id)
+        if stream is None:
+            raise StreamNotFound(stream_id)
+        position = int(after) if after and after.isdigit() else 0
+        async with stream.condition:
+            if len(stream.entries) <= position:
+                try:
+                    await asyncio.wait_for(
+                        stream.condition.wait_for(lambda: len(stream.entries) > position), block_ms / 1000
+                    )
+                except asyncio.TimeoutError:
+                    return []
+            return stream.entries[position:]
+
+    async def touch(self, stream_id: str, ttl_ms: int) -> None:
+        stream = self._get(stream_id)
+        if stream is not None:
+            stream.listener_until = time.monotonic() + ttl_ms / 1000
+
+    async def has_listener(self, stream_id: str) -> bool:
+        stream = self._get(stream_id)
+        return stream is not None and stream.listener_until > time.monotonic()
+
+    async def expire(self, stream_id: str, ttl: float) -> None:
+        stream = self._get(stream_id)
+        if stream is not None:
+            stream.expires_at = time.monotonic() + ttl
+
+
+class RedisStreamBackend:
+    """Stream buffers as Redis Streams, so a reconnect can be served by any worker"""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def key(stream_id: str) -> str:
+        return f"chatstream:{stream_id}"
+
+    async def create(self, stream_id: str, meta: Dict[str, Any], ttl: float) -> None:
+        key = self.key(stream_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"{key}:meta", json.dumps(meta), ex=int(ttl))
+            # The stream key itself appears with the first entry
+            pipe.xadd(key, {"kind": "start", "data": ""})
+            pipe.expire(key, int(ttl))
+            await pipe.execute()
+
+    async def meta(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.redis.get(f"{self.key(stream_id)}:meta")
+        return json.loads(raw) if raw else None
+
+    async def append(self, stream_id: str, kind: str, data: str) -> Optional[str]:
+        return await self.redis.xadd(self.key(stream_id), {"kind": kind, "data": data})
+
+    async def read(self, stream_id: str, after: Optional[str], block_ms: int) -> List[Entry]:
+        response = await self.redis.xread({self.key(stream_id): after or "0-0"}, block=block_ms)
+        if not response:
+            if not await self.redis.exists(self.key(stream_id)):
+                raise StreamNotFound(stream_id)
+            return []
+        _, entries = response[0]
+        return [(entry_id, fields["kind"], fields["data"]) for entry_id, fields in entries]
+
+    async def touch(self, stream_id: str, ttl_ms: int) -> None:
+        await self.redis.set(f"{self.key(stream_id)}:listener", "1", px=ttl_ms)
+
+    async def has_listener(self, stream_id: str) -> bool:
+        return bool(await self.redis.exists(f"{self.key(stream_id)}:listener"))
+
+    async def expire(self, stream_id: str, ttl: float) -> None:
+        key = self.key(stream_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.expire(key, int(ttl))
+            pipe.expire(f"{key}:meta", int(ttl))
+            await pipe.execute()
+
+
+async def _aclose_quietly(source: AsyncIterator[str]) -> None:
+    aclose = getattr(source, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception as e:
+            logger.warning(f"Closing a cancelled generation failed: {str(e)}")
+
+
+class ResumableStreams:
+    """Runs generations independently of the connections that deliver them.
+
+    start() pumps a token source into a per-request buffer from a background task;
+    subscribe() replays the buffer after a Last-Event-ID and then follows it live, so a
+    client that drops can reconnect without a new generation. Listeners refresh a heartbeat
+    while they read; once none has been seen for grace_seconds the generation is cancelled
+    (the source is expected to save what it produced). Finished buffers stay resumable for ttl.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl: Optional[int] = None,
+        grace_seconds: Optional[float] = None,
+        max_local_streams: Optional[int] = None,
+    ):
+        self.ttl = ttl or settings.STREAM_RESUME_TTL
+        self.grace = settings.STREAM_LISTENER_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        if redis_client is not None:
+            self.backend = RedisStreamBackend(redis_client)
+        else:
+            self.backend = LocalStreamBackend(max_local_streams or settings.STREAM_MAX_LOCAL)
+        # Listeners wake at least this often to renew their heartbeat
+        self.block_ms = max(int(self.grace * 1000 / 3), 10)
+        self._pumps: Dict[str, asyncio.Task] = {}
+
+    async def start(self, source: AsyncIterator[str], meta: Optional[Dict[str, Any]] = None) -> str:
+        """Begin pumping source into a new stream and return its id"""
+        stream_id = uuid.uuid4().hex
+        # Generation time counts against the ttl too, so give the buffer room to finish
+        await self.backend.create(stream_id, meta or {}, self.ttl + settings.STREAM_MAX_GENERATION_SECONDS)
+        # A new stream gets one grace period for its first listener to attach
+        await self.backend.touch(stream_id, int(self.grace * 1000))
+        task = asyncio.create_task(self._pump(stream_id, source))
+        self._pumps[stream_id] = task
+        task.add_done_callback(lambda _: self._pumps.pop(stream_id, None))
+        return stream_id
+
+    async def meta(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.meta(stream_id)
+
+    async def _pump(self, stream_id: str, source: AsyncIterator[str]) -> None:
+        watchdog = asyncio.create_task(self._watch(stream_id, asyncio.current_task()))
+        try:
+            async for chunk in source:
+                await self.backend.append(stream_id, "chunk", chunk)
+            await self.backend.append(stream_id, "done", "")
+        except asyncio.CancelledError:
+            metrics.ABANDONED_GENERATIONS.inc()
+            # If the cancel landed between chunks the source is parked at a yield; closing it lets it save
+            await asyncio.shield(_aclose_quietly(source))
+            await asyncio.shield(self._append_quietly(stream_id, "cancelled", "Generation was cancelled"))
+            raise
+        except Exception as e:
+            await self._append_quietly(stream_id, "error", str(e))
+        finally:
+            watchdog.cancel()
+            await asyncio.shield(self._expire_quietly(stream_id))
+
+    async def _append_quietly(self, stream_id: str, kind: str, data: str) -> None:
+        try:
+            await self.backend.append(stream_id, kind, data)
+        except Exception as e:
+            logger.warning(f"Could not mark stream {stream_id} as {kind}: {str(e)}")
+
+    async def _expire_quietly(self, stream_id: str) -> None:
+        try:
+            await self.backend.expire(stream_id, self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not set expiry on stream {stream_id}: {str(e)}")
+
+    async def _watch(self, stream_id: str, pump: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.block_ms / 1000)
+            try:
+                listening = await self.backend.has_listener(stream_id)
+            except Exception as e:
+                # Never cancel a generation because the buffer store hiccupped
+                logger.warning(f"Listener check for stream {stream_id} failed: {str(e)}")
+                continue
+            if not listening:
+                logger.info(f"No listener on stream {stream_id} for {self.grace}s, cancelling generation")
+                pump.cancel()
+                return
+
+    async def subscribe(self, stream_id: str, last_event_id: Optional[str] = None) -> AsyncGenerator[Tuple[str, str], None]:
+        """Yield (entry id, chunk) after last_event_id until the generation finishes"""
+        if last_event_id:
+            metrics.RESUMED_STREAMS.inc()
+        after = last_event_id
+        while True:
+            await self.backend.touch(stream_id, int(self.grace * 1000))
+            entries = await self.backend.read(stream_id, after, self.block_ms)
+            for entry_id, kind, data in entries:
+                after = entry_id
+                if kind == "chunk":
+                    yield entry_id, data
+                elif kind == "done":
+                    return
+                elif kind in ("error", "cancelled"):
+                    raise StreamFailed(data)
+
+    async def close(self) -> None:
+        """Cancel running generations at shutdown so their partial answers get saved"""
+        for task in list(self._pumps.values()):
+            task.cancel()
+        if self._pumps:
+            await asyncio.gather(*self._pumps.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if isinstance(self.backend, RedisStreamBackend) else "local",
+            "generating": len(self._pumps),
+        }
+
+
+_resumable_streams: Optional[ResumableStreams] = None
+
+
+def get_resumable_streams() -> ResumableStreams:
+    """Process-wide stream buffers sharing the memory manager's Redis client"""
+    global _resumable_streams
+    if _resumable_streams is None:
+        _resumable_streams = ResumableStreams(get_memory_manager().redis_client)
+    return _resumable_streams
@@ -0,0 +1,111 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import logging
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Comment line: ignored by EventSource clients, keeps proxies from closing idle connections
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_event(data: str, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Frame one server-sent event; multi-line data becomes several data: lines"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(
+    source: AsyncIterator[str],
+    done_data: Optional[Dict[str, Any]] = None,
+    coalesce_ms: Optional[float] = None,
+    coalesce_bytes: Optional[int] = None,
+    heartbeat_seconds: Optional[float] = None,
+    start_id: int = 0,
+    source_ids: bool = False,
+) -> AsyncGenerator[str, None]:
+    """Turn a token stream into SSE frames.
+
+    Tokens are buffered and flushed as one event when coalesce_bytes have accumulated or
+    coalesce_ms have passed since the first buffered token, so a fast model produces a few
+    dozen writes per second instead of one per token. Idle periods emit heartbeats, and the
+    stream always ends with an `event: done` or `event: error` frame.
+
+    With source_ids the source yields (id, chunk) pairs and each frame carries the id of its
+    last chunk instead of a counter, so a reconnecting client's Last-Event-ID maps back to a
+    position in the source.
+    """
+    coalesce_seconds = (settings.SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms) / 1000
+    coalesce_bytes = settings.SSE_COALESCE_BYTES if coalesce_bytes is None else coalesce_bytes
+    heartbeat_seconds = heartbeat_seconds or settings.SSE_HEARTBEAT_SECONDS
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1024)
+
+    async def produce():
+        try:
+            async for chunk in source:
+                await queue.put(("chunk", chunk))
+            await queue.put(("done", None))
+        except Exception as e:
+            await queue.put(("error", str(e)))
+
+    producer = asyncio.create_task(produce())
+    event_id = start_id
+    last_source_id: Optional[str] = None
+    parts: List[str] = []
+    buffered_bytes = 0
+    flush_at = None
+
+    def flush() -> str:
+        nonlocal event_id, parts, buffered_bytes, flush_at
+        event_id += 1
+        frame = format_event("".join(parts), event_id=last_source_id if source_ids else str(event_id))
+        parts, buffered_bytes, flush_at = [], 0, None
+        return frame
+
+    try:
+        while True:
+            timeout = heartbeat_seconds if flush_at is None else max(flush_at - loop.time(), 0)
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush() if parts else HEARTBEAT
+                continue
+
+            if kind == "chunk":
+                if source_ids:
+                    last_source_id, value = value
+                if not value:
+                    continue
+                parts.append(value)
+                buffered_bytes += len(value.encode())
+                if flush_at is None:
+                    flush_at = loop.time() + coalesce_seconds
+                if buffered_bytes >= coalesce_bytes or coalesce_seconds <= 0:
+                    yield flush()
+                continue
+
+            if parts:
+                yield flush()
+            event_id += 1
+            final_id = last_source_id if source_ids else str(event_id)
+            if kind == "done":
+                yield format_event(json.dumps(done_data or {}), event="done", event_id=final_id)
+            else:
+                yield format_event(json.dumps({"detail": value}), event="error", event_id=final_id)
+            return
+    finally:
+        # Client went away (or we finished): stop pulling from the upstream generator
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
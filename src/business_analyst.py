@@ -1,6 +1,9 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import StreamingResponse
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 @app.post("/business_analyst")
 async def business_analyst(request: Request):
@@ -40,5 +43,5 @@ async def business_analyst(request: Request):
         return StreamingResponse(generate(), media_type="text/plain")
         
     except Exception as e:
-        print(f"Error in business_analyst endpoint: {str(e)}")
+        logger.exception(f"Error in business_analyst endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
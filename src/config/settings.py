@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -12,13 +12,186 @@ class Settings(BaseSettings):
     
     # LLM Settings
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL: Optional[str] = os.getenv("OPENAI_BASE_URL")
+    GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY")
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+
+    # Model router: fallback used before the first token when the primary is throttled or down
+    LLM_FALLBACK_PROVIDER: Optional[str] = None  # "groq", "ollama" or "openai"
+    LLM_FALLBACK_MODEL: Optional[str] = None
+    LLM_CONCURRENCY_INITIAL: int = 16
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 128
+    LLM_QUEUE_MAX: int = 200
+    LLM_QUEUE_TIMEOUT: float = 10.0
+    LLM_LATENCY_TARGET: float = 5.0  # time-to-first-token above this shrinks the limit
+    LLM_FIRST_TOKEN_TIMEOUT: float = 30.0
     
+    # Auth Settings
+    SUPABASE_JWT_SECRET: Optional[str] = os.getenv("SUPABASE_JWT_SECRET")
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_DEFAULT_TTL: int = 300  # for tokens without an exp claim
+
     # Database Settings
     _supabase_url: Optional[str] = os.getenv("SUPABASE_URL")
     _supabase_key: Optional[str] = os.getenv("SUPABASE_KEY")
     
     # Redis Settings (for Railway)
     REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
+
+    # Supabase HTTP connection pool
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 100
+    SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP2: bool = False
+    SUPABASE_HTTP_TIMEOUT: float = 10.0
+    SUPABASE_HTTP_CONNECT_TIMEOUT: float = 5.0
+    SUPABASE_HTTP_MAX_RETRIES: int = 2
+    SUPABASE_HTTP_RETRY_BACKOFF: float = 0.2
+
+    # Per-tenant Supabase projects supplied with a request: each gets its own smaller pool
+    TENANT_MAX_CLIENTS: int = 32
+    TENANT_HTTP_MAX_CONNECTIONS: int = 20
+    TENANT_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 5
+
+    # Startup warm-up: build the agent and open pooled connections before /ready reports ready
+    WARMUP_ENABLED: bool = True
+    WARMUP_SUPABASE_CONNECTIONS: int = 4
+
+    # Conversation history cache (Redis, or in-process LRU when REDIS_URL is unset)
+    HISTORY_CACHE_TTL: int = 3600
+    HISTORY_CACHE_MAX_MESSAGES: int = 200
+    HISTORY_CACHE_MAX_SESSIONS: int = 1000
+
+    # Context window for the LLM
+    CONTEXT_MAX_TOKENS: int = 6000
+    SUMMARY_MODEL: str = "gpt-4o-mini"
+    SUMMARY_CACHE_TTL: int = 3600
+
+    # LLM response cache
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_REPLAY_CHUNK_CHARS: int = 24
+    RESPONSE_CACHE_SEMANTIC_ENABLED: bool = False
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_EMBEDDING_MODEL: str = "text-embedding-3-small"
+
+    # Document retrieval: persistent FAISS index shared by every worker through mmap
+    RETRIEVAL_ENABLED: bool = False
+    RETRIEVAL_INDEX_DIR: str = "data/retrieval"
+    RETRIEVAL_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    RETRIEVAL_TOP_K: int = 4
+    RETRIEVAL_BATCH_SIZE: int = 32
+    RETRIEVAL_BATCH_WINDOW_MS: float = 5.0
+
+    # Content-addressed embedding cache shared by ingestion and query-time embedding
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "data/embedding_cache"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+
+    # Document ingestion: parse/split in a process pool, embed in fixed-size batches
+    INGEST_CHUNK_SIZE: int = 1000
+    INGEST_CHUNK_OVERLAP: int = 200
+    INGEST_MAX_WORKERS: Optional[int] = None
+    INGEST_MAX_PENDING_FILES: int = 16
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_CONCURRENCY: int = 2
+
+    # Business-analyst engine: "classic" (history from Supabase each turn) or "graph" (LangGraph with checkpoints)
+    BUSINESS_ANALYST_ENGINE: str = "classic"
+    # Graph checkpoints: "sqlite" (local file), "postgres" (e.g. the Supabase database) or "memory"
+    AGENT_CHECKPOINTER: str = "sqlite"
+    AGENT_CHECKPOINT_SQLITE_PATH: str = "data/checkpoints.sqlite3"
+    AGENT_CHECKPOINT_POSTGRES_URL: Optional[str] = None
+    AGENT_CHECKPOINT_POOL_SIZE: int = 10
+
+    # Corrective RAG agent (/chat/crag)
+    CRAG_MODEL: str = "gpt-4o"
+    CRAG_GRADER_MODEL: str = "gpt-4o-mini"
+    # Chunks graded at once; each grade is one LLM call
+    CRAG_GRADE_CONCURRENCY: int = 8
+    # Rewrite the query and search the web alongside retrieval instead of after grading
+    CRAG_SPECULATIVE_SEARCH: bool = True
+    CRAG_WEB_RESULTS: int = 4
+
+    # Offline batch chat (/chat/business-analyst/batch)
+    BATCH_MAX_ITEMS: int = 5000
+    # Prompts in flight at once on the LLM batch path
+    BATCH_LLM_CONCURRENCY: int = 16
+    # Conversation rows per bulk insert
+    BATCH_INSERT_SIZE: int = 500
+    # How long async job status and results stay pollable
+    BATCH_JOB_TTL: int = 86400
+    # In-process job records kept when REDIS_URL is unset
+    BATCH_MAX_LOCAL_JOBS: int = 100
+
+    # Logging: records go through a bounded queue to a writer thread
+    LOG_LEVEL: str = "INFO"
+    # "json" (one object per line) or "text"
+    LOG_FORMAT: str = "json"
+    # Include message bodies in debug logs; off by default so chat content stays out of logs
+    LOG_PAYLOADS: bool = False
+    # Fraction of requests whose per-request info events are logged; warnings and errors always are
+    LOG_SAMPLE_RATE: float = 0.1
+    LOG_QUEUE_MAX: int = 10000
+
+    # Resumable chat streams: generation runs apart from delivery and reconnects resume via Last-Event-ID
+    RESUMABLE_STREAMS_ENABLED: bool = True
+    # Seconds a finished stream stays resumable
+    STREAM_RESUME_TTL: int = 300
+    # Seconds without any listener before the generation is cancelled
+    STREAM_LISTENER_GRACE_SECONDS: float = 30.0
+    STREAM_MAX_GENERATION_SECONDS: int = 600
+    # In-process stream buffers kept when REDIS_URL is unset
+    STREAM_MAX_LOCAL: int = 1000
+
+    # Per-user admission control for chat streams, shared across workers through Redis
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_RATE_PER_MINUTE: float = 30.0
+    ADMISSION_BURST: int = 10
+    ADMISSION_MAX_IN_FLIGHT_PER_USER: int = 3
+    # Streams one worker generates at once; past this, requests queue fairly by user
+    ADMISSION_MAX_CONCURRENT_STREAMS: int = 64
+    ADMISSION_MAX_QUEUED: int = 256
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    # Seconds an in-flight lease outlives its last refresh; running requests refresh it every third of this
+    ADMISSION_LEASE_SECONDS: int = 60
+    # Fair-queuing weight by user id, e.g. '{"user-a": 2}'; unlisted users weigh 1
+    ADMISSION_USER_WEIGHTS: Dict[str, float] = {}
+    # Users whose buckets are kept in process when REDIS_URL is unset
+    ADMISSION_MAX_LOCAL_USERS: int = 10000
+
+    # Sessions archived by one POST /sessions/archive
+    SESSION_ARCHIVE_MAX_IDS: int = 1000
+
+    # Tools the business analyst may call: calculator, wikipedia, web_search, describe_table
+    AGENT_TOOLS: List[str] = []
+    AGENT_TOOL_TIMEOUT: float = 10.0
+    # Model steps per answer; the last one is made without tools so it has to answer
+    AGENT_TOOL_MAX_STEPS: int = 4
+    # Threads for tools that only have a blocking implementation
+    AGENT_TOOL_THREADS: int = 8
+    # Results of deterministic tools (calculator, wikipedia, describe_table) are reused this long
+    AGENT_TOOL_CACHE_TTL: int = 3600
+    AGENT_TOOL_CACHE_MAX_ENTRIES: int = 1024
+
+    # Attach concurrent identical prompts to a single upstream generation
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Server-sent events framing
+    SSE_COALESCE_MS: float = 25.0
+    SSE_COALESCE_BYTES: int = 512
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Write-behind persistence of conversation messages
+    CONVERSATION_WRITE_MODE: str = "fast"  # "fast" enqueues, "durable" awaits the insert
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.05
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+    WRITE_BEHIND_MAX_RETRIES: int = 5
+    WRITE_BEHIND_RETRY_BACKOFF: float = 0.5
+    WRITE_BEHIND_MAX_CONCURRENT_WRITES: int = 8
     
     class Config:
         case_sensitive = True
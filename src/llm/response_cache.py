@@ -0,0 +1,229 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from langchain.schema import BaseMessage
+from src.config.settings import settings
+from src.memory.memory_manager import get_memory_manager
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a cache entry"""
+    return " ".join(str(text).split()).casefold()
+
+
+def cache_key(model: str, params: Dict[str, Any], messages: Sequence[BaseMessage], tenant: Optional[str] = None) -> str:
+    """Stable hash of model, sampling parameters and the normalized message list, per tenant project"""
+    payload = {
+        "model": model,
+        "params": params,
+        "messages": [[message.type, normalize_text(message.content)] for message in messages],
+    }
+    if tenant:
+        payload["tenant"] = tenant
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def split_for_replay(text: str, chunk_chars: int) -> List[str]:
+    """Split a cached answer into stream-sized chunks on word boundaries"""
+    chunks, current = [], []
+    size = 0
+    for word in text.split(" "):
+        current.append(word)
+        size += len(word) + 1
+        if size >= chunk_chars:
+            chunks.append(" ".join(current) + " ")
+            current, size = [], 0
+    if current:
+        chunks.append(" ".join(current))
+    elif chunks:
+        chunks[-1] = chunks[-1][:-1]
+    return chunks
+
+
+class SemanticResponseCache:
+    """Embedding-similarity tier: matches a reworded final question within an identical context.
+
+    Entries are partitioned by the hash of everything before the last message, and each
+    partition holds a small FAISS inner-product index over normalized question embeddings.
+    """
+
+    def __init__(self, embeddings=None, threshold: Optional[float] = None, max_partitions: Optional[int] = None,
+                 max_entries_per_partition: int = 256, ttl: Optional[int] = None):
+        import faiss
+        import numpy as np
+        self._faiss = faiss
+        self._np = np
+        self._embeddings = embeddings
+        self.threshold = threshold or settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD
+        self.max_partitions = max_partitions or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.max_entries_per_partition = max_entries_per_partition
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self._partitions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_community.embeddings import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(
+                model=settings.RESPONSE_CACHE_EMBEDDING_MODEL,
+                openai_api_key=settings.OPENAI_API_KEY
+            )
+        return self._embeddings
+
+    async def _embed(self, text: str):
+        vector = self._np.asarray([await self.embeddings.aembed_query(normalize_text(text))], dtype="float32")
+        self._faiss.normalize_L2(vector)
+        return vector
+
+    def _rebuild(self, partition: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        partition["entries"] = [e for e in partition["entries"] if e[1] > now][-self.max_entries_per_partition:]
+        index = self._faiss.IndexFlatIP(partition["dim"])
+        if partition["entries"]:
+            index.add(self._np.vstack([e[0] for e in partition["entries"]]))
+        partition["index"] = index
+
+    async def get(self, context_key: str, question: str) -> Optional[str]:
+        partition = self._partitions.get(context_key)
+        if partition is None or not partition["entries"]:
+            return None
+        self._partitions.move_to_end(context_key)
+        vector = await self._embed(question)
+        scores, ids = partition["index"].search(vector, 1)
+        position = int(ids[0][0])
+        if position < 0 or float(scores[0][0]) < self.threshold:
+            return None
+        _, expires_at, text = partition["entries"][position]
+        if expires_at <= time.monotonic():
+            self._rebuild(partition)
+            return None
+        return text
+
+    async def put(self, context_key: str, question: str, text: str) -> None:
+        vector = await self._embed(question)
+        partition = self._partitions.get(context_key)
+        if partition is None:
+            partition = {"dim": vector.shape[1], "entries": [], "index": self._faiss.IndexFlatIP(vector.shape[1])}
+            self._partitions[context_key] = partition
+        self._partitions.move_to_end(context_key)
+        partition["entries"].append((vector[0], time.monotonic() + self.ttl, text))
+        if len(partition["entries"]) > self.max_entries_per_partition:
+            self._rebuild(partition)
+        else:
+            partition["index"].add(vector)
+        while len(self._partitions) > self.max_partitions:
+            self._partitions.popitem(last=False)
+
+
+class ResponseCache:
+    """Exact-match cache of completed LLM answers (Redis or in-process LRU), with an optional semantic tier"""
+
+    def __init__(self, redis_client=None, ttl: Optional[int] = None, max_entries: Optional[int] = None,
+                 semantic: Optional[SemanticResponseCache] = None, replay_chunk_chars: Optional[int] = None):
+        self.redis = redis_client
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.semantic = semantic
+        self.replay_chunk_chars = replay_chunk_chars or settings.RESPONSE_CACHE_REPLAY_CHUNK_CHARS
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def _get_exact(self, key: str) -> Optional[str]:
+        if self.redis is not None:
+            return await self.redis.get(f"llm_response:{key}")
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return text
+
+    async def _put_exact(self, key: str, text: str) -> None:
+        if self.redis is not None:
+            await self.redis.set(f"llm_response:{key}", text, ex=self.ttl)
+            return
+        self._local[key] = (time.monotonic() + self.ttl, text)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def lookup(self, model: str, params: Dict[str, Any], messages: Sequence[BaseMessage],
+                     tenant: Optional[str] = None) -> Optional[str]:
+        """Return a cached answer for this exact (or semantically equivalent) request"""
+        try:
+            text = await self._get_exact(cache_key(model, params, messages, tenant))
+            if text is not None:
+                self.hits += 1
+                metrics.RESPONSE_CACHE_LOOKUPS.labels(tier="exact", result="hit").inc()
+                return text
+            metrics.RESPONSE_CACHE_LOOKUPS.labels(tier="exact", result="miss").inc()
+            if self.semantic is not None and messages:
+                text = await self.semantic.get(cache_key(model, params, messages[:-1], tenant), messages[-1].content)
+                metrics.RESPONSE_CACHE_LOOKUPS.labels(tier="semantic", result="hit" if text else "miss").inc()
+                if text is not None:
+                    self.hits += 1
+                    return text
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {str(e)}")
+        self.misses += 1
+        return None
+
+    async def store(self, model: str, params: Dict[str, Any], messages: Sequence[BaseMessage], text: str,
+                    tenant: Optional[str] = None) -> None:
+        """Cache a completed answer"""
+        if not text:
+            return
+        try:
+            await self._put_exact(cache_key(model, params, messages, tenant), text)
+            if self.semantic is not None and messages:
+                await self.semantic.put(cache_key(model, params, messages[:-1], tenant), messages[-1].content, text)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {str(e)}")
+
+    async def replay(self, text: str) -> AsyncGenerator[str, None]:
+        """Stream a cached answer back in chunks so clients see the same contract as a live generation"""
+        for chunk in split_for_replay(text, self.replay_chunk_chars):
+            yield chunk
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache from settings; None when disabled"""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    semantic = None
+    if settings.RESPONSE_CACHE_SEMANTIC_ENABLED:
+        try:
+            semantic = SemanticResponseCache()
+        except ImportError:
+            logger.warning("RESPONSE_CACHE_SEMANTIC_ENABLED is set but faiss/numpy are not installed")
+    return ResponseCache(get_memory_manager().redis_client, semantic=semantic)
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_created = False
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None when disabled in settings"""
+    global _response_cache, _response_cache_created
+    if not _response_cache_created:
+        _response_cache = create_response_cache()
+        _response_cache_created = True
+    return _response_cache
+
@@ -0,0 +1,286 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import logging
+import time
+from src.config.settings import settings
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LimiterQueueFull(Exception):
+    """The provider's wait queue is full"""
+
+
+class LimiterTimeout(Exception):
+    """No concurrency slot became free within the queue timeout"""
+
+
+class NoModelAvailable(Exception):
+    """Every configured model failed before producing a token"""
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for provider 429s, whichever client library raised them"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "RateLimit" in type(error).__name__
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one provider with a bounded FIFO wait queue.
+
+    The limit grows by 1/limit per fast success and is multiplied by decrease_factor on a
+    429 or when time-to-first-token exceeds latency_target, so it settles just under the
+    concurrency the provider will actually serve.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        latency_target: Optional[float] = None,
+        decrease_factor: float = 0.5,
+    ):
+        self.name = name
+        self.limit = float(initial_limit or settings.LLM_CONCURRENCY_INITIAL)
+        self.min_limit = min_limit or settings.LLM_CONCURRENCY_MIN
+        self.max_limit = max_limit or settings.LLM_CONCURRENCY_MAX
+        self.max_queue = settings.LLM_QUEUE_MAX if max_queue is None else max_queue
+        self.queue_timeout = settings.LLM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.latency_target = latency_target or settings.LLM_LATENCY_TARGET
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_limit)
+
+    async def acquire(self, patient: bool = False) -> None:
+        """Take a concurrency slot, waiting in line for at most queue_timeout seconds.
+
+        Patient callers (offline batches, which cap their own concurrency) skip the queue
+        bound and wait as long as it takes.
+        """
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue and not patient:
+            raise LimiterQueueFull(f"{self.name}: wait queue is full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), None if patient else self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; give it back
+                self.release("cancelled")
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise LimiterTimeout(f"{self.name}: no slot within {self.queue_timeout}s")
+            raise
+
+    def release(self, outcome: str, latency: Optional[float] = None) -> None:
+        """Return a slot and adapt the limit: outcome is success, throttled, error or cancelled"""
+        self.in_flight -= 1
+        if outcome == "throttled" or (outcome == "success" and latency is not None and latency > self.latency_target):
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        elif outcome == "success":
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        # Hand freed slots to the oldest waiters
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "in_flight": self.in_flight, "queued": len(self._waiters)}
+
+
+class ModelEndpoint:
+    """A chat model plus the limiter guarding its provider"""
+
+    def __init__(self, name: str, llm, limiter: Optional[AdaptiveLimiter] = None):
+        self.name = name
+        self.llm = llm
+        self.limiter = limiter or AdaptiveLimiter(name)
+
+
+class ModelRouter:
+    """Streams from the first endpoint that can produce a token, failing over before the first token only"""
+
+    def __init__(self, endpoints: List[ModelEndpoint], first_token_timeout: Optional[float] = None):
+        if not endpoints:
+            raise ValueError("ModelRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.first_token_timeout = first_token_timeout or settings.LLM_FIRST_TOKEN_TIMEOUT
+
+    async def astream(self, messages: list, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        last_error: Optional[BaseException] = None
+        for endpoint in self.endpoints:
+            limiter = endpoint.limiter
+            try:
+                await limiter.acquire()
+            except (LimiterQueueFull, LimiterTimeout) as e:
+                logger.warning(f"Skipping {endpoint.name}: {str(e)}")
+                metrics.LLM_FAILOVERS.labels(model=endpoint.name, reason="saturated").inc()
+                last_error = e
+                continue
+
+            started_at = time.perf_counter()
+            stream = endpoint.llm.astream(messages, **kwargs).__aiter__()
+            try:
+                first_chunk = await asyncio.wait_for(stream.__anext__(), self.first_token_timeout)
+            except StopAsyncIteration:
+                limiter.release("success", time.perf_counter() - started_at)
+                return
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                limiter.release("throttled" if throttled else "error")
+                await _aclose(stream)
+                reason = "throttled" if throttled else ("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                logger.warning(f"{endpoint.name} failed before the first token ({reason}): {str(e)}")
+                metrics.LLM_FAILOVERS.labels(model=endpoint.name, reason=reason).inc()
+                last_error = e
+                continue
+            except BaseException:
+                limiter.release("cancelled")
+                await _aclose(stream)
+                raise
+
+            # Committed to this endpoint: errors from here on reach the caller
+            latency = time.perf_counter() - started_at
+            outcome = "cancelled"
+            try:
+                yield first_chunk
+                async for chunk in stream:
+                    yield chunk
+                outcome = "success"
+            except Exception as e:
+                outcome = "throttled" if is_rate_limited(e) else "error"
+                raise
+            finally:
+                limiter.release(outcome, latency)
+                await _aclose(stream)
+            return
+        raise NoModelAvailable(f"No model available: {str(last_error)}") from last_error
+
+    async def abatch_as_completed(
+        self, inputs: List[list], max_concurrency: Optional[int] = None, **kwargs: Any
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Run many prompts concurrently on each model, yielding (index, message or exception) as they finish.
+
+        Prompts that fail on one endpoint are retried on the next; the last endpoint's errors are
+        yielded. Each call takes a slot from the endpoint's adaptive limiter, so batches back off on
+        429s alongside interactive traffic; max_concurrency caps the batch further.
+        """
+        remaining = list(range(len(inputs)))
+        for position, endpoint in enumerate(self.endpoints):
+            is_last = position == len(self.endpoints) - 1
+            failed = []
+            async for offset, result in _gated_as_completed(
+                endpoint, [inputs[index] for index in remaining], max_concurrency, **kwargs
+            ):
+                index = remaining[offset]
+                if isinstance(result, Exception) and not is_last:
+                    reason = "throttled" if is_rate_limited(result) else "error"
+                    metrics.LLM_FAILOVERS.labels(model=endpoint.name, reason=reason).inc()
+                    failed.append(index)
+                    continue
+                yield index, result
+            if not failed:
+                return
+            logger.warning(f"{len(failed)} batch prompts failed on {endpoint.name}, retrying on the next model")
+            remaining = sorted(failed)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint.name: endpoint.limiter.stats() for endpoint in self.endpoints}
+
+
+async def _limited_invoke(endpoint: ModelEndpoint, prompt: Any, **kwargs: Any) -> Any:
+    """ainvoke under the endpoint's limiter, reporting how the call went"""
+    limiter = endpoint.limiter
+    await limiter.acquire(patient=True)
+    outcome = "cancelled"
+    try:
+        result = await endpoint.llm.ainvoke(prompt, **kwargs)
+        outcome = "success"
+        return result
+    except Exception as e:
+        outcome = "throttled" if is_rate_limited(e) else "error"
+        raise
+    finally:
+        # No latency: a whole completion can't be held to the time-to-first-token target
+        limiter.release(outcome)
+
+
+async def _gated_as_completed(
+    endpoint: ModelEndpoint, inputs: List[Any], max_concurrency: Optional[int], **kwargs: Any
+) -> AsyncIterator[Tuple[int, Any]]:
+    """Runnable.abatch_as_completed with a working cap (langchain-core 0.2 ignores max_concurrency there)"""
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run(index: int, prompt: Any) -> Tuple[int, Any]:
+        try:
+            if semaphore is None:
+                return index, await _limited_invoke(endpoint, prompt, **kwargs)
+            async with semaphore:
+                return index, await _limited_invoke(endpoint, prompt, **kwargs)
+        except Exception as e:
+            return index, e
+
+    tasks = [asyncio.ensure_future(run(index, prompt)) for index, prompt in enumerate(inputs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early: don't leave prompts running
+        for task in tasks:
+            task.cancel()
+
+
+async def _aclose(stream) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+def create_chat_model(provider: str, model: str, **params: Any):
+    """Instantiate a streaming chat model for a provider, importing its integration lazily"""
+    if provider == "openai":
+        from langchain_community.chat_models import ChatOpenAI
+        kwargs = {"base_url": settings.OPENAI_BASE_URL} if settings.OPENAI_BASE_URL else {}
+        return ChatOpenAI(model=model, streaming=True, api_key=settings.OPENAI_API_KEY, **kwargs, **params)
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=model, streaming=True, api_key=settings.GROQ_API_KEY, **params)
+    if provider == "ollama":
+        from langchain_ollama import ChatOllama
+        return ChatOllama(model=model, base_url=settings.OLLAMA_BASE_URL, **params)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def create_router(primary_model: str, **params: Any) -> ModelRouter:
+    """Primary OpenAI model plus the optional fallback configured in settings"""
+    endpoints = [ModelEndpoint(f"openai:{primary_model}", create_chat_model("openai", primary_model, **params))]
+    if settings.LLM_FALLBACK_PROVIDER and settings.LLM_FALLBACK_MODEL:
+        name = f"{settings.LLM_FALLBACK_PROVIDER}:{settings.LLM_FALLBACK_MODEL}"
+        try:
+            endpoints.append(ModelEndpoint(
+                name,
+                create_chat_model(settings.LLM_FALLBACK_PROVIDER, settings.LLM_FALLBACK_MODEL, **params)
+            ))
+        except ImportError as e:
+            logger.warning(f"Fallback model {name} is unavailable: {str(e)}")
+    return ModelRouter(endpoints)
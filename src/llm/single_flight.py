@@ -0,0 +1,92 @@
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import logging
+from src.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One upstream generation and the buffer its subscribers read from"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.condition = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical generations onto one upstream stream.
+
+    The first caller for a key starts the upstream generation in its own task; every caller,
+    including late joiners, replays the buffered chunks from the start and then follows the
+    live stream. The upstream task is independent of any one subscriber, so a client that
+    disconnects does not cut the stream short for the others; once the last subscriber is
+    gone the upstream generation is cancelled rather than paid for with nobody reading it.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncGenerator[str, None]:
+        """Yield the chunks of the generation for key, starting it with factory() if none is running"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._produce(key, flight, factory))
+            metrics.LLM_UPSTREAM_GENERATIONS.inc()
+        else:
+            metrics.LLM_COALESCED_REQUESTS.inc()
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.condition:
+                    await flight.condition.wait_for(lambda: len(flight.chunks) > position or flight.done)
+                    new_chunks = flight.chunks[position:]
+                    done = flight.done
+                for chunk in new_chunks:
+                    yield chunk
+                position += len(new_chunks)
+                if done and position >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                # Detach first so a request arriving now starts a fresh generation
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _produce(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for chunk in factory():
+                async with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except BaseException as e:
+            flight.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            # New requests after this point start a fresh generation (or hit the response cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            metrics.LLM_UPSTREAM_GENERATIONS.dec()
+            async with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+
+# Create a singleton instance
+single_flight = SingleFlight()
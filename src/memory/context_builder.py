@@ -0,0 +1,259 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+import json
+import logging
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from src.config.settings import settings
+from src.memory.memory_manager import MemoryManager, get_memory_manager, tenant_of
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional, falls back to a character heuristic
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when installed, otherwise approximates 4 characters per token"""
+
+    def __init__(self, model: str = "gpt-4o"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def count_message(self, content: str) -> int:
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse Supabase/isoformat timestamps into aware UTC datetimes so they compare reliably"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class SessionSummaryStore:
+    """Rolling per-session summaries, persisted in Supabase and cached in Redis or in-process"""
+
+    table = "conversation_summaries"
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        memory: Optional[MemoryManager] = None,
+    ):
+        self.redis = redis_client
+        self._memory = memory
+        self.ttl = ttl or settings.SUMMARY_CACHE_TTL
+        self.max_sessions = max_sessions or settings.HISTORY_CACHE_MAX_SESSIONS
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @property
+    def memory(self) -> MemoryManager:
+        # Resolved on first query, so building the store never requires Supabase settings
+        if self._memory is None:
+            self._memory = get_memory_manager()
+        return self._memory
+
+    @staticmethod
+    def key(user_id: str, session_id: str, tenant: Optional[str] = None) -> str:
+        if tenant:
+            return f"summary:{tenant}:{user_id}:{session_id}"
+        return f"summary:{user_id}:{session_id}"
+
+    async def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            raw = await self.redis.get(key)
+            return json.loads(raw) if raw else None
+        summary = self._local.get(key)
+        if summary is not None:
+            self._local.move_to_end(key)
+        return summary
+
+    async def _cache_set(self, key: str, summary: Dict[str, Any]) -> None:
+        if self.redis is not None:
+            await self.redis.set(key, json.dumps(summary), ex=self.ttl)
+            return
+        self._local[key] = summary
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_sessions:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id: str, session_id: str, jwt_token: str, memory: Optional[MemoryManager] = None) -> Dict[str, Any]:
+        """Return {"summary", "summarized_until"}; an empty summary when the session has none yet"""
+        key = self.key(user_id, session_id, tenant_of(memory))
+        try:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"Summary cache read failed: {str(e)}")
+        rows = await (memory or self.memory).get_long_term(
+            table=self.table,
+            query={"session_id": session_id, "user_id": user_id},
+            jwt_token=jwt_token,
+            select="summary,summarized_until",
+            limit=1
+        )
+        summary = rows[0] if rows else {"summary": "", "summarized_until": None}
+        try:
+            # Cache empty summaries too, so new sessions don't hit Supabase every turn
+            await self._cache_set(key, summary)
+        except Exception as e:
+            logger.warning(f"Summary cache write failed: {str(e)}")
+        return summary
+
+    async def save(
+        self,
+        user_id: str,
+        session_id: str,
+        jwt_token: str,
+        summary: Dict[str, Any],
+        memory: Optional[MemoryManager] = None,
+    ) -> None:
+        await (memory or self.memory).store_long_term(
+            table=self.table,
+            data={
+                "session_id": session_id,
+                "user_id": user_id,
+                "summary": summary["summary"],
+                "summarized_until": summary["summarized_until"],
+                "updated_at": datetime.utcnow().isoformat()
+            },
+            jwt_token=jwt_token,
+            return_representation=False,
+            on_conflict="user_id,session_id"
+        )
+        try:
+            await self._cache_set(self.key(user_id, session_id, tenant_of(memory)), summary)
+        except Exception as e:
+            logger.warning(f"Summary cache write failed: {str(e)}")
+
+
+class ContextBuilder:
+    """Builds a token-bounded prompt: recent turns verbatim, older turns folded into a rolling summary.
+
+    Works like ConversationSummaryBufferMemory, except the summary is stored per session and
+    only the turns that fell out of the window since the last update are summarized.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+        summary_store: Optional[SessionSummaryStore] = None,
+        summary_llm=None,
+    ):
+        self.max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+        self.counter = counter or TokenCounter()
+        self.summary_store = summary_store or SessionSummaryStore(get_memory_manager().redis_client)
+        self._summary_llm = summary_llm
+
+    @property
+    def summary_llm(self):
+        if self._summary_llm is None:
+            from src.llm.router import create_chat_model
+            self._summary_llm = create_chat_model("openai", settings.SUMMARY_MODEL, temperature=0)
+        return self._summary_llm
+
+    @staticmethod
+    def to_message(msg: Dict[str, Any]) -> BaseMessage:
+        if msg["role"] == "user":
+            return HumanMessage(content=msg["content"])
+        return AIMessage(content=msg["content"])
+
+    def build(
+        self,
+        system_message: SystemMessage,
+        history: List[Dict[str, Any]],
+        user_input: str,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[BaseMessage], List[Dict[str, Any]]]:
+        """Return (messages for the LLM, older messages not yet covered by the summary)"""
+        summary_text = (summary or {}).get("summary") or ""
+        budget = (
+            self.max_tokens
+            - self.counter.count_message(system_message.content)
+            - self.counter.count_message(user_input)
+            - (self.counter.count_message(summary_text) if summary_text else 0)
+        )
+
+        # Walk back from the newest turn until the budget is spent
+        kept = 0
+        for msg in reversed(history):
+            cost = self.counter.count_message(msg["content"])
+            if cost > budget:
+                break
+            budget -= cost
+            kept += 1
+        recent = history[len(history) - kept:] if kept else []
+        older = history[:len(history) - kept]
+
+        summarized_until = parse_timestamp((summary or {}).get("summarized_until"))
+        overflow = [
+            msg for msg in older
+            if summarized_until is None or (parse_timestamp(msg.get("created_at")) or summarized_until) > summarized_until
+        ]
+
+        messages: List[BaseMessage] = [system_message]
+        if summary_text:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary_text}"))
+        messages.extend(self.to_message(msg) for msg in recent)
+        messages.append(HumanMessage(content=user_input))
+        return messages, overflow
+
+    async def summarize(self, summary_text: str, overflow: List[Dict[str, Any]]) -> str:
+        """Progressively summarize: the previous summary plus the new turns"""
+        new_lines = "\n".join(
+            f"{'Human' if msg['role'] == 'user' else 'AI'}: {msg['content']}" for msg in overflow
+        )
+        result = await self.summary_llm.ainvoke(SUMMARY_PROMPT.format(summary=summary_text, new_lines=new_lines))
+        return result.content
+
+    async def fold_into_summary(
+        self,
+        user_id: str,
+        session_id: str,
+        jwt_token: str,
+        summary: Optional[Dict[str, Any]],
+        overflow: List[Dict[str, Any]],
+        memory: Optional[MemoryManager] = None,
+    ) -> Dict[str, Any]:
+        """Extend the stored summary with the turns that dropped out of the window"""
+        text = await self.summarize((summary or {}).get("summary") or "", overflow)
+        updated = {"summary": text, "summarized_until": overflow[-1].get("created_at")}
+        await self.summary_store.save(user_id, session_id, jwt_token, updated, memory=memory)
+        return updated
+
+
+_context_builder: Optional[ContextBuilder] = None
+
+
+def get_context_builder() -> ContextBuilder:
+    """Process-wide ContextBuilder backed by the shared summary store"""
+    global _context_builder
+    if _context_builder is None:
+        _context_builder = ContextBuilder()
+    return _context_builder
+
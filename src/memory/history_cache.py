@@ -0,0 +1,184 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+import json
+import logging
+import time
+from src.config.settings import settings
+from src.memory.memory_manager import get_memory_manager
+
+logger = logging.getLogger(__name__)
+
+# Append only when the session is already cached, otherwise a partial history would be served as complete
+APPEND_IF_CACHED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+
+class LocalHistoryBackend:
+    """In-process LRU of recent session histories, used when REDIS_URL is unset"""
+
+    def __init__(self, max_sessions: int, max_messages: int, ttl: int):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, messages = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return list(messages)
+
+    async def set(self, key: str, messages: List[Dict[str, Any]]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, list(messages[-self.max_messages:]))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    async def append(self, key: str, message: Dict[str, Any]) -> bool:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return False
+        messages = entry[1]
+        messages.append(message)
+        if len(messages) > self.max_messages:
+            del messages[:len(messages) - self.max_messages]
+        self._entries[key] = (time.monotonic() + self.ttl, messages)
+        self._entries.move_to_end(key)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+class RedisHistoryBackend:
+    """Session histories stored as capped Redis lists on the asyncio client"""
+
+    def __init__(self, redis_client, max_messages: int, ttl: int):
+        self.redis = redis_client
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._append_script = redis_client.register_script(APPEND_IF_CACHED_SCRIPT)
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.expire(key, self.ttl)
+            raw, _ = await pipe.execute()
+        if not raw:
+            return None
+        return [json.loads(item) for item in raw]
+
+    async def set(self, key: str, messages: List[Dict[str, Any]]) -> None:
+        messages = messages[-self.max_messages:]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if messages:
+                pipe.rpush(key, *[json.dumps(m) for m in messages])
+                pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def append(self, key: str, message: Dict[str, Any]) -> bool:
+        result = await self._append_script(keys=[key], args=[json.dumps(message), self.max_messages, self.ttl])
+        return bool(result)
+
+    async def delete(self, key: str) -> None:
+        await self.redis.delete(key)
+
+
+class HistoryCache:
+    """Hot cache of recent conversation messages per session.
+
+    Reads fall back to Supabase on a miss and writes go through from save_conversation.
+    Cache failures are logged and treated as misses so chat keeps working without Redis.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_sessions: Optional[int] = None,
+        max_messages: Optional[int] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.max_messages = max_messages or settings.HISTORY_CACHE_MAX_MESSAGES
+        ttl = ttl or settings.HISTORY_CACHE_TTL
+        if redis_client is not None:
+            self.backend = RedisHistoryBackend(redis_client, self.max_messages, ttl)
+        else:
+            self.backend = LocalHistoryBackend(max_sessions or settings.HISTORY_CACHE_MAX_SESSIONS, self.max_messages, ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(user_id: str, session_id: str, tenant: Optional[str] = None) -> str:
+        # Tenant projects get their own namespace; their user and session ids may collide with ours
+        if tenant:
+            return f"history:{tenant}:{user_id}:{session_id}"
+        return f"history:{user_id}:{session_id}"
+
+    async def get(self, user_id: str, session_id: str, tenant: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached history for a session, or None on a miss"""
+        try:
+            messages = await self.backend.get(self.key(user_id, session_id, tenant))
+        except Exception as e:
+            logger.warning(f"History cache read failed: {str(e)}")
+            messages = None
+        if messages is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return messages
+
+    async def set(self, user_id: str, session_id: str, messages: List[Dict[str, Any]], tenant: Optional[str] = None) -> None:
+        """Replace the cached history for a session"""
+        try:
+            await self.backend.set(self.key(user_id, session_id, tenant), messages)
+        except Exception as e:
+            logger.warning(f"History cache write failed: {str(e)}")
+
+    async def append(self, user_id: str, session_id: str, message: Dict[str, Any], tenant: Optional[str] = None) -> bool:
+        """Append a message if the session is cached; returns False when nothing was cached"""
+        try:
+            return await self.backend.append(self.key(user_id, session_id, tenant), message)
+        except Exception as e:
+            logger.warning(f"History cache append failed: {str(e)}")
+            # Drop the entry so the next read refills it from Supabase instead of serving a stale list
+            await self.invalidate(user_id, session_id, tenant)
+            return False
+
+    async def invalidate(self, user_id: str, session_id: str, tenant: Optional[str] = None) -> None:
+        try:
+            await self.backend.delete(self.key(user_id, session_id, tenant))
+        except Exception as e:
+            logger.warning(f"History cache invalidation failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if isinstance(self.backend, RedisHistoryBackend) else "local",
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_history_cache: Optional[HistoryCache] = None
+
+
+def get_history_cache() -> HistoryCache:
+    """Process-wide HistoryCache sharing the memory manager's Redis client"""
+    global _history_cache
+    if _history_cache is None:
+        _history_cache = HistoryCache(get_memory_manager().redis_client)
+    return _history_cache
+
@@ -0,0 +1,187 @@
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import random
+import httpx
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Methods that can safely be re-sent after the server answered with a 5xx
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"}
+# The gateway refused or could not reach PostgREST, so even inserts can be retried.
+# 504 is not among them: a gateway timeout can arrive after the write has committed.
+GATEWAY_STATUSES = {502, 503}
+# Failures before the request was sent; retrying them can never apply a write twice
+CONNECT_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+)
+# Failures after the request may have reached the server; only idempotent methods retry these
+RETRYABLE_ERRORS = CONNECT_ERRORS + (
+    httpx.ReadError,
+    httpx.WriteError,
+    httpx.RemoteProtocolError,
+)
+
+
+class SupabaseHTTPClient:
+    """Long-lived, pooled httpx client shared by every Supabase REST call in the process"""
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_connections = max_connections or settings.SUPABASE_HTTP_MAX_CONNECTIONS
+        self.max_keepalive_connections = max_keepalive_connections or settings.SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS
+        self.keepalive_expiry = keepalive_expiry if keepalive_expiry is not None else settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY
+        self.http2 = settings.SUPABASE_HTTP2 if http2 is None else http2
+        self.timeout = timeout or settings.SUPABASE_HTTP_TIMEOUT
+        self.connect_timeout = connect_timeout or settings.SUPABASE_HTTP_CONNECT_TIMEOUT
+        self.max_retries = settings.SUPABASE_HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.SUPABASE_HTTP_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._closed = False
+        self._in_flight = 0
+        self._requests_total = 0
+        self._retries_total = 0
+        self._errors_total = 0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("SUPABASE_HTTP2 is enabled but the 'h2' package is missing, falling back to HTTP/1.1")
+                http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            transport=self._transport,
+        )
+
+    async def start(self) -> None:
+        """Open the shared client (called from the app lifespan)"""
+        self._closed = False
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+            logger.info("Supabase HTTP client started (max_connections=%s, http2=%s)", self.max_connections, self.http2)
+
+    async def close(self) -> None:
+        """Close the shared client and release pooled connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Supabase HTTP client closed")
+        self._client = None
+        self._closed = True
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so scripts that never run the app lifespan still work, but never
+        # reopened behind close(): a pool nobody owns any more would never be closed again
+        if self._closed:
+            raise RuntimeError("Supabase HTTP client is closed")
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    def _should_retry(self, method: str, status_code: int) -> bool:
+        if status_code in GATEWAY_STATUSES:
+            return True
+        return status_code >= 500 and method in IDEMPOTENT_METHODS
+
+    async def _sleep_backoff(self, attempt: int) -> None:
+        delay = self.retry_backoff * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Send a request through the pool, retrying with backoff where a retry cannot duplicate a write.
+
+        Idempotent methods retry 5xx answers and dropped connections; POST only retries gateway
+        refusals and errors raised before the request was sent.
+        """
+        method = method.upper()
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, self.connect_timeout))
+        attempt = 0
+        self._in_flight += 1
+        try:
+            while True:
+                self._requests_total += 1
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries or (method not in IDEMPOTENT_METHODS and not isinstance(e, CONNECT_ERRORS)):
+                        self._errors_total += 1
+                        raise
+                    logger.warning("%s %s failed (%s), retrying", method, url, type(e).__name__)
+                else:
+                    if not self._should_retry(method, response.status_code) or attempt >= self.max_retries:
+                        return response
+                    logger.warning("%s %s returned %s, retrying", method, url, response.status_code)
+                    await response.aclose()
+                await self._sleep_backoff(attempt)
+                attempt += 1
+                self._retries_total += 1
+        finally:
+            self._in_flight -= 1
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool usage and request counters"""
+        stats = {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "http2": self.http2,
+            "in_flight_requests": self._in_flight,
+            "requests_total": self._requests_total,
+            "retries_total": self._retries_total,
+            "errors_total": self._errors_total,
+            "connections": 0,
+            "idle_connections": 0,
+            "active_connections": 0,
+            "queued_requests": 0,
+        }
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+            idle = sum(1 for conn in connections if conn.is_idle())
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = idle
+            stats["active_connections"] = len(connections) - idle
+            stats["queued_requests"] = sum(1 for req in getattr(pool, "_requests", []) if req.is_queued())
+        return stats
+
+
+# Create a singleton instance
+supabase_http = SupabaseHTTPClient()
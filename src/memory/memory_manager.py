@@ -1,33 +1,115 @@
-from typing import Any, Dict, Optional
-import redis
-from supabase import create_client, Client
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from redis import asyncio as aioredis
 from src.config.settings import settings
+from src.memory.http_client import SupabaseHTTPClient, supabase_http
+from src.monitoring.metrics import SUPABASE_REQUEST_SECONDS
+import asyncio
 import os
-import httpx
 import logging
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FILTER_OPERATORS = {"eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is", "in"}
+
+
+def format_filter_value(value: Any) -> str:
+    """Render a Python value the way PostgREST expects it in a filter"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    return str(value)
+
+
+def build_filter_params(query: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Translate a query dict into PostgREST filter params (repeated keys allowed for ranges)"""
+    params = []
+    for column, condition in query.items():
+        conditions = condition if isinstance(condition, list) else [condition]
+        for cond in conditions:
+            if isinstance(cond, tuple):
+                operator, value = cond
+                if operator not in FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+            else:
+                operator, value = ("is", cond) if cond is None else ("eq", cond)
+            if operator == "in":
+                value = "(" + ",".join(format_filter_value(v) for v in value) + ")"
+            else:
+                value = format_filter_value(value)
+            params.append((column, f"{operator}.{value}"))
+    return params
+
+
+def keyset_filter(columns: Tuple[str, str], cursor: Tuple[Any, Any], operator: str) -> str:
+    """Row-value comparison (a, b) < (x, y) expressed as a PostgREST or= filter"""
+    (first, second), (first_value, second_value) = columns, cursor
+    # Quote values so timestamps with ':' or '+' survive PostgREST's logic-tree parser
+    first_value = '"' + format_filter_value(first_value) + '"'
+    second_value = '"' + format_filter_value(second_value) + '"'
+    return (
+        f"({first}.{operator}.{first_value},"
+        f"and({first}.eq.{first_value},{second}.{operator}.{second_value}))"
+    )
+
+
+class SupabaseError(Exception):
+    """A PostgREST request answered with an error status"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class MemoryManager:
-    def __init__(self):
-        # Initialize Redis client for short-term memory
-        self.redis_client = redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+    def __init__(
+        self,
+        http_client: Optional[SupabaseHTTPClient] = None,
+        supabase_url: Optional[str] = None,
+        supabase_key: Optional[str] = None,
+        redis_client=None,
+        tenant: Optional[str] = None,
+    ):
+        # Initialize asyncio Redis client for short-term memory so calls never block the event loop;
+        # tenant managers borrow the default manager's client instead of opening another pool
+        self._owns_redis = redis_client is None
+        if redis_client is None and settings.REDIS_URL:
+            redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.redis_client = redis_client
         
         # Initialize Supabase client for long-term memory
-        self.supabase_url = os.getenv("SUPABASE_URL") or settings.SUPABASE_URL
-        self.supabase_key = os.getenv("SUPABASE_KEY") or settings.SUPABASE_KEY
+        self.supabase_url = supabase_url or os.getenv("SUPABASE_URL") or settings.SUPABASE_URL
+        self.supabase_key = supabase_key or os.getenv("SUPABASE_KEY") or settings.SUPABASE_KEY
         if not self.supabase_url or not self.supabase_key:
             raise Exception("Supabase URL and Key must be set in environment variables or settings.")
-        logger.info("MemoryManager initialized with Supabase URL and key")
+        # Shared pooled client, opened and closed by the app lifespan
+        self.http = http_client or supabase_http
+        # Namespace for cache keys of a tenant's project; None for the default project
+        self.tenant = tenant
+        # Work that still needs this manager after the request returns: queued rows, streams, background jobs
+        self.holds = 0
+        logger.debug("MemoryManager initialized for %s", self.supabase_url)
+
+    def hold(self) -> Callable[[], None]:
+        """Keep this manager open until the returned release() is called; calling it again is a no-op"""
+        self.holds += 1
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.holds -= 1
+
+        return release
 
     async def store_short_term(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Store data in Redis with TTL (default 1 hour)"""
         if not self.redis_client:
             raise Exception("Redis client not initialized")
         try:
-            return self.redis_client.setex(key, ttl, str(value))
+            return await self.redis_client.setex(key, ttl, str(value))
         except Exception as e:
             raise Exception(f"Failed to store in Redis: {str(e)}")
 
@@ -36,26 +118,41 @@ class MemoryManager:
         if not self.redis_client:
             raise Exception("Redis client not initialized")
         try:
-            return self.redis_client.get(key)
+            return await self.redis_client.get(key)
         except Exception as e:
             raise Exception(f"Failed to retrieve from Redis: {str(e)}")
 
-    async def store_long_term(self, table: str, data: Dict[str, Any], jwt_token: str) -> Dict[str, Any]:
+    async def store_long_term(
+        self,
+        table: str,
+        data: Union[Dict[str, Any], List[Dict[str, Any]]],
+        jwt_token: str,
+        return_representation: bool = True,
+        on_conflict: Optional[str] = None
+    ) -> Any:
+        """Insert one row, or a list of rows as a single PostgREST bulk insert.
+
+        With on_conflict set, rows colliding on those columns are merged (upsert).
+        """
         url = f"{self.supabase_url}/rest/v1/{table}"
+        prefer = ["return=representation" if return_representation else "return=minimal"]
+        if on_conflict:
+            url = f"{url}?on_conflict={on_conflict}"
+            prefer.append("resolution=merge-duplicates")
         headers = {
             "apikey": self.supabase_key,
             "Authorization": f"Bearer {jwt_token}",
             "Content-Type": "application/json",
-            "Prefer": "return=representation"
+            "Prefer": ",".join(prefer)
         }
-        logger.info(f"Storing data in {table}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=data)
-            if response.status_code not in (200, 201):
-                logger.error(f"Failed to store in Supabase: {response.text}")
-                raise Exception(f"Failed to store in Supabase: {response.text}")
-            logger.info(f"Successfully stored data in {table}")
-            return response.json()
+        logger.debug("Storing data in %s", table)
+        with SUPABASE_REQUEST_SECONDS.labels(operation="store").time():
+            response = await self.http.post(url, headers=headers, json=data)
+        if response.status_code not in (200, 201):
+            logger.error(f"Failed to store in Supabase: {response.text}")
+            raise SupabaseError(f"Failed to store in Supabase: {response.text}", response.status_code)
+        logger.debug("Stored data in %s", table)
+        return response.json() if return_representation else []
 
     async def update_long_term(self, table: str, id: str, data: Dict[str, Any], jwt_token: str) -> Dict[str, Any]:
         url = f"{self.supabase_url}/rest/v1/{table}?id=eq.{id}"
@@ -65,16 +162,35 @@ class MemoryManager:
             "Content-Type": "application/json",
             "Prefer": "return=representation"
         }
-        logger.info(f"Updating record {id} in {table}")
-        async with httpx.AsyncClient() as client:
-            response = await client.patch(url, headers=headers, json=data)
-            if response.status_code != 200:
-                logger.error(f"Failed to update in Supabase: {response.text}")
-                raise Exception(f"Failed to update in Supabase: {response.text}")
-            logger.info(f"Successfully updated record {id} in {table}")
-            return response.json()
-
-    async def get_long_term(self, table: str, query: Dict[str, Any], jwt_token: str) -> Dict[str, Any]:
+        logger.debug("Updating record %s in %s", id, table)
+        with SUPABASE_REQUEST_SECONDS.labels(operation="update").time():
+            response = await self.http.patch(url, headers=headers, json=data)
+        if response.status_code != 200:
+            logger.error(f"Failed to update in Supabase: {response.text}")
+            raise SupabaseError(f"Failed to update in Supabase: {response.text}", response.status_code)
+        logger.debug("Updated record %s in %s", id, table)
+        return response.json()
+
+    async def get_long_term(
+        self,
+        table: str,
+        query: Dict[str, Any],
+        jwt_token: str,
+        select: Optional[str] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        before: Optional[Tuple[Any, Any]] = None,
+        after: Optional[Tuple[Any, Any]] = None,
+        cursor_columns: Tuple[str, str] = ("created_at", "id")
+    ) -> List[Dict[str, Any]]:
+        """Fetch rows from a table.
+
+        query maps columns to a value (eq), an (operator, value) tuple such as
+        ("gte", "2024-01-01") or ("in", [1, 2]), or a list of such tuples for ranges.
+        before/after are keyset cursors over cursor_columns, e.g. (created_at, id) of
+        the last row of the previous page, so paging never rescans earlier rows.
+        """
         url = f"{self.supabase_url}/rest/v1/{table}"
         headers = {
             "apikey": self.supabase_key,
@@ -82,17 +198,85 @@ class MemoryManager:
             "Content-Type": "application/json"
         }
         # Build query string
-        params = {}
-        for k, v in query.items():
-            params[k] = f"eq.{v}"
-        logger.info(f"Fetching data from {table} with query: {params}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, params=params)
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch from Supabase: {response.text}")
-                raise Exception(f"Failed to fetch from Supabase: {response.text}")
-            logger.info(f"Successfully fetched data from {table}")
-            return response.json()
-
-# Create a singleton instance
-memory_manager = MemoryManager() 
\ No newline at end of file
+        params = build_filter_params(query)
+        if select:
+            params.append(("select", select))
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        if offset:
+            params.append(("offset", str(offset)))
+        cursors = []
+        if before is not None:
+            cursors.append(keyset_filter(cursor_columns, before, "lt"))
+        if after is not None:
+            cursors.append(keyset_filter(cursor_columns, after, "gt"))
+        if len(cursors) == 1:
+            params.append(("or", cursors[0]))
+        elif cursors:
+            params.append(("and", "(" + ",".join(f"or{c}" for c in cursors) + ")"))
+        logger.debug("Fetching data from %s with query: %s", table, params)
+        with SUPABASE_REQUEST_SECONDS.labels(operation="get").time():
+            response = await self.http.get(url, headers=headers, params=params)
+        if response.status_code not in (200, 206):
+            logger.error(f"Failed to fetch from Supabase: {response.text}")
+            raise SupabaseError(f"Failed to fetch from Supabase: {response.text}", response.status_code)
+        logger.debug("Fetched data from %s", table)
+        return response.json()
+
+    async def rpc(self, function: str, params: Dict[str, Any], jwt_token: str) -> Any:
+        """Call a Postgres function exposed by PostgREST, as the caller so RLS and auth.uid() apply"""
+        url = f"{self.supabase_url}/rest/v1/rpc/{function}"
+        headers = {
+            "apikey": self.supabase_key,
+            "Authorization": f"Bearer {jwt_token}",
+            "Content-Type": "application/json"
+        }
+        logger.debug("Calling function %s", function)
+        with SUPABASE_REQUEST_SECONDS.labels(operation="rpc").time():
+            response = await self.http.post(url, headers=headers, json=params)
+        if response.status_code not in (200, 204):
+            logger.error(f"Failed to call {function} in Supabase: {response.text}")
+            raise SupabaseError(f"Failed to call {function} in Supabase: {response.text}", response.status_code)
+        return response.json() if response.status_code == 200 else None
+
+    async def start(self) -> None:
+        """Open pooled connections"""
+        await self.http.start()
+
+    async def warm_up(self, connections: Optional[int] = None) -> None:
+        """Open pooled keep-alive connections to Supabase and check that Redis answers"""
+        connections = connections or settings.WARMUP_SUPABASE_CONNECTIONS
+        url = f"{self.supabase_url}/rest/v1/"
+        headers = {"apikey": self.supabase_key}
+        # Concurrent requests each check out their own connection, which then stays idle in the pool
+        await asyncio.gather(*[self.http.request("HEAD", url, headers=headers) for _ in range(connections)])
+        if self.redis_client:
+            await self.redis_client.ping()
+
+    async def close(self) -> None:
+        """Release pooled connections"""
+        await self.http.close()
+        if self.redis_client and self._owns_redis:
+            await self.redis_client.aclose()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool usage for the Supabase REST client"""
+        return self.http.pool_stats()
+
+def tenant_of(memory: Optional[MemoryManager]) -> Optional[str]:
+    """Cache namespace of the project memory writes to; None for the default project"""
+    return getattr(memory, "tenant", None)
+
+
+_memory_manager: Optional[MemoryManager] = None
+
+
+def get_memory_manager() -> MemoryManager:
+    """Process-wide MemoryManager, created on first use rather than at import time"""
+    global _memory_manager
+    if _memory_manager is None:
+        _memory_manager = MemoryManager()
+    return _memory_manager
+ 
\ No newline at end of file
@@ -0,0 +1,73 @@
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from src.memory.history_cache import HistoryCache, get_history_cache
+from src.memory.memory_manager import MemoryManager, get_memory_manager, tenant_of
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCatalog:
+    """One summary row per session (title, message count, last update, archived).
+
+    Rows are maintained by a statement-level trigger on conversations (see the
+    conversation_sessions migration), so saving a message needs no extra round trip and
+    listing sessions reads one indexed page instead of every message.
+    """
+
+    table = "conversation_sessions"
+    columns = "session_id,title,message_count,created_at,last_updated_at,archived"
+
+    def __init__(self, memory: Optional[MemoryManager] = None, history_cache: Optional[HistoryCache] = None):
+        self._memory = memory
+        self.history_cache = history_cache or get_history_cache()
+
+    @property
+    def memory(self) -> MemoryManager:
+        # Resolved on first query, so building the catalog never requires Supabase settings
+        if self._memory is None:
+            self._memory = get_memory_manager()
+        return self._memory
+
+    async def list_page(
+        self,
+        user_id: str,
+        jwt_token: str,
+        before: Optional[Tuple[str, str]] = None,
+        limit: int = 20,
+        archived: bool = False,
+        memory: Optional[MemoryManager] = None,
+    ) -> Dict[str, Any]:
+        """Most recently updated sessions first, paged with a (last_updated_at, session_id) keyset cursor"""
+        rows = await (memory or self.memory).get_long_term(
+            table=self.table,
+            query={"user_id": user_id, "archived": archived},
+            jwt_token=jwt_token,
+            select=self.columns,
+            order="last_updated_at.desc,session_id.desc",
+            limit=limit,
+            before=before,
+            cursor_columns=("last_updated_at", "session_id")
+        )
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = {"last_updated_at": rows[-1]["last_updated_at"], "session_id": rows[-1]["session_id"]}
+        return {"sessions": rows, "next_cursor": next_cursor}
+
+    async def archive(self, user_id: str, session_ids: List[str], jwt_token: str, memory: Optional[MemoryManager] = None) -> int:
+        """Archive sessions and their messages in one call; returns how many were newly archived"""
+        archived = await (memory or self.memory).rpc("archive_sessions", {"session_ids": session_ids}, jwt_token)
+        # Archived messages drop out of history reads, so cached copies must go too
+        for session_id in session_ids:
+            await self.history_cache.invalidate(user_id, session_id, tenant_of(memory))
+        return archived or 0
+
+
+_session_catalog: Optional[SessionCatalog] = None
+
+
+def get_session_catalog() -> SessionCatalog:
+    """Process-wide session catalog over the shared memory manager"""
+    global _session_catalog
+    if _session_catalog is None:
+        _session_catalog = SessionCatalog()
+    return _session_catalog
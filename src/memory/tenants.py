@@ -0,0 +1,151 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import logging
+from src.config.settings import settings
+from src.memory.http_client import SupabaseHTTPClient
+from src.memory.memory_manager import MemoryManager, get_memory_manager
+
+logger = logging.getLogger(__name__)
+
+
+class TenantRegistry:
+    """Bounded LRU of per-project MemoryManagers, each with its own Supabase connection pool.
+
+    Requests that bring their own Supabase URL and key get the manager for that project
+    instead of rewriting global settings, so concurrent tenants never see each other's
+    credentials and repeat requests reuse warm connections. When more than max_tenants
+    projects are open, the least recently used idle ones are closed; a manager with
+    requests in flight or holds (queued rows, open streams, background jobs) is kept open
+    until a later eviction finds it idle.
+    """
+
+    def __init__(
+        self,
+        max_tenants: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        default: Optional[MemoryManager] = None,
+    ):
+        self.max_tenants = max_tenants or settings.TENANT_MAX_CLIENTS
+        self.max_connections = max_connections or settings.TENANT_HTTP_MAX_CONNECTIONS
+        self.max_keepalive_connections = max_keepalive_connections or settings.TENANT_HTTP_MAX_KEEPALIVE_CONNECTIONS
+        self._default = default
+        self._tenants: "OrderedDict[Tuple[str, str], MemoryManager]" = OrderedDict()
+        self.evictions = 0
+        self._closing: Set[asyncio.Task] = set()
+
+    @property
+    def default(self) -> MemoryManager:
+        if self._default is None:
+            self._default = get_memory_manager()
+        return self._default
+
+    @staticmethod
+    def key(supabase_url: str, supabase_key: str) -> Tuple[str, str]:
+        # Hash the key so the registry never holds a second plaintext copy as a dict key
+        return supabase_url.rstrip("/"), hashlib.sha256(supabase_key.encode()).hexdigest()
+
+    @staticmethod
+    def tenant(supabase_url: str) -> str:
+        """Cache namespace for a project, stable across key rotations"""
+        return hashlib.sha256(supabase_url.encode()).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    async def get(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None) -> MemoryManager:
+        """Manager for a Supabase project; the default project when no credentials are given"""
+        if not supabase_url or not supabase_key:
+            return self.default
+        key = self.key(supabase_url, supabase_key)
+        if key[0] == self.default.supabase_url.rstrip("/") and supabase_key == self.default.supabase_key:
+            return self.default
+        manager = self._tenants.get(key)
+        if manager is not None:
+            self._tenants.move_to_end(key)
+            return manager
+        manager = MemoryManager(
+            http_client=SupabaseHTTPClient(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            ),
+            supabase_url=key[0],
+            supabase_key=supabase_key,
+            redis_client=self.default.redis_client,
+            tenant=self.tenant(key[0]),
+        )
+        await manager.start()
+        existing = self._tenants.get(key)
+        if existing is not None:
+            # A concurrent request opened the same project while this one was starting
+            self._close_later([(key, manager)])
+            self._tenants.move_to_end(key)
+            return existing
+        self._tenants[key] = manager
+        logger.info(f"Opened Supabase client for tenant {key[0]}")
+        # Victims are picked and removed without yielding, and closed off this path: nothing
+        # else can run before the caller has the manager and holds it
+        victims = self._take_victims()
+        if victims:
+            self._close_later(victims)
+        return manager
+
+    def _close_later(self, managers: List[Tuple[Tuple[str, str], MemoryManager]]) -> None:
+        task = asyncio.create_task(self._close_victims(managers))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _take_victims(self) -> List[Tuple[Tuple[str, str], MemoryManager]]:
+        victims = []
+        # Oldest first, skipping clients that are still in use and the one just opened for the caller
+        for key in list(self._tenants)[:-1]:
+            if len(self._tenants) <= self.max_tenants:
+                break
+            manager = self._tenants[key]
+            if manager.holds or manager.pool_stats().get("in_flight_requests", 0):
+                continue
+            del self._tenants[key]
+            self.evictions += 1
+            victims.append((key, manager))
+        return victims
+
+    async def _close_victims(self, victims: List[Tuple[Tuple[str, str], MemoryManager]]) -> None:
+        for key, manager in victims:
+            try:
+                await manager.close()
+                logger.info(f"Closed idle Supabase client for tenant {key[0]}")
+            except Exception as e:
+                logger.warning(f"Closing Supabase client for tenant {key[0]} failed: {str(e)}")
+
+    async def close(self) -> None:
+        """Close every tenant pool (the default manager is owned by the app lifespan)"""
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        tenants, self._tenants = list(self._tenants.values()), OrderedDict()
+        for manager in tenants:
+            await manager.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tenants": len(self._tenants), "max_tenants": self.max_tenants, "evictions": self.evictions}
+
+
+async def release_when_done(source: AsyncIterator[Any], release: Callable[[], None]) -> AsyncGenerator[Any, None]:
+    """Yield from source, then release a manager hold however the stream ends"""
+    try:
+        async for item in source:
+            yield item
+    finally:
+        release()
+
+
+_tenant_registry: Optional[TenantRegistry] = None
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """Process-wide registry of per-tenant Supabase clients"""
+    global _tenant_registry
+    if _tenant_registry is None:
+        _tenant_registry = TenantRegistry()
+    return _tenant_registry
@@ -0,0 +1,274 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import functools
+import logging
+import httpx
+from src.config.settings import settings
+from src.memory.memory_manager import MemoryManager, SupabaseError, get_memory_manager, tenant_of
+from src.memory.history_cache import get_history_cache
+
+logger = logging.getLogger(__name__)
+
+Writer = Callable[..., Awaitable[Any]]
+FailureCallback = Callable[[str, List[Dict[str, Any]], Optional[MemoryManager]], Awaitable[None]]
+
+_STOP = object()
+
+# Throttled requests succeed later like server errors; every other 4xx fails the same way again
+RETRYABLE_CLIENT_STATUSES = {408, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Server errors and dropped connections may succeed on a retry; rejected rows never will"""
+    if isinstance(error, SupabaseError):
+        return error.status_code >= 500 or error.status_code in RETRYABLE_CLIENT_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+
+def is_row_error(error: Exception) -> bool:
+    """A permanent failure that one bad row in a bulk insert could have caused"""
+    if is_retryable(error):
+        return False
+    # An invalid token rejects every row alike
+    return not (isinstance(error, SupabaseError) and error.status_code == 401)
+
+
+class WriteBehindQueue:
+    """Batches rows from many sessions into bulk PostgREST inserts off the request path.
+
+    A single worker drains the queue in FIFO order and hands each (table, token, project)
+    group of a batch to its own write task, chained behind the group's previous write so rows
+    of one session are written in the order they were enqueued. A batch is flushed when it
+    reaches batch_size rows or flush_interval seconds after its first row, whichever comes
+    first. Server and transport errors are retried with backoff without holding up other
+    groups; a bulk insert that is rejected outright is replayed row by row so only the
+    offending rows are dropped. Once max_concurrent_writes groups are in flight, the worker
+    and then the bounded queue push back on producers.
+    """
+
+    def __init__(
+        self,
+        writer: Optional[Writer] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        on_failure: Optional[FailureCallback] = None,
+        max_concurrent_writes: Optional[int] = None,
+    ):
+        self.writer = writer or get_memory_manager().store_long_term
+        self.batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = settings.WRITE_BEHIND_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_pending = max_pending or settings.WRITE_BEHIND_MAX_PENDING
+        self.max_retries = settings.WRITE_BEHIND_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.WRITE_BEHIND_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.on_failure = on_failure
+        self.max_concurrent_writes = max_concurrent_writes or settings.WRITE_BEHIND_MAX_CONCURRENT_WRITES
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._writes: Set[asyncio.Task] = set()
+        # Latest write task per group, which the group's next write waits for
+        self._tails: Dict[Tuple[str, str, Optional[MemoryManager]], asyncio.Task] = {}
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches_written = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        """Start the flush worker on the running loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._slots = asyncio.Semaphore(self.max_concurrent_writes)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the worker"""
+        if self._worker is None:
+            return
+        if not self._worker.done():
+            await self._queue.put(_STOP)
+            await self._worker
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        self._worker = None
+        logger.info("Write-behind queue drained (%s rows written, %s dropped)", self.rows_written, self.rows_dropped)
+
+    async def enqueue(
+        self,
+        table: str,
+        row: Dict[str, Any],
+        jwt_token: str,
+        durable: bool = False,
+        memory: Optional[MemoryManager] = None,
+    ) -> None:
+        """Queue a row for insertion; with durable=True wait until it has been written.
+
+        memory selects a tenant's Supabase project; rows without one go through the default writer.
+        The tenant's manager is held open until the row has been written or dropped.
+        """
+        if self._worker is None or self._worker.done():
+            await self.start()
+        future = asyncio.get_running_loop().create_future() if durable else None
+        release = memory.hold() if memory is not None else None
+        try:
+            # Blocks only when max_pending rows are already waiting
+            await self._queue.put((table, row, jwt_token, future, memory, release))
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+        if future is not None:
+            await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple]) -> None:
+        # One bulk insert per (table, token, project): PostgREST applies RLS with the caller's JWT
+        groups: Dict[Tuple[str, str, Optional[MemoryManager]], List[Tuple]] = {}
+        for item in batch:
+            groups.setdefault((item[0], item[2], item[4]), []).append(item)
+        for key, items in groups.items():
+            await self._slots.acquire()
+            task = asyncio.create_task(self._write_group(key, items, self._tails.get(key)))
+            self._tails[key] = task
+            self._writes.add(task)
+            task.add_done_callback(functools.partial(self._write_done, key))
+
+    def _write_done(self, key: Tuple[str, str, Optional[MemoryManager]], task: asyncio.Task) -> None:
+        self._writes.discard(task)
+        self._slots.release()
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _write_group(
+        self,
+        key: Tuple[str, str, Optional[MemoryManager]],
+        items: List[Tuple],
+        previous: Optional[asyncio.Task],
+    ) -> None:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            table, jwt_token, memory = key
+            rows = [item[1] for item in items]
+            errors = await self._write_rows(table, rows, jwt_token, memory)
+        finally:
+            for item in items:
+                if item[5] is not None:
+                    item[5]()
+        for item, error in zip(items, errors):
+            future = item[3]
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+        failed = [row for row, error in zip(rows, errors) if error is not None]
+        if failed and self.on_failure:
+            try:
+                await self.on_failure(table, failed, memory)
+            except Exception as e:
+                logger.error(f"Write-behind failure callback raised: {str(e)}")
+
+    async def _write_rows(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        jwt_token: str,
+        memory: Optional[MemoryManager] = None,
+    ) -> List[Optional[Exception]]:
+        """The outcome for each row: one bulk insert, or one insert per row if the bulk one is rejected"""
+        error = await self._write_with_retry(table, rows, jwt_token, memory)
+        if error is None:
+            return [None] * len(rows)
+        if len(rows) > 1 and is_row_error(error):
+            logger.warning(f"Bulk insert into {table} rejected, writing {len(rows)} rows one at a time: {str(error)}")
+            errors = [await self._write_with_retry(table, [row], jwt_token, memory) for row in rows]
+        else:
+            errors = [error] * len(rows)
+        dropped = [e for e in errors if e is not None]
+        if dropped:
+            self.rows_dropped += len(dropped)
+            logger.error(f"Dropping {len(dropped)} rows for {table}: {str(dropped[0])}")
+        return errors
+
+    async def _write_with_retry(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        jwt_token: str,
+        memory: Optional[MemoryManager] = None,
+    ) -> Optional[Exception]:
+        writer = self.writer if memory is None else memory.store_long_term
+        attempt = 0
+        while True:
+            try:
+                await writer(table=table, data=rows, jwt_token=jwt_token, return_representation=False)
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                return None
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    return e
+                logger.warning(f"Bulk insert into {table} failed, retrying: {str(e)}")
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "batches_written": self.batches_written,
+            "writes_in_flight": len(self._writes),
+        }
+
+
+async def invalidate_cached_sessions(table: str, rows: List[Dict[str, Any]], memory: Optional[MemoryManager] = None) -> None:
+    """Drop cached histories that already include rows which never reached Supabase"""
+    if table != "conversations":
+        return
+    for user_id, session_id in {(row["user_id"], row["session_id"]) for row in rows}:
+        await get_history_cache().invalidate(user_id, session_id, tenant=tenant_of(memory))
+
+
+_write_behind: Optional[WriteBehindQueue] = None
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Process-wide write-behind queue writing through the shared memory manager"""
+    global _write_behind
+    if _write_behind is None:
+        _write_behind = WriteBehindQueue(on_failure=invalidate_cached_sessions)
+    return _write_behind
+
@@ -0,0 +1,135 @@
+from typing import Any, Callable, Dict
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Latency buckets tuned for the chat hot path (1ms .. 60s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+# Chat pipeline stages
+AUTH_SECONDS = Histogram(
+    "chat_auth_seconds", "JWT verification time in get_current_user", buckets=LATENCY_BUCKETS
+)
+HISTORY_FETCH_SECONDS = Histogram(
+    "chat_history_fetch_seconds", "Conversation history fetch time", buckets=LATENCY_BUCKETS
+)
+USER_MESSAGE_SAVE_SECONDS = Histogram(
+    "chat_user_message_save_seconds", "Time spent saving the user message before streaming", buckets=LATENCY_BUCKETS
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "chat_time_to_first_token_seconds", "Time from request start to the first streamed token", buckets=LATENCY_BUCKETS
+)
+CHUNKS_PER_SECOND = Histogram(
+    "chat_chunks_per_second", "Streamed chunks per second after the first one", buckets=THROUGHPUT_BUCKETS
+)
+STREAM_DURATION_SECONDS = Histogram(
+    "chat_stream_duration_seconds", "Total duration of a chat response stream", buckets=LATENCY_BUCKETS
+)
+FINAL_SAVE_SECONDS = Histogram(
+    "chat_final_save_seconds", "Time spent saving the assistant message after streaming", buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT_STREAMS = Gauge(
+    "chat_in_flight_streams", "Chat response streams currently being generated"
+)
+STREAM_ERRORS = Counter(
+    "chat_stream_errors_total", "Chat response streams that ended with an error"
+)
+RESUMED_STREAMS = Counter(
+    "chat_resumed_streams_total", "Reconnects that resumed a buffered chat stream"
+)
+ABANDONED_GENERATIONS = Counter(
+    "chat_abandoned_generations_total", "Generations cancelled after every listener was gone for the grace period"
+)
+ADMISSION_REJECTIONS = Counter(
+    "chat_admission_rejections_total", "Chat requests answered with 429, by reason", ["reason"]
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "chat_admission_wait_seconds", "Time admitted chat requests waited for a stream slot", buckets=LATENCY_BUCKETS
+)
+
+# LLM response cache
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "llm_response_cache_lookups_total", "LLM response cache lookups by tier and result", ["tier", "result"]
+)
+
+LLM_UPSTREAM_GENERATIONS = Gauge(
+    "llm_upstream_generations", "Upstream LLM generations currently streaming"
+)
+LLM_COALESCED_REQUESTS = Counter(
+    "llm_coalesced_requests_total", "Requests that attached to an identical in-flight generation"
+)
+
+LLM_FAILOVERS = Counter(
+    "llm_failovers_total", "Models skipped before the first token, by reason", ["model", "reason"]
+)
+
+TOOL_CALLS = Counter(
+    "agent_tool_calls_total", "Agent tool calls by tool and outcome (ok, cached, error, timeout)", ["tool", "outcome"]
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds", "Agent tool call duration, cache hits excluded", ["tool"], buckets=LATENCY_BUCKETS
+)
+
+BATCH_CHAT_ITEMS = Counter(
+    "batch_chat_items_total", "Batch chat prompts answered, by outcome", ["outcome"]
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full"
+)
+
+# Stores
+SUPABASE_REQUEST_SECONDS = Histogram(
+    "supabase_request_seconds", "PostgREST round-trip time by MemoryManager operation",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+SUPABASE_POOL_CONNECTIONS = Gauge(
+    "supabase_pool_connections", "Supabase HTTP pool connections by state", ["state"]
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Redis connection pool connections by state", ["state"]
+)
+SUPABASE_TENANT_CLIENTS = Gauge(
+    "supabase_tenant_clients", "Open per-tenant Supabase clients"
+)
+WRITE_BEHIND_PENDING = Gauge(
+    "write_behind_pending_rows", "Conversation rows waiting in the write-behind queue"
+)
+
+
+def _stat(source: Callable[[], Dict[str, Any]], key: str) -> Callable[[], float]:
+    def read() -> float:
+        try:
+            return float(source().get(key, 0))
+        except Exception:
+            return 0.0
+    return read
+
+
+def _redis_pool_size(redis_client, attribute: str) -> Callable[[], float]:
+    def read() -> float:
+        pool = getattr(redis_client, "connection_pool", None)
+        return float(len(getattr(pool, attribute, ()) or ()))
+    return read
+
+
+def bind_pool_gauges(memory_manager, write_behind=None, tenant_registry=None) -> None:
+    """Point the pool gauges at the live clients so they are read at scrape time"""
+    for state in ("active", "idle", "queued"):
+        key = "queued_requests" if state == "queued" else f"{state}_connections"
+        SUPABASE_POOL_CONNECTIONS.labels(state=state).set_function(_stat(memory_manager.pool_stats, key))
+    if memory_manager.redis_client is not None:
+        REDIS_POOL_CONNECTIONS.labels(state="active").set_function(
+            _redis_pool_size(memory_manager.redis_client, "_in_use_connections")
+        )
+        REDIS_POOL_CONNECTIONS.labels(state="idle").set_function(
+            _redis_pool_size(memory_manager.redis_client, "_available_connections")
+        )
+    if write_behind is not None:
+        WRITE_BEHIND_PENDING.set_function(lambda: float(write_behind.pending))
+    if tenant_registry is not None:
+        SUPABASE_TENANT_CLIENTS.set_function(lambda: float(len(tenant_registry)))
+
+
+def render_latest() -> bytes:
+    """Prometheus text exposition of every registered metric"""
+    return generate_latest()
@@ -0,0 +1,173 @@
+from typing import Any, Dict, Optional, TextIO
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import copy
+import hashlib
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from src.config.settings import settings
+from src.monitoring import metrics
+
+# Fields bound for the current request (request_id, session_id, ...), added to every record
+log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Loggers that uvicorn configures with its own synchronous stream handlers
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def bind(**fields: Any):
+    """Add fields to the log context of the current task; returns a token for unbind"""
+    return log_context.set({**log_context.get(), **fields})
+
+
+def unbind(token) -> None:
+    try:
+        log_context.reset(token)
+    except ValueError:
+        # An async generator finalized from another task; that task's context was never changed
+        pass
+
+
+def payload_fields(name: str, payload: Any) -> Dict[str, Any]:
+    """Extras for logging a message body: the body itself only when LOG_PAYLOADS is on, else its size"""
+    if settings.LOG_PAYLOADS:
+        return {name: payload}
+    return {f"{name}_chars": len(payload) if isinstance(payload, str) else len(json.dumps(payload, default=str))}
+
+
+def sampled(rate: Optional[float] = None) -> Dict[str, Any]:
+    """Extra that marks a high-volume record for sampling at rate (default LOG_SAMPLE_RATE)"""
+    return {"sample_rate": settings.LOG_SAMPLE_RATE if rate is None else rate}
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound request fields onto the record in the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a sample_rate fraction of records that carry one; warnings and errors always pass.
+
+    Requests with a request_id are sampled as a whole, so a kept request keeps all its events.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None or rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        request_id = getattr(record, "request_id", None)
+        if request_id is None:
+            return random.random() < rate
+        bucket = int.from_bytes(hashlib.blake2b(request_id.encode(), digest_size=4).digest(), "big")
+        return bucket < rate * 2 ** 32
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, bound context and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and name != "sample_rate":
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; a full queue drops the record instead of waiting"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here, but keep the record structured for the formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    stream: Optional[TextIO] = None,
+    capture_uvicorn: bool = True,
+) -> QueueListener:
+    """Route the root logger (and uvicorn's) through a bounded queue to a writer thread.
+
+    Callers only pay for building the record; formatting and the write to stdout happen on
+    the listener thread, so a slow or blocked stdout cannot stall the event loop.
+    """
+    global _queue_handler, _listener
+    stop_logging()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if (fmt or settings.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+                                               defaults={"request_id": "-"}))
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_MAX))
+    _queue_handler.addFilter(ContextFilter())
+    _queue_handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level or settings.LOG_LEVEL)
+    if capture_uvicorn:
+        for name in UVICORN_LOGGERS:
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers.clear()
+            uvicorn_logger.propagate = True
+    _listener = QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and detach the queue handler"""
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
@@ -0,0 +1,243 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from contextlib import contextmanager
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from src.config.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows, where only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rows per SQL IN (...) clause, well under SQLite's variable limit
+LOOKUP_CHUNK = 500
+
+
+def embedding_key(model_id: str, text: str) -> str:
+    """Content address of one chunk for one model"""
+    return hashlib.sha256(f"{model_id}\0{text}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model id, chunk hash).
+
+    Vectors live in a float32 NumPy memmap (one row per slot) that grows by doubling up
+    to max_entries; a SQLite file maps keys to slots and tracks last use. When the cache
+    is full the least recently used slots are overwritten. Slot allocation happens inside
+    an IMMEDIATE transaction, so ingestion and API workers can share one cache directory;
+    an exclusive flock held across allocation and the vector write, and a shared one across
+    lookup's index read and vector copy, keep a reader from copying a slot that another
+    process is overwriting with a different key's vector.
+    """
+
+    def __init__(self, model_id: str, directory: Optional[str] = None, max_entries: Optional[int] = None):
+        import numpy as np
+        self._np = np
+        self.model_id = model_id
+        self.directory = directory or settings.EMBEDDING_CACHE_DIR
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        self.vectors_path = os.path.join(self.directory, f"{slug}.f32")
+        self._db = sqlite3.connect(os.path.join(self.directory, f"{slug}.index.sqlite3"),
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(self.directory, f"{slug}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._vectors = None
+        self.dim: Optional[int] = None
+        self._load_dim()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _load_dim(self) -> None:
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row:
+            self.dim = int(row[0])
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Cross-process lock on the slots; callers hold self._lock first"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _slots_for(self, keys: Sequence[str]) -> Dict[str, int]:
+        """Slot of each key that has one, queried LOOKUP_CHUNK keys at a time"""
+        slots: Dict[str, int] = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for key, slot in self._db.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", chunk):
+                slots[key] = slot
+        return slots
+
+    def _map(self, rows_needed: int) -> None:
+        """Open (or grow and reopen) the vector file so it holds at least rows_needed rows"""
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = size // row_bytes
+        if rows_needed > rows:
+            rows = min(max(rows_needed, rows * 2, 1024), self.max_entries)
+            with open(self.vectors_path, "ab") as handle:
+                handle.truncate(rows * row_bytes)
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = self._np.memmap(self.vectors_path, dtype="float32", mode="r+", shape=(rows, self.dim))
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vector for each text, None for misses"""
+        keys = [embedding_key(self.model_id, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            with self._file_lock(exclusive=False):
+                slots = self._slots_for(keys)
+                if slots:
+                    if self.dim is None:
+                        # Another process created the cache after we opened it
+                        self._load_dim()
+                    self._map(max(slots.values()) + 1)
+                    for position, key in enumerate(keys):
+                        slot = slots.get(key)
+                        if slot is not None:
+                            results[position] = self._vectors[slot].tolist()
+            if slots:
+                now = time.time()
+                hit_keys = list(slots)
+                for start in range(0, len(hit_keys), LOOKUP_CHUNK):
+                    chunk = hit_keys[start:start + LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    self._db.execute(f"UPDATE entries SET last_used = ? WHERE key IN ({placeholders})", [now, *chunk])
+        hits = sum(result is not None for result in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def insert(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors for texts, evicting the least recently used entries when full"""
+        if not texts:
+            return
+        matrix = self._np.asarray(vectors, dtype="float32")
+        # Later duplicates win, like a dict
+        entries = {embedding_key(self.model_id, text): row for text, row in zip(texts, matrix)}
+        with self._lock, self._file_lock(exclusive=True):
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(matrix.shape[1]),))
+                    self._load_dim()
+                if matrix.shape[1] != self.dim:
+                    raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {matrix.shape[1]}")
+                existing = self._slots_for(list(entries))
+                new_keys = [key for key in entries if key not in existing][-self.max_entries:]
+                used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                free = max(self.max_entries - used, 0)
+                slots = {key: used + i for i, key in enumerate(new_keys[:free])}
+                reuse = new_keys[free:]
+                if reuse:
+                    # Never evict an entry this call is about to overwrite in place; over-fetch by
+                    # those rather than binding every key into a NOT IN (...) clause
+                    candidates = self._db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (len(reuse) + len(existing),)
+                    ).fetchall()
+                    victims = [(key, slot) for key, slot in candidates if key not in existing][:len(reuse)]
+                    self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+                    slots.update({key: slot for key, (_, slot) in zip(reuse, victims)})
+                    self.evictions += len(victims)
+                now = time.time()
+                self._db.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slot, now) for key, slot in slots.items()]
+                )
+                targets = {**existing, **slots}
+                if targets:
+                    self._map(max(targets.values()) + 1)
+                    for key, slot in targets.items():
+                        self._vectors[slot] = entries[key]
+                    self._vectors.flush()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    async def alookup(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        return await asyncio.to_thread(self.lookup, texts)
+
+    async def ainsert(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        await asyncio.to_thread(self.insert, texts, vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        self._db.close()
+        os.close(self._lock_fd)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+
+class CachedEmbeddings:
+    """Wraps any LangChain embeddings model so only texts missing from the cache reach it"""
+
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results = self.cache.lookup(texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            # Identical texts in one batch are sent once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            self.cache.insert(unique, [vectors[text] for text in unique])
+            for i in missing:
+                results[i] = vectors[texts[i]]
+        return results
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        results = await self.cache.alookup(texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = dict(zip(unique, await self.embeddings.aembed_documents(unique)))
+            await self.cache.ainsert(unique, [vectors[text] for text in unique])
+            for i in missing:
+                results[i] = vectors[texts[i]]
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
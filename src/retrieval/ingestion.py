@@ -0,0 +1,264 @@
+"""Streaming document ingestion into the persistent vector index.
+
+    python -m src.retrieval.ingestion Tutorial_03/sample_documents --index-dir data/retrieval
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import logging
+import os
+import time
+from src.config.settings import settings
+from src.retrieval.service import RetrievalService
+from src.retrieval.vector_index import PersistentVectorIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ("*.txt", "*.md", "*.pdf")
+
+_STOP = object()
+
+
+def iter_source_files(paths: Iterable[str], patterns: Sequence[str] = DEFAULT_PATTERNS) -> Iterator[str]:
+    """Yield matching files under each path lazily, in a stable order"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    yield os.path.join(root, name)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()
+
+
+def _read_pages(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        for number, page in enumerate(PdfReader(path).pages):
+            yield page.extract_text() or "", {"source": path, "page": number}
+        return
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        yield handle.read(), {"source": path}
+
+
+def parse_file(path: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """Load and split one file; runs in a worker process, so it only takes and returns plain data"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    chunks = []
+    for text, metadata in _read_pages(path):
+        for piece in splitter.split_text(text):
+            if piece.strip():
+                chunks.append({"content": piece, "metadata": dict(metadata, hash=content_hash(piece))})
+    return chunks
+
+
+class IngestionPipeline:
+    """Files -> process-pool parse/split -> dedupe -> fixed-size embedding batches -> index.
+
+    Every stage is bounded: at most max_pending_files files are being parsed, and parsed
+    chunks wait in a queue of a few embedding batches, so a slow embedding model pushes
+    back on parsing instead of letting chunks pile up in memory. Parsing scales with the
+    worker processes; embedding runs embed_concurrency batches at a time.
+
+    A document's new chunks are staged until all of them are embedded and then swap in for
+    its old ones at once, so searches keep finding the old version meanwhile, and a document
+    whose embedding fails keeps it. Documents under the ingested paths that no longer exist
+    are pruned before the index is published.
+    """
+
+    def __init__(
+        self,
+        service: RetrievalService,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        max_pending_files: Optional[int] = None,
+        embed_batch_size: Optional[int] = None,
+        embed_concurrency: Optional[int] = None,
+    ):
+        self.service = service
+        self.chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        self.chunk_overlap = settings.INGEST_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        self.max_workers = max_workers or settings.INGEST_MAX_WORKERS or os.cpu_count() or 1
+        self.max_pending_files = max_pending_files or settings.INGEST_MAX_PENDING_FILES
+        self.embed_batch_size = embed_batch_size or settings.INGEST_EMBED_BATCH_SIZE
+        self.embed_concurrency = embed_concurrency or settings.INGEST_EMBED_CONCURRENCY
+        self._seen_hashes = set()
+        self._seen_docs = set()
+        # Per document being ingested: chunks still to embed, embedded chunks, whether any failed
+        self._pending: Dict[str, int] = {}
+        self._staged: Dict[str, List[Tuple[str, List[float], Dict[str, Any]]]] = {}
+        self._failed_docs = set()
+        self.stats: Dict[str, Any] = {}
+
+    async def run(self, paths: Iterable[str], patterns: Sequence[str] = DEFAULT_PATTERNS) -> Dict[str, Any]:
+        """Ingest every matching file under paths and publish the index once at the end"""
+        started = time.perf_counter()
+        paths = list(paths)
+        self._seen_hashes = set()
+        self._seen_docs = set()
+        self._pending, self._staged, self._failed_docs = {}, {}, set()
+        self.stats = {
+            "files": 0, "failed_files": 0, "chunks": 0, "duplicates": 0,
+            "embedded": 0, "failed_chunks": 0, "batches": 0, "failed_documents": 0, "pruned": 0,
+        }
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.embed_batch_size * self.embed_concurrency * 2)
+        embedders = [asyncio.create_task(self._embed_worker(queue)) for _ in range(self.embed_concurrency)]
+        try:
+            await self._parse_all(iter_source_files(paths, patterns), queue)
+        finally:
+            for _ in embedders:
+                await queue.put(_STOP)
+            await asyncio.gather(*embedders)
+        await asyncio.to_thread(self._prune, paths)
+        await asyncio.to_thread(self.service.index.save)
+        self.stats["elapsed_s"] = time.perf_counter() - started
+        logger.info(f"Ingestion finished: {self.stats}")
+        return self.stats
+
+    async def _parse_all(self, files: Iterator[str], queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            pending: Dict[asyncio.Future, str] = {}
+
+            def submit_next() -> bool:
+                path = next(files, None)
+                # A file reached through two of the given paths is ingested once
+                while path is not None and path in self._seen_docs:
+                    path = next(files, None)
+                if path is None:
+                    return False
+                # Seen even if parsing fails, so a file that still exists is never pruned
+                self._seen_docs.add(path)
+                future = loop.run_in_executor(pool, parse_file, path, self.chunk_size, self.chunk_overlap)
+                pending[future] = path
+                return True
+
+            while len(pending) < self.max_pending_files and submit_next():
+                pass
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        self.stats["failed_files"] += 1
+                        logger.error(f"Failed to parse {path}: {str(e)}")
+                    else:
+                        await self._enqueue_document(path, chunks, queue)
+                    submit_next()
+
+    async def _enqueue_document(self, doc_id: str, chunks: List[Dict[str, Any]], queue: asyncio.Queue) -> None:
+        self.stats["files"] += 1
+        unique = []
+        for chunk in chunks:
+            digest = chunk["metadata"]["hash"]
+            if digest in self._seen_hashes:
+                self.stats["duplicates"] += 1
+                continue
+            self._seen_hashes.add(digest)
+            unique.append(chunk)
+        self.stats["chunks"] += len(unique)
+        if not unique:
+            # Nothing left to embed: the new version is empty
+            await asyncio.to_thread(self.service.index.delete, doc_id)
+            return
+        self._pending[doc_id] = len(unique)
+        self._staged[doc_id] = []
+        for chunk in unique:
+            await queue.put((doc_id, chunk))
+
+    async def _chunks_done(self, doc_id: str, embedded: List[Tuple[str, List[float], Dict[str, Any]]],
+                           failed: int = 0) -> None:
+        """Record embedded or failed chunks of doc_id, swapping it in once none are left"""
+        if failed:
+            self._failed_docs.add(doc_id)
+        self._staged[doc_id].extend(embedded)
+        self._pending[doc_id] -= len(embedded) + failed
+        if self._pending[doc_id]:
+            return
+        del self._pending[doc_id]
+        staged = self._staged.pop(doc_id)
+        if doc_id in self._failed_docs:
+            self.stats["failed_documents"] += 1
+            logger.error(f"Keeping the previous version of {doc_id}: some of its chunks failed to embed")
+            return
+        texts, vectors, metadatas = zip(*staged)
+        try:
+            # Deletes the old chunks and writes the new ones in one transaction
+            await asyncio.to_thread(self.service.index.add, doc_id, list(texts), list(vectors), list(metadatas))
+        except Exception as e:
+            self.stats["failed_documents"] += 1
+            logger.error(f"Failed to index {doc_id}: {str(e)}")
+
+    def _prune(self, paths: List[str]) -> None:
+        """Delete documents under paths whose files were not found in this run"""
+        roots = [path if os.path.isfile(path) else os.path.join(path, "") for path in paths]
+        for doc_id in self.service.index.doc_ids():
+            if doc_id in self._seen_docs:
+                continue
+            if any(doc_id == root or (root.endswith(os.sep) and doc_id.startswith(root)) for root in roots):
+                self.service.index.delete(doc_id)
+                self.stats["pruned"] += 1
+
+    async def _embed_worker(self, queue: asyncio.Queue) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            while len(batch) < self.embed_batch_size:
+                item = await queue.get()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if not batch:
+                continue
+            try:
+                vectors = await self.service.embeddings.aembed_documents([chunk["content"] for _, chunk in batch])
+            except Exception as e:
+                # Keep draining so parsing never blocks on a queue nobody reads
+                self.stats["failed_chunks"] += len(batch)
+                logger.error(f"Failed to embed a batch of {len(batch)} chunks: {str(e)}")
+                for doc_id, failed in Counter(doc_id for doc_id, _ in batch).items():
+                    await self._chunks_done(doc_id, [], failed)
+                continue
+            self.stats["embedded"] += len(batch)
+            self.stats["batches"] += 1
+            by_doc: Dict[str, List[Tuple[str, List[float], Dict[str, Any]]]] = {}
+            for (doc_id, chunk), vector in zip(batch, vectors):
+                by_doc.setdefault(doc_id, []).append((chunk["content"], vector, chunk["metadata"]))
+            for doc_id, embedded in by_doc.items():
+                await self._chunks_done(doc_id, embedded)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest documents into the retrieval index")
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--index-dir", default=settings.RETRIEVAL_INDEX_DIR)
+    parser.add_argument("--pattern", action="append", help="file name patterns (default: *.txt, *.md, *.pdf)")
+    parser.add_argument("--workers", type=int, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = PersistentVectorIndex(args.index_dir, writable=True)
+    try:
+        pipeline = IngestionPipeline(RetrievalService(index=index), max_workers=args.workers)
+        stats = asyncio.run(pipeline.run(args.paths, args.pattern or DEFAULT_PATTERNS))
+    finally:
+        index.close()
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+from src.config.settings import settings
+from src.retrieval.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.retrieval.vector_index import PersistentVectorIndex
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class RetrievalService:
+    """Async similarity search over a PersistentVectorIndex with request micro-batching.
+
+    Concurrent search() calls that arrive within batch_window_ms are embedded with one
+    aembed_documents call and answered by one FAISS search, so a burst of chat turns costs
+    a single embedding round trip. FAISS runs in a worker thread to keep the loop free.
+    """
+
+    def __init__(
+        self,
+        index: Optional[PersistentVectorIndex] = None,
+        embeddings=None,
+        k: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        batch_window_ms: Optional[float] = None,
+    ):
+        self._index = index
+        self._embeddings = embeddings
+        self.k = k or settings.RETRIEVAL_TOP_K
+        self.batch_size = batch_size or settings.RETRIEVAL_BATCH_SIZE
+        self.batch_window = (settings.RETRIEVAL_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.queries = 0
+
+    @property
+    def index(self) -> PersistentVectorIndex:
+        if self._index is None:
+            self._index = PersistentVectorIndex()
+        return self._index
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_community.embeddings import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(
+                model=settings.RETRIEVAL_EMBEDDING_MODEL,
+                openai_api_key=settings.OPENAI_API_KEY
+            )
+            if settings.EMBEDDING_CACHE_ENABLED:
+                # Unchanged chunks and repeated questions skip the embedding API
+                self._embeddings = CachedEmbeddings(
+                    self._embeddings, EmbeddingCache(f"openai:{settings.RETRIEVAL_EMBEDDING_MODEL}")
+                )
+        return self._embeddings
+
+    async def search_many(self, queries: Sequence[str], k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Embed and search a batch of queries in one pass"""
+        if not queries:
+            return []
+        vectors = await self.embeddings.aembed_documents(list(queries))
+        await asyncio.to_thread(self.index.refresh)
+        return await asyncio.to_thread(self.index.search, vectors, k or self.k)
+
+    async def search(self, query: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top-k chunks for one query, batched with other in-flight searches"""
+        if self._worker is None or self._worker.done():
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k or self.k, future))
+        return await future
+
+    async def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        if not self._worker.done():
+            await self._queue.put(_STOP)
+            await self._worker
+        self._worker = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._answer(batch)
+
+    async def _answer(self, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        # One search at the largest k in the batch; smaller requests take a prefix
+        k = max(item[1] for item in batch)
+        try:
+            results = await self.search_many([item[0] for item in batch], k)
+        except Exception as e:
+            logger.error(f"Retrieval batch of {len(batch)} failed: {str(e)}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, item_k, future), hits in zip(batch, results):
+            if not future.done():
+                future.set_result(hits[:item_k])
+
+    async def add_document(
+        self,
+        doc_id: str,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        save: bool = True,
+    ) -> List[int]:
+        """Embed and (re)index one document's chunks; needs an index opened with writable=True"""
+        if texts:
+            vectors = await self.embeddings.aembed_documents(list(texts))
+            ids = await asyncio.to_thread(self.index.add, doc_id, texts, vectors, metadatas)
+        else:
+            ids = []
+            await asyncio.to_thread(self.index.delete, doc_id)
+        if save:
+            await asyncio.to_thread(self.index.save)
+        return ids
+
+    async def delete_document(self, doc_id: str, save: bool = True) -> int:
+        removed = await asyncio.to_thread(self.index.delete, doc_id)
+        if save:
+            await asyncio.to_thread(self.index.save)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "vectors": self.index.ntotal,
+            "queries": self.queries,
+            "batches": self.batches,
+            "queries_per_batch": self.queries / self.batches if self.batches else 0.0,
+        }
+        if isinstance(self._embeddings, CachedEmbeddings):
+            stats["embedding_cache"] = self._embeddings.cache.stats()
+        return stats
+
+
+def format_context(hits: List[Dict[str, Any]]) -> str:
+    """Render retrieved chunks as a numbered block for the system prompt"""
+    return "\n\n".join(
+        f"[{position}] ({hit['metadata'].get('source') or hit['doc_id']})\n{hit['content']}"
+        for position, hit in enumerate(hits, start=1)
+    )
+
+
+_retrieval_service: Optional[RetrievalService] = None
+
+
+def get_retrieval_service() -> RetrievalService:
+    """Process-wide read-only retrieval service over RETRIEVAL_INDEX_DIR"""
+    global _retrieval_service
+    if _retrieval_service is None:
+        _retrieval_service = RetrievalService()
+    return _retrieval_service
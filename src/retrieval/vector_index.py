@@ -0,0 +1,213 @@
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import logging
+import os
+import sqlite3
+import threading
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite3"
+LOCK_FILE = "write.lock"
+
+
+class PersistentVectorIndex:
+    """On-disk FAISS index plus a SQLite docstore, keyed by document id.
+
+    Readers memory-map the index read-only, so every uvicorn worker on a host shares the
+    same page-cache copy instead of holding its own, and they pick up a new version the
+    next time they search after a writer replaces the file. A single writer (ingestion)
+    holds the index in RAM, adds or deletes the chunks of one document at a time and
+    publishes with save(), which swaps the file in atomically.
+    """
+
+    def __init__(self, directory: Optional[str] = None, dim: Optional[int] = None, writable: bool = False):
+        import faiss
+        import numpy as np
+        self._faiss = faiss
+        self._np = np
+        self.directory = directory or settings.RETRIEVAL_INDEX_DIR
+        self.writable = writable
+        self.dim = dim
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self._index = None
+        self._loaded_version: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._write_lock = None
+        os.makedirs(self.directory, exist_ok=True)
+        if writable:
+            self._acquire_write_lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, DOCSTORE_FILE), check_same_thread=False)
+        # WAL lets readers in other workers query while the writer commits
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, content TEXT NOT NULL, metadata TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id)")
+        self._db.commit()
+        self._load()
+
+    def _acquire_write_lock(self) -> None:
+        import fcntl
+        self._write_lock = open(os.path.join(self.directory, LOCK_FILE), "w")
+        try:
+            fcntl.flock(self._write_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._write_lock.close()
+            self._write_lock = None
+            raise Exception(f"Vector index {self.directory} is already open for writing")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_path):
+            if self.writable and self.dim:
+                self._index = self._new_index(self.dim)
+            return
+        version = self._file_version()
+        if self.writable:
+            self._index = self._faiss.read_index(self.index_path)
+        else:
+            self._index = self._faiss.read_index(
+                self.index_path, self._faiss.IO_FLAG_MMAP_IFC | self._faiss.IO_FLAG_READ_ONLY
+            )
+        self._loaded_version = version
+        self.dim = self._index.d
+
+    def _file_version(self) -> tuple:
+        # save() swaps in a new file, so the inode changes even when mtimes collide
+        stat = os.stat(self.index_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _new_index(self, dim: int):
+        # Inner product over L2-normalized vectors is cosine similarity
+        return self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(dim))
+
+    def refresh(self) -> bool:
+        """Re-map the index if a writer has published a newer file; True when reloaded"""
+        if self.writable or not os.path.exists(self.index_path):
+            return False
+        if self._file_version() == self._loaded_version:
+            return False
+        with self._lock:
+            self._load()
+        logger.info(f"Reloaded vector index with {self.ntotal} vectors")
+        return True
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal if self._index is not None else 0
+
+    def _normalized(self, vectors) -> Any:
+        matrix = self._np.array(vectors, dtype="float32", copy=True)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        self._faiss.normalize_L2(matrix)
+        return matrix
+
+    def add(
+        self,
+        doc_id: str,
+        texts: Sequence[str],
+        vectors,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        replace: bool = True,
+    ) -> List[int]:
+        """Replace (or with replace=False, extend) the chunks of doc_id; returns the chunk ids"""
+        if not self.writable:
+            raise Exception("Vector index was opened read-only")
+        matrix = self._normalized(vectors)
+        if len(texts) != matrix.shape[0]:
+            raise ValueError("texts and vectors must have the same length")
+        if self._index is None:
+            self.dim = matrix.shape[1]
+            self._index = self._new_index(self.dim)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+        metadatas = metadatas or [None] * len(texts)
+        with self._lock:
+            if replace:
+                self._delete_locked(doc_id)
+            ids = []
+            for text, metadata in zip(texts, metadatas):
+                cursor = self._db.execute(
+                    "INSERT INTO chunks (doc_id, content, metadata) VALUES (?, ?, ?)",
+                    (doc_id, text, json.dumps(metadata or {}))
+                )
+                ids.append(cursor.lastrowid)
+            self._db.commit()
+            if ids:
+                self._index.add_with_ids(matrix, self._np.asarray(ids, dtype="int64"))
+        return ids
+
+    def delete(self, doc_id: str) -> int:
+        """Remove every chunk of doc_id; returns how many were removed"""
+        if not self.writable:
+            raise Exception("Vector index was opened read-only")
+        with self._lock:
+            removed = self._delete_locked(doc_id)
+            self._db.commit()
+        return removed
+
+    def _delete_locked(self, doc_id: str) -> int:
+        ids = [row[0] for row in self._db.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+        if not ids:
+            return 0
+        if self._index is not None:
+            self._index.remove_ids(self._np.asarray(ids, dtype="int64"))
+        self._db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        return len(ids)
+
+    def save(self) -> None:
+        """Publish the current index; readers switch over on their next search"""
+        if not self.writable:
+            raise Exception("Vector index was opened read-only")
+        if self._index is None:
+            return
+        with self._lock:
+            tmp_path = self.index_path + ".tmp"
+            self._faiss.write_index(self._index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+
+    def search(self, vectors, k: int) -> List[List[Dict[str, Any]]]:
+        """Top-k chunks for each query vector, best first"""
+        matrix = self._normalized(vectors)
+        if self._index is None or self.ntotal == 0:
+            return [[] for _ in range(matrix.shape[0])]
+        with self._lock:
+            scores, ids = self._index.search(matrix, k)
+            wanted = sorted({int(i) for i in ids.ravel() if i >= 0})
+            rows = {}
+            if wanted:
+                placeholders = ",".join("?" * len(wanted))
+                for row in self._db.execute(
+                    f"SELECT id, doc_id, content, metadata FROM chunks WHERE id IN ({placeholders})", wanted
+                ):
+                    rows[row[0]] = row
+        results = []
+        for row_scores, row_ids in zip(scores, ids):
+            hits = []
+            for score, chunk_id in zip(row_scores, row_ids):
+                row = rows.get(int(chunk_id))
+                # A reader's mapped index can briefly reference chunks a writer already deleted
+                if row is None:
+                    continue
+                hits.append({
+                    "id": row[0],
+                    "doc_id": row[1],
+                    "content": row[2],
+                    "metadata": json.loads(row[3]) if row[3] else {},
+                    "score": float(score),
+                })
+            results.append(hits)
+        return results
+
+    def doc_ids(self) -> List[str]:
+        return [row[0] for row in self._db.execute("SELECT DISTINCT doc_id FROM chunks")]
+
+    def close(self) -> None:
+        self._db.close()
+        if self._write_lock is not None:
+            self._write_lock.close()
+            self._write_lock = None
@@ -0,0 +1,5 @@
+-- Serves "latest N messages of a session" and keyset paging over (created_at, id)
+-- from the index instead of scanning every row of the session.
+create index if not exists conversations_session_history_idx
+    on public.conversations (session_id, user_id, created_at desc, id desc)
+    where is_archived = false;
@@ -0,0 +1,17 @@
+-- Rolling summary of turns that no longer fit in the LLM context window, one row per session.
+create table if not exists public.conversation_summaries (
+    session_id text not null,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    summary text not null default '',
+    summarized_until timestamptz,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, session_id)
+);
+
+alter table public.conversation_summaries enable row level security;
+
+create policy "Users manage their own conversation summaries"
+    on public.conversation_summaries
+    for all
+    using (auth.uid() = user_id)
+    with check (auth.uid() = user_id);
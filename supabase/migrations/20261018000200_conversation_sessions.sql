@@ -0,0 +1,104 @@
+-- Session catalog: one row per session with its title, size and recency, kept current by a
+-- trigger on conversations, so listing a user's sessions reads a page of this table instead
+-- of scanning their messages.
+create table if not exists public.conversation_sessions (
+    session_id text not null,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    title text,
+    message_count integer not null default 0,
+    created_at timestamptz not null default now(),
+    last_updated_at timestamptz not null default now(),
+    archived boolean not null default false,
+    primary key (user_id, session_id)
+);
+
+-- Serves GET /sessions: newest first with a (last_updated_at, session_id) keyset cursor
+create index if not exists conversation_sessions_recent_idx
+    on public.conversation_sessions (user_id, archived, last_updated_at desc, session_id desc);
+
+alter table public.conversation_sessions enable row level security;
+
+-- Rows are written by the trigger and archive_sessions below; users only read them
+create policy "Users read their own sessions"
+    on public.conversation_sessions
+    for select
+    using (auth.uid() = user_id);
+
+-- Messages used to store metadata as a JSON-encoded string; keep it as a jsonb object
+alter table public.conversations
+    alter column metadata type jsonb using metadata::jsonb;
+update public.conversations
+    set metadata = (metadata #>> '{}')::jsonb
+    where jsonb_typeof(metadata) = 'string';
+
+-- Statement-level, so a write-behind bulk insert updates each session once
+create or replace function public.apply_conversation_inserts()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.conversation_sessions as s
+        (session_id, user_id, title, message_count, created_at, last_updated_at)
+    select session_id,
+           user_id,
+           (array_agg(title order by created_at) filter (where title is not null))[1],
+           count(*),
+           min(created_at),
+           max(coalesce(last_updated_at, created_at))
+    from new_rows
+    group by user_id, session_id
+    on conflict (user_id, session_id) do update
+        set title = coalesce(s.title, excluded.title),
+            message_count = s.message_count + excluded.message_count,
+            last_updated_at = greatest(s.last_updated_at, excluded.last_updated_at);
+    return null;
+end;
+$$;
+
+drop trigger if exists conversations_session_catalog on public.conversations;
+create trigger conversations_session_catalog
+    after insert on public.conversations
+    referencing new table as new_rows
+    for each statement
+    execute function public.apply_conversation_inserts();
+
+-- Catalog rows for sessions that predate the trigger
+insert into public.conversation_sessions
+    (session_id, user_id, title, message_count, created_at, last_updated_at, archived)
+select session_id,
+       user_id,
+       (array_agg(title order by created_at) filter (where title is not null))[1],
+       count(*),
+       min(created_at),
+       max(coalesce(last_updated_at, created_at)),
+       bool_and(is_archived)
+from public.conversations
+group by user_id, session_id
+on conflict (user_id, session_id) do nothing;
+
+-- Archive the caller's sessions: their messages via is_archived and their catalog rows.
+-- Returns how many sessions were newly archived.
+create or replace function public.archive_sessions(session_ids text[])
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    archived_count integer;
+begin
+    update public.conversations
+        set is_archived = true
+        where user_id = auth.uid() and session_id = any(session_ids) and is_archived = false;
+    update public.conversation_sessions
+        set archived = true
+        where user_id = auth.uid() and session_id = any(session_ids) and archived = false;
+    get diagnostics archived_count = row_count;
+    return archived_count;
+end;
+$$;
+
+revoke execute on function public.archive_sessions(text[]) from public, anon;
+grant execute on function public.archive_sessions(text[]) to authenticated;
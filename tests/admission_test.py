@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src.api import main
+from src.api.admission import AdmissionController, AdmissionRejected, FairQueue, retry_after_header
+from src.memory.tenants import get_tenant_registry
+
+
+def test_rate_and_in_flight_limits_reject_at_once_with_retry_after():
+    controller = AdmissionController(rate_per_minute=60, burst=2, max_in_flight=2, max_concurrent=10, weights={})
+
+    async def run():
+        first = await controller.admit("u1")
+        second = await controller.admit("u1")
+        with pytest.raises(AdmissionRejected) as in_flight:
+            await controller.admit("u1")
+        # Another user has their own budget
+        other = await controller.admit("u2")
+        await first.release()
+        await first.release()
+        with pytest.raises(AdmissionRejected) as rate:
+            await controller.admit("u1")
+        await second.release()
+        await other.release()
+        return in_flight.value, rate.value, controller.stats()
+
+    in_flight, rate, stats = asyncio.run(run())
+    assert in_flight.reason == "in_flight"
+    assert rate.reason == "rate" and 0.9 < rate.retry_after <= 1.0
+    assert retry_after_header(rate.retry_after) == {"Retry-After": "1"}
+    assert stats == {"backend": "local", "capacity": 10, "active": 0, "queued": 0}
+
+
+def test_saturated_worker_serves_users_in_fair_weighted_order():
+    queue = FairQueue(capacity=1, max_queued=10, weights={"light": 2.0})
+    served = []
+
+    async def request(user_id, label):
+        await queue.acquire(user_id, timeout=5)
+        served.append(label)
+
+    async def run():
+        await queue.acquire("heavy", timeout=5)
+        tasks = []
+        # The heavy user queues a burst before the others arrive
+        for label in ("h1", "h2", "h3", "h4"):
+            tasks.append(asyncio.create_task(request("heavy", label)))
+            await asyncio.sleep(0)
+        for user_id, label in (("normal", "n1"), ("light", "l1"), ("light", "l2")):
+            tasks.append(asyncio.create_task(request(user_id, label)))
+            await asyncio.sleep(0)
+        for _ in tasks:
+            queue.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        with pytest.raises(AdmissionRejected) as timeout:
+            await queue.acquire("late", timeout=0.01)
+        return timeout.value
+
+    timeout = asyncio.run(run())
+    assert served == ["l1", "h1", "n1", "l2", "h2", "h3", "h4"]
+    assert timeout.reason == "queue_timeout"
+    assert queue.stats() == {"capacity": 1, "active": 1, "queued": 0}
+
+
+def test_tickets_of_streams_that_never_start_are_released_after_the_response(monkeypatch):
+    monkeypatch.setattr(main.settings, "RESUMABLE_STREAMS_ENABLED", False)
+    controller = AdmissionController(rate_per_minute=60, burst=10, max_in_flight=2, max_concurrent=10, weights={})
+
+    async def words(*args, **kwargs):
+        yield "never read"
+
+    agent = SimpleNamespace(generate_response=words, astream_answer=words)
+
+    async def run():
+        chat = await main.chat_with_business_analyst(
+            main.ChatRequest(message="hi"), credentials=SimpleNamespace(credentials="jwt"), user_id="u1",
+            business_analyst=agent, ticket=await controller.admit("u1")
+        )
+        crag = await main.chat_with_crag(main.CragRequest(question="hi"), user_id="u1", crag_agent=agent,
+                                         ticket=await controller.admit("u1"))
+        held = controller.stats()["active"], get_tenant_registry().default.holds
+        # The client went away before the first byte: the bodies are never iterated
+        await chat.background()
+        await crag.background()
+        return held, controller.stats()["active"], get_tenant_registry().default.holds
+
+    held, active, holds = asyncio.run(run())
+    assert held == (2, 1)
+    assert (active, holds) == (0, 0)
+
+
+def test_leases_expire_unless_refreshed_while_the_stream_runs():
+    controller = AdmissionController(rate_per_minute=6000, burst=10, max_in_flight=1, max_concurrent=10, weights={})
+    controller.lease_seconds = 0.06
+
+    async def stream():
+        for chunk in ("a", "b"):
+            await asyncio.sleep(0.1)
+            yield chunk
+
+    async def run():
+        running = await controller.admit("u1")
+        guarded = running.guard(stream())
+        chunks = [await guarded.__anext__()]
+        # Past the lease but refreshed by the running stream: still counts against the limit
+        await asyncio.sleep(0.1)
+        with pytest.raises(AdmissionRejected):
+            await controller.admit("u1")
+        chunks += [chunk async for chunk in guarded]
+        # Never released nor refreshed: the slot comes back once the lease lapses
+        leaked = await controller.admit("u1")
+        await asyncio.sleep(0.1)
+        freed = await controller.admit("u1")
+        await freed.release()
+        return chunks, running.released, leaked.released
+
+    assert asyncio.run(run()) == (["a", "b"], True, False)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from langchain_core.messages import AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.agents.tools import AgentTool, ToolExecutor
+from src.config.settings import settings
+
+
+def make_tools(calls):
+    # Local stand-ins for the network tools: a blocking lookup, an async one and a hung one
+    @tool
+    def wikipedia(query: str) -> str:
+        """Look up an encyclopedia article"""
+        calls.append(("wikipedia", query))
+        time.sleep(0.2)
+        return f"article about {query}"
+
+    @tool
+    async def web_search(query: str) -> str:
+        """Search the web"""
+        calls.append(("web_search", query))
+        await asyncio.sleep(0.2)
+        return f"results for {query}"
+
+    @tool
+    def stuck(query: str) -> str:
+        """Never answers in time"""
+        time.sleep(0.5)
+        return "too late"
+
+    return [
+        AgentTool(wikipedia, cacheable=True),
+        AgentTool(web_search),
+        AgentTool(stuck, timeout=0.05),
+    ]
+
+
+def call(name, call_id, query):
+    return {"name": name, "args": {"query": query}, "id": call_id, "type": "tool_call"}
+
+
+def test_tool_calls_run_concurrently_with_timeouts_and_a_cache():
+    calls = []
+    executor = ToolExecutor(make_tools(calls), max_threads=4)
+
+    async def run():
+        started_at = time.perf_counter()
+        first = await executor.run([
+            call("wikipedia", "c1", "SaaS"), call("wikipedia", "c2", "churn"),
+            call("web_search", "c3", "pricing"), call("stuck", "c4", "x"), call("missing", "c5", "x"),
+        ])
+        elapsed = time.perf_counter() - started_at
+        second = await executor.run([call("wikipedia", "c6", "SaaS"), call("web_search", "c7", "pricing")])
+        return first, elapsed, second
+
+    try:
+        first, elapsed, second = asyncio.run(run())
+    finally:
+        executor.close()
+    assert executor.tools["wikipedia"].is_async is False and executor.tools["web_search"].is_async is True
+    # Three 0.2s lookups finished together rather than one after another
+    assert elapsed < 0.4
+    assert [message.tool_call_id for message in first] == ["c1", "c2", "c3", "c4", "c5"]
+    assert [message.content for message in first[:3]] == ["article about SaaS", "article about churn", "results for pricing"]
+    assert first[3].status == "error" and "timed out" in first[3].content
+    assert first[4].status == "error" and "unknown tool" in first[4].content
+    # The deterministic lookup came from the cache, the web search ran again
+    assert second[0].content == "article about SaaS"
+    assert calls.count(("wikipedia", "SaaS")) == 1 and calls.count(("web_search", "pricing")) == 2
+
+
+def tool_call_delta(index, arguments, call_id=None, name=None):
+    # Shaped like the community ChatOpenAI's chunks: raw deltas in additional_kwargs only
+    delta = {"index": index, "function": {"arguments": arguments}}
+    if call_id:
+        delta.update(id=call_id, type="function")
+        delta["function"]["name"] = name
+    return AIMessageChunk(content="", additional_kwargs={"tool_calls": [delta]})
+
+
+class ToolCallingLLM:
+    def __init__(self):
+        self.requests = []
+
+    async def astream(self, messages, **kwargs):
+        self.requests.append((list(messages), kwargs))
+        if len(self.requests) == 1:
+            # OpenAI sends the id and name first, then the arguments a few characters at a time
+            yield tool_call_delta(0, "", call_id="c1", name="wikipedia")
+            yield tool_call_delta(0, '{"que')
+            yield tool_call_delta(0, 'ry": "SaaS"}')
+            yield tool_call_delta(1, '{"query"', call_id="c2", name="web_search")
+            yield tool_call_delta(1, ': "pricing"}')
+            yield tool_call_delta(2, '{"query": "x', call_id="c3", name="stuck")
+            return
+        for word in ["Based ", "on ", "research"]:
+            yield AIMessageChunk(content=word)
+
+
+def test_agent_answers_after_running_the_tool_calls(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "AGENT_TOOL_MAX_STEPS", 3)
+    executor = ToolExecutor(make_tools([]))
+    agent = BusinessAnalystAgent(memory=object(), history_cache=object(), write_behind=object(),
+                                 context_builder=object(), response_cache=None, tools=executor)
+    agent.llm = ToolCallingLLM()
+
+    async def run():
+        return "".join([chunk async for chunk in agent.stream_completion([HumanMessage(content="How big is SaaS?")])])
+
+    try:
+        answer = asyncio.run(run())
+    finally:
+        executor.close()
+    assert answer == "Based on research"
+    (first_prompt, first_kwargs), (second_prompt, _) = agent.llm.requests
+    assert [schema["function"]["name"] for schema in first_kwargs["tools"]] == ["wikipedia", "web_search", "stuck"]
+    request, tool_calls, *results = second_prompt[len(first_prompt) - 1:]
+    assert request.content == "How big is SaaS?"
+    assert tool_calls.additional_kwargs["tool_calls"][1]["function"] == {"name": "web_search", "arguments": '{"query": "pricing"}'}
+    assert tool_calls.tool_calls[0]["args"] == {"query": "SaaS"}
+    assert [(type(result), result.content) for result in results[:2]] == [
+        (ToolMessage, "article about SaaS"), (ToolMessage, "results for pricing")
+    ]
+    # Truncated arguments come back to the model as an error instead of an empty call
+    assert results[2].status == "error" and "invalid arguments for stuck" in results[2].content
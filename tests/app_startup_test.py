@@ -0,0 +1,65 @@
+import asyncio
+import subprocess
+import sys
+import time
+import httpx
+from fastapi.testclient import TestClient
+from src.api import main
+from src.memory.http_client import SupabaseHTTPClient
+from src.memory.memory_manager import MemoryManager
+
+
+def test_importing_the_app_does_not_load_the_agent_stack():
+    code = (
+        "import sys, src.api.main; "
+        "print(any(m.startswith(('langchain', 'openai', 'src.agents')) for m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_warm_up_opens_the_requested_number_of_connections():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.method)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200)
+
+    async def run():
+        http = SupabaseHTTPClient(transport=httpx.MockTransport(handler))
+        await MemoryManager(http_client=http).warm_up(connections=3)
+        await http.close()
+
+    asyncio.run(run())
+    assert requests == ["HEAD", "HEAD", "HEAD"]
+
+
+def wait_for_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or response.json()["status"] == "failed" or time.monotonic() > deadline:
+            return response
+        time.sleep(0.02)
+
+
+def test_ready_is_immediate_without_warm_up(monkeypatch):
+    monkeypatch.setattr(main.settings, "WARMUP_ENABLED", False)
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        assert client.get("/ready").json() == {"status": "ready"}
+
+
+def test_failed_warm_up_keeps_the_app_unready(monkeypatch):
+    async def broken_agent():
+        raise ValueError("OPENAI_API_KEY is not set in environment variables")
+
+    monkeypatch.setattr(main.settings, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(main.importlib, "import_module", lambda name: None)
+    monkeypatch.setattr(main, "get_business_analyst", broken_agent)
+    with TestClient(main.app) as client:
+        response = wait_for_ready(client)
+        assert client.get("/health").status_code == 200
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed"
@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+from langchain.schema import SystemMessage
+from langchain_core.runnables import RunnableLambda
+from src.agents.batch import BatchChatRunner, BatchJobStore
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.memory.context_builder import ContextBuilder
+from src.llm.router import ModelEndpoint, ModelRouter
+
+
+class FakeMemory:
+    def __init__(self):
+        self.inserts = []
+
+    async def store_long_term(self, table, data, jwt_token, return_representation=True):
+        self.inserts.append((table, list(data)))
+        return []
+
+
+class WordCounter:
+    def count_message(self, content):
+        return len(content.split())
+
+
+class FakeAgent:
+    conversation_row = staticmethod(BusinessAnalystAgent.conversation_row)
+    build_system_message = BusinessAnalystAgent.build_system_message
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.memory = FakeMemory()
+        self.retrieval = None
+        self.system_message = SystemMessage(content="sys")
+        self.context_builder = ContextBuilder(max_tokens=10_000, counter=WordCounter(),
+                                              summary_store=object(), summary_llm=object())
+        self.synced = []
+
+    async def get_conversation_history(self, session_id, user_id, jwt_token, memory=None):
+        return [{"role": "user", "content": "earlier question"}, {"role": "assistant", "content": "earlier answer"}]
+
+    async def get_session_summary(self, session_id, user_id, jwt_token, memory=None):
+        return {"summary": "", "summarized_until": None}
+
+    async def sync_session(self, session_id, user_id, messages, memory=None):
+        self.synced.append((session_id, [message["role"] for message in messages]))
+
+
+def make_router(peak, prompts=None):
+    active = []
+
+    async def primary(messages):
+        active.append(1)
+        peak.append(len(active))
+        if prompts is not None:
+            prompts.append([message.content for message in messages])
+        await asyncio.sleep(0.01)
+        active.pop()
+        question = messages[-1].content
+        if question.endswith("!"):
+            raise RuntimeError("upstream error")
+        return SimpleNamespace(content=f"answer to {question}")
+
+    async def fallback(messages):
+        return SimpleNamespace(content=f"fallback answer to {messages[-1].content}")
+
+    return ModelRouter([
+        ModelEndpoint("openai:primary", RunnableLambda(primary)),
+        ModelEndpoint("groq:fallback", RunnableLambda(fallback)),
+    ])
+
+
+def test_batch_streams_results_and_bulk_inserts_the_rows():
+    peak = []
+    prompts = []
+    agent = FakeAgent(make_router(peak, prompts))
+    runner = BatchChatRunner(agent=agent, max_concurrency=3, insert_size=4)
+    items = [{"message": f"q{i}", "custom_id": f"c{i}"} for i in range(6)] + [{"message": "q6!", "session_id": "s-old"}]
+
+    async def run():
+        return [result async for result in runner.run(items, "user-1", "jwt")]
+
+    results = asyncio.run(run())
+    summary = results.pop()
+    assert summary["done"] and summary["completed"] == 7 and summary["failed"] == 0
+    assert max(peak) == 3
+    by_index = {result["index"]: result for result in results}
+    assert by_index[0] == {"index": 0, "custom_id": "c0", "session_id": by_index[0]["session_id"], "response": "answer to q0"}
+    # The failing prompt was retried on the fallback model
+    assert by_index[6]["response"] == "fallback answer to q6!"
+    assert by_index[6]["session_id"] == "s-old"
+    # Only the continued session loads its history, and its cached state is refreshed once the rows are in
+    assert ["sys", "earlier question", "earlier answer", "q6!"] in prompts
+    assert ["sys", "q0"] in prompts
+    assert agent.synced == [("s-old", ["user", "assistant"])]
+
+    # 7 exchanges -> 14 rows in bulk inserts of at least insert_size rows
+    assert summary["rows_persisted"] == 14
+    assert [len(rows) for _, rows in agent.memory.inserts] == [4, 4, 4, 2]
+    rows = [row for _, rows in agent.memory.inserts for row in rows]
+    assert {row["role"] for row in rows} == {"user", "assistant"}
+    assert all(row["user_id"] == "user-1" for row in rows)
+
+
+def test_jobs_record_progress_and_results_for_their_owner():
+    agent = FakeAgent(make_router([]))
+    runner = BatchChatRunner(agent=agent, max_concurrency=2)
+    jobs = BatchJobStore(max_local_jobs=5)
+
+    async def run():
+        job = await runner.start_job(jobs, [{"message": "a"}, {"message": "b"}], "user-1", "jwt")
+        await asyncio.gather(*runner._jobs)
+        return await jobs.get(job["job_id"], offset=1, limit=5)
+
+    job = asyncio.run(run())
+    assert job["status"] == "completed"
+    assert (job["total"], job["completed"], job["failed"], job["rows_persisted"]) == (2, 2, 0, 4)
+    assert len(job["results"]) == 1
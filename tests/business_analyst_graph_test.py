@@ -0,0 +1,166 @@
+import asyncio
+from types import SimpleNamespace
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from src.agents.business_analyst_graph import BusinessAnalystGraphAgent
+from src.config.settings import settings
+from src.memory.context_builder import ContextBuilder
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def astream(self, messages):
+        self.prompts.append(messages)
+        for word in ["answer ", str(len(self.prompts))]:
+            yield SimpleNamespace(content=word)
+
+
+class FakeSummaryLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(content=f"summary {self.calls}")
+
+
+class WordCounter:
+    def count_message(self, content):
+        return len(content.split())
+
+
+def make_agent(monkeypatch, checkpointer, max_tokens=10_000):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", False)
+    context_builder = ContextBuilder(max_tokens=max_tokens, counter=WordCounter(),
+                                     summary_store=object(), summary_llm=FakeSummaryLLM())
+    agent = BusinessAnalystGraphAgent(
+        checkpointer=checkpointer, memory=object(), history_cache=object(),
+        write_behind=object(), context_builder=context_builder, response_cache=None,
+    )
+    agent.response_cache = None
+    agent.llm = FakeLLM()
+    agent.system_message.content = "system"
+    agent.history_reads = 0
+    agent.saved = []
+
+    async def get_conversation_history(*args, **kwargs):
+        agent.history_reads += 1
+        return [{"role": "user", "content": "earlier question"}, {"role": "assistant", "content": "earlier answer"}]
+
+    async def get_session_summary(*args, **kwargs):
+        return {}
+
+    async def save_conversation(session_id, user_id, message, **kwargs):
+        agent.saved.append(message)
+
+    agent.get_conversation_history = get_conversation_history
+    agent.get_session_summary = get_session_summary
+    agent.save_conversation = save_conversation
+    return agent
+
+
+async def turn(agent, text):
+    return "".join([chunk async for chunk in agent.generate_response(text, "s1", "u1", "jwt")])
+
+
+def test_sessions_resume_from_the_checkpoint(monkeypatch, tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite3")) as saver:
+            agent = make_agent(monkeypatch, saver)
+            first = await turn(agent, "hello")
+            second = await turn(agent, "and then?")
+            await agent.aclose()
+            state = await (await agent.get_graph()).aget_state({"configurable": {"thread_id": "u1:s1"}})
+            return agent, first, second, state
+
+    agent, first, second, state = asyncio.run(run())
+    assert (first, second) == ("answer 1", "answer 2")
+    # Supabase history seeds the thread once; the second turn reads only the checkpoint
+    assert agent.history_reads == 1
+    assert [m.content for m in agent.llm.prompts[1][1:]] == [
+        "earlier question", "earlier answer", "hello", "answer 1", "and then?"
+    ]
+    assert [m["content"] for m in agent.saved] == ["hello", "answer 1", "and then?", "answer 2"]
+    assert len(state.values["messages"]) == 6
+
+
+def test_turns_outside_the_window_are_folded_into_the_summary(monkeypatch):
+    from langgraph.checkpoint.memory import MemorySaver
+
+    async def run():
+        agent = make_agent(monkeypatch, MemorySaver(), max_tokens=8)
+        await turn(agent, "hello")
+        await turn(agent, "tell me more")
+        await turn(agent, "ok")
+        await agent.aclose()
+        state = await (await agent.get_graph()).aget_state({"configurable": {"thread_id": "u1:s1"}})
+        return agent, state
+
+    agent, state = asyncio.run(run())
+    assert state.values["summary"].startswith("summary")
+    messages = state.values["messages"]
+    total = sum(WordCounter().count_message(m.content) for m in messages)
+    # Everything but the system prompt fits the window
+    assert total <= 8 - 1
+    assert not any(isinstance(m, HumanMessage) and m.content == "earlier question" for m in messages)
+    # The summary written after the second turn is part of the third prompt
+    assert "summary" in agent.llm.prompts[-1][1].content
+
+
+def test_turns_written_outside_the_graph_are_added_to_the_thread(monkeypatch):
+    from langgraph.checkpoint.memory import MemorySaver
+    invalidated = []
+
+    class HistoryCache:
+        async def invalidate(self, user_id, session_id, tenant=None):
+            invalidated.append((user_id, session_id))
+
+    async def run():
+        agent = make_agent(monkeypatch, MemorySaver())
+        agent.history_cache = HistoryCache()
+        await turn(agent, "hello")
+        # A batch item answered in the same session
+        await agent.sync_session("s1", "u1", [{"role": "user", "content": "batch question"},
+                                               {"role": "assistant", "content": "batch answer"}])
+        await turn(agent, "and then?")
+        await agent.aclose()
+        return agent
+
+    agent = asyncio.run(run())
+    assert invalidated == [("u1", "s1")]
+    assert [m.content for m in agent.llm.prompts[1][1:]] == [
+        "earlier question", "earlier answer", "hello", "answer 1", "batch question", "batch answer", "and then?"
+    ]
+
+
+def test_interrupted_answers_are_kept_in_the_thread(monkeypatch):
+    from langgraph.checkpoint.memory import MemorySaver
+
+    class StalledLLM(FakeLLM):
+        async def astream(self, messages):
+            self.prompts.append(messages)
+            yield SimpleNamespace(content="partial")
+            await asyncio.sleep(10)
+
+    async def run():
+        agent = make_agent(monkeypatch, MemorySaver())
+        agent.llm = StalledLLM()
+        stream = agent.generate_response("hello", "s1", "u1", "jwt")
+        first = await stream.__anext__()
+        # The client goes away mid-answer
+        await stream.aclose()
+        agent.llm = FakeLLM()
+        await turn(agent, "and then?")
+        await agent.aclose()
+        return agent, first
+
+    agent, first = asyncio.run(run())
+    assert first == "partial"
+    assert agent.saved[1] == {"role": "assistant", "content": "partial", "interrupted": True}
+    # The next turn sees the partial answer rather than two questions in a row
+    assert [m.content for m in agent.llm.prompts[0][1:]] == [
+        "earlier question", "earlier answer", "hello", "partial", "and then?"
+    ]
@@ -58,9 +58,22 @@ async def make_request():
                     print(f"Error: {error_text.decode()}")
                     return
                 print("\nResponse:")
-                async for chunk in response.aiter_text():
-                    if chunk:
-                        print(chunk, end="", flush=True)
+                # Parse server-sent events: "event:"/"data:" lines, dispatched on a blank line
+                event, data_lines = None, []
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[len("data: "):])
+                    elif line == "" and data_lines:
+                        data = "\n".join(data_lines)
+                        if event == "error":
+                            print(f"\nError event: {data}")
+                        elif event == "done":
+                            print(f"\n\nDone: {data}")
+                        else:
+                            print(data, end="", flush=True)
+                        event, data_lines = None, []
     except httpx.RequestError as e:
         print(f"Request error: {str(e)}")
     except Exception as e:
@@ -0,0 +1,5 @@
+import os
+
+# MemoryManager reads these when first constructed; point it at a dummy project for unit tests
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
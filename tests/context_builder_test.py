@@ -0,0 +1,46 @@
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from src.memory.context_builder import ContextBuilder, SessionSummaryStore, TokenCounter
+
+
+class WordCounter(TokenCounter):
+    def count(self, text):
+        return len(text.split())
+
+    def count_message(self, content):
+        return self.count(content)
+
+
+def make_history(n):
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"message number {i}",
+            "created_at": f"2024-01-01T00:00:{i:02d}",
+        }
+        for i in range(n)
+    ]
+
+
+def make_builder(max_tokens):
+    return ContextBuilder(max_tokens=max_tokens, counter=WordCounter(), summary_store=SessionSummaryStore())
+
+
+def test_recent_turns_fill_the_budget_and_older_turns_overflow():
+    builder = make_builder(max_tokens=2 + 2 + 9)
+    messages, overflow = builder.build(SystemMessage(content="be helpful"), make_history(6), "new question", None)
+
+    assert isinstance(messages[0], SystemMessage)
+    assert [m.content for m in messages[1:-1]] == ["message number 3", "message number 4", "message number 5"]
+    assert isinstance(messages[1], AIMessage)
+    assert isinstance(messages[-1], HumanMessage)
+    assert [m["content"] for m in overflow] == ["message number 0", "message number 1", "message number 2"]
+
+
+def test_already_summarized_turns_are_not_folded_again():
+    builder = make_builder(max_tokens=2 + 2 + 3 + 6)
+    summary = {"summary": "earlier talk", "summarized_until": "2024-01-01T00:00:01+00:00"}
+    messages, overflow = builder.build(SystemMessage(content="be helpful"), make_history(6), "new question", summary)
+
+    assert messages[1].content.endswith("earlier talk")
+    assert [m.content for m in messages[2:-1]] == ["message number 4", "message number 5"]
+    assert [m["content"] for m in overflow] == ["message number 2", "message number 3"]
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+from langchain_core.runnables import RunnableLambda
+from src.agents.crag import CragAgent
+
+
+class Tracker:
+    """Counts how many fake calls are running at once"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.events = []
+
+    async def run(self, name, seconds=0.05):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.events.append(f"start {name}")
+        await asyncio.sleep(seconds)
+        self.events.append(f"end {name}")
+        self.active -= 1
+
+
+class FakeRetrieval:
+    def __init__(self, tracker, contents):
+        self.tracker = tracker
+        self.contents = contents
+
+    async def search(self, query, k=None):
+        await self.tracker.run("retrieve")
+        return [{"content": c, "doc_id": f"doc{i}", "metadata": {"source": f"doc{i}.md"}, "score": 1.0}
+                for i, c in enumerate(self.contents)]
+
+
+class FakeSearchTool:
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.queries = []
+
+    async def ainvoke(self, tool_input):
+        self.queries.append(tool_input["query"])
+        await self.tracker.run("search")
+        return [{"snippet": "KPIs are measurable values", "link": "https://example.com/kpi"}]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def astream(self, messages):
+        self.prompts.append(messages[-1].content)
+        for word in ["A KPI ", "tracks progress."]:
+            yield SimpleNamespace(content=word)
+
+
+def make_agent(contents, speculative_search):
+    tracker = Tracker()
+
+    async def grader(prompt):
+        text = prompt.to_string()
+        if "Formulate an improved question" in text:
+            await tracker.run("rewrite")
+            return "what is a key performance indicator"
+        await tracker.run("grade")
+        document = text.split("Retrieved document:")[1].split("User question")[0]
+        return "yes" if "relevant" in document else "no"
+
+    agent = CragAgent(
+        retrieval=FakeRetrieval(tracker, contents),
+        search_tool=FakeSearchTool(tracker),
+        grader_llm=RunnableLambda(grader),
+        llm=FakeLLM(),
+        grade_concurrency=3,
+        speculative_search=speculative_search,
+    )
+    return agent, tracker
+
+
+async def collect(agent, question):
+    result = {}
+    answer = "".join([chunk async for chunk in agent.astream_answer(question, result)])
+    return answer, result
+
+
+def test_documents_are_graded_concurrently_up_to_the_cap():
+    agent, tracker = make_agent([f"relevant chunk {i}" for i in range(5)], speculative_search=False)
+    answer, result = asyncio.run(collect(agent, "What is a KPI?"))
+    assert answer == "A KPI tracks progress."
+    assert tracker.peak == 3
+    assert result == {"web_search": False, "sources": [f"doc{i}.md" for i in range(5)]}
+    # No irrelevant chunk, so no rewrite or search
+    assert agent.search_tool.queries == []
+
+
+def test_web_search_runs_alongside_retrieval_and_fills_in_for_irrelevant_chunks():
+    agent, tracker = make_agent(["relevant chunk", "off-topic chunk"], speculative_search=True)
+    answer, result = asyncio.run(collect(agent, "What is a KPI?"))
+    assert answer == "A KPI tracks progress."
+    assert tracker.events.index("start rewrite") < tracker.events.index("end retrieve")
+    assert agent.search_tool.queries == ["what is a key performance indicator"]
+    assert result == {"web_search": True, "sources": ["doc0.md", "https://example.com/kpi"]}
+    context = agent.llm.prompts[0]
+    assert "relevant chunk" in context and "KPIs are measurable values" in context
+    assert "off-topic chunk" not in context
+
+
+def test_web_results_are_ignored_when_every_chunk_is_relevant():
+    agent, _ = make_agent(["relevant chunk"], speculative_search=True)
+    _, result = asyncio.run(collect(agent, "What is a KPI?"))
+    assert result == {"web_search": False, "sources": ["doc0.md"]}
+    assert "KPIs are measurable values" not in agent.llm.prompts[0]
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from src.retrieval import embedding_cache
+from src.retrieval.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.sent = []
+
+    async def aembed_documents(self, texts):
+        self.sent.extend(texts)
+        return [[float(len(text)), float(text.count("e"))] for text in texts]
+
+
+def test_only_unseen_texts_reach_the_model_and_survive_reopening(tmp_path):
+    model = CountingEmbeddings()
+
+    async def run():
+        cache = EmbeddingCache("openai:test", directory=str(tmp_path), max_entries=10)
+        embeddings = CachedEmbeddings(model, cache)
+        first = await embeddings.aembed_documents(["alpha", "beta", "alpha"])
+        second = await embeddings.aembed_documents(["beta", "gamma"])
+        stats = cache.stats()
+        cache.close()
+        reopened = EmbeddingCache("openai:test", directory=str(tmp_path), max_entries=10)
+        cached = reopened.lookup(["gamma", "delta"])
+        other_model = EmbeddingCache("ollama:test", directory=str(tmp_path)).lookup(["gamma"])
+        return first, second, stats, cached, other_model
+
+    first, second, stats, cached, other_model = asyncio.run(run())
+    assert model.sent == ["alpha", "beta", "gamma"]
+    assert first == [[5.0, 0.0], [4.0, 1.0], [5.0, 0.0]]
+    assert second == [[4.0, 1.0], [5.0, 0.0]]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 3)
+    assert cached == [[5.0, 0.0], None]
+    assert other_model == [None]
+
+
+def test_least_recently_used_entries_are_evicted_when_full(tmp_path):
+    cache = EmbeddingCache("m", directory=str(tmp_path), max_entries=2)
+    cache.insert(["a"], [[1.0]])
+    cache.insert(["b"], [[2.0]])
+    cache.lookup(["a"])
+    cache.insert(["c"], [[3.0]])
+    assert cache.lookup(["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_large_inserts_query_the_index_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "LOOKUP_CHUNK", 2)
+    cache = EmbeddingCache("m", directory=str(tmp_path), max_entries=6)
+    cache.insert(["a", "b", "c", "d", "e"], [[1.0], [2.0], [3.0], [4.0], [5.0]])
+    # Two overwrites in place plus three new keys, two of which need evicted slots
+    cache.insert(["a", "b", "f", "g", "h"], [[10.0], [20.0], [6.0], [7.0], [8.0]])
+    assert cache.lookup(["a", "b", "f", "g", "h"]) == [[10.0], [20.0], [6.0], [7.0], [8.0]]
+    assert len(cache) == 6 and cache.stats()["evictions"] == 2
+    cache.close()
+
+
+def test_lookups_wait_while_another_process_rewrites_slots(tmp_path):
+    writer = EmbeddingCache("m", directory=str(tmp_path), max_entries=4)
+    writer.insert(["a"], [[1.0]])
+    reader = EmbeddingCache("m", directory=str(tmp_path), max_entries=4)
+    results = []
+    # A separate cache object opens its own lock file description, like another worker process would
+    with writer._file_lock(exclusive=True):
+        thread = threading.Thread(target=lambda: results.append(reader.lookup(["a"])))
+        thread.start()
+        thread.join(0.2)
+        blocked = thread.is_alive()
+    thread.join()
+    assert blocked and results == [[[1.0]]]
+    writer.close()
+    reader.close()
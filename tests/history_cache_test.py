@@ -0,0 +1,31 @@
+import asyncio
+from src.memory.history_cache import HistoryCache
+
+
+def test_append_only_extends_cached_sessions():
+    async def run():
+        cache = HistoryCache(max_sessions=10, max_messages=3, ttl=60)
+        assert await cache.append("user", "s1", {"role": "user", "content": "hi"}) is False
+        assert await cache.get("user", "s1") is None
+
+        await cache.set("user", "s1", [{"role": "user", "content": "hi"}])
+        for i in range(3):
+            assert await cache.append("user", "s1", {"role": "assistant", "content": str(i)})
+        return await cache.get("user", "s1")
+
+    messages = asyncio.run(run())
+    assert [m["content"] for m in messages] == ["0", "1", "2"]
+
+
+def test_local_backend_evicts_least_recently_used_session():
+    async def run():
+        cache = HistoryCache(max_sessions=2, max_messages=10, ttl=60)
+        await cache.set("user", "a", [{"role": "user", "content": "a"}])
+        await cache.set("user", "b", [{"role": "user", "content": "b"}])
+        await cache.get("user", "a")
+        await cache.set("user", "c", [{"role": "user", "content": "c"}])
+        return await cache.get("user", "a"), await cache.get("user", "b")
+
+    a, b = asyncio.run(run())
+    assert a is not None
+    assert b is None
@@ -0,0 +1,93 @@
+import asyncio
+from src.retrieval.ingestion import IngestionPipeline, iter_source_files, parse_file
+from src.retrieval.service import RetrievalService
+from src.retrieval.vector_index import PersistentVectorIndex
+
+
+class LengthEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    async def aembed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text)), 1.0, float(text.count("a"))] for text in texts]
+
+
+def write_corpus(root):
+    (root / "nested").mkdir()
+    (root / "a.txt").write_text("alpha paragraph. " * 40)
+    (root / "b.md").write_text("beta paragraph. " * 40)
+    # Same text as a.txt: every chunk is a duplicate
+    (root / "nested" / "copy.txt").write_text("alpha paragraph. " * 40)
+    (root / "skip.csv").write_text("not,ingested")
+
+
+def test_files_are_discovered_lazily_and_split_with_hashes(tmp_path):
+    write_corpus(tmp_path)
+    files = list(iter_source_files([str(tmp_path)]))
+    assert [f.rsplit("/", 1)[-1] for f in files] == ["a.txt", "b.md", "copy.txt"]
+    chunks = parse_file(files[0], chunk_size=200, chunk_overlap=20)
+    assert len(chunks) > 1 and all(len(c["content"]) <= 200 for c in chunks)
+    assert chunks[0]["metadata"]["source"] == files[0] and len(chunks[0]["metadata"]["hash"]) == 64
+
+
+def test_pipeline_dedupes_batches_and_reingests_without_duplicates(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_corpus(corpus)
+    embeddings = LengthEmbeddings()
+    index = PersistentVectorIndex(str(tmp_path / "index"), writable=True)
+    pipeline = IngestionPipeline(RetrievalService(index=index, embeddings=embeddings), chunk_size=200,
+                                 chunk_overlap=20, max_workers=2, embed_batch_size=4, embed_concurrency=1)
+
+    first = asyncio.run(pipeline.run([str(corpus)]))
+    first_batches = list(embeddings.batches)
+    total = index.ntotal
+    second = asyncio.run(pipeline.run([str(corpus)]))
+    doc_names = sorted(d.rsplit("/", 1)[-1] for d in index.doc_ids())
+    index.close()
+
+    assert first["files"] == 3 and first["duplicates"] > 0
+    assert first["embedded"] == first["chunks"] == total
+    assert all(size == 4 for size in first_batches[:-1]) and sum(first_batches) == total
+    # Re-ingesting replaces each document's chunks instead of adding a second copy
+    assert second["chunks"] == first["chunks"] and index.ntotal == total
+    # Whichever copy of the alpha text was parsed first owns its chunks
+    assert len(doc_names) == 2 and "b.md" in doc_names
+
+
+class FailingEmbeddings(LengthEmbeddings):
+    async def aembed_documents(self, texts):
+        if any("gamma" in text for text in texts):
+            raise RuntimeError("embedding service unavailable")
+        return await super().aembed_documents(texts)
+
+
+def test_reingest_keeps_documents_that_fail_to_embed_and_prunes_removed_files(tmp_path):
+    corpus, extra = tmp_path / "corpus", tmp_path / "extra"
+    corpus.mkdir()
+    extra.mkdir()
+    write_corpus(corpus)
+    (extra / "c.txt").write_text("charlie paragraph. " * 10)
+    index = PersistentVectorIndex(str(tmp_path / "index"), writable=True)
+    pipeline = IngestionPipeline(RetrievalService(index=index, embeddings=FailingEmbeddings()), chunk_size=200,
+                                 chunk_overlap=20, max_workers=2, embed_batch_size=1, embed_concurrency=2)
+    asyncio.run(pipeline.run([str(extra)]))
+    asyncio.run(pipeline.run([str(corpus)]))
+
+    (corpus / "a.txt").unlink()
+    (corpus / "b.md").write_text("gamma paragraph. " * 40)
+    stats = asyncio.run(pipeline.run([str(corpus)]))
+    docs = {}
+    for doc_id, content in index._db.execute("SELECT doc_id, content FROM chunks"):
+        words = {word for word in ("alpha", "beta", "gamma", "charlie") if word in content}
+        docs.setdefault(doc_id.rsplit("/", 1)[-1], set()).update(words)
+    index.close()
+
+    assert stats["failed_documents"] == 1
+    # b.md failed to embed: its previous version is still searchable
+    assert docs["b.md"] == {"beta"}
+    # a.txt is gone from disk and from the index; its copy now owns the alpha text
+    assert "a.txt" not in docs and docs["copy.txt"] == {"alpha"}
+    # Documents outside the ingested paths are left alone
+    assert docs["c.txt"] == {"charlie"}
@@ -0,0 +1,43 @@
+import time
+import pytest
+from jose import jwt
+from src.api.auth import JWTVerifier
+
+SECRET = "test-secret"
+
+
+def make_token(sub="user-1", exp_in=3600):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + exp_in}, SECRET, algorithm="HS256")
+
+
+def test_verified_claims_are_cached_by_token():
+    verifier = JWTVerifier(secret=SECRET)
+    token = make_token()
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert (verifier.hits, verifier.misses) == (1, 1)
+
+
+def test_expired_cache_entry_is_verified_again(monkeypatch):
+    verifier = JWTVerifier(secret=SECRET)
+    token = make_token(exp_in=60)
+    verifier.verify(token)
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 120)
+    verifier.verify(token)
+    assert (verifier.hits, verifier.misses) == (0, 2)
+
+
+def test_bad_signature_is_rejected_and_not_cached():
+    verifier = JWTVerifier(secret=SECRET)
+    token = jwt.encode({"sub": "user-1"}, "other-secret", algorithm="HS256")
+    with pytest.raises(Exception):
+        verifier.verify(token)
+    assert len(verifier._cache) == 0
+
+
+def test_cache_is_bounded():
+    verifier = JWTVerifier(secret=SECRET, max_entries=2)
+    for i in range(3):
+        verifier.verify(make_token(sub=f"user-{i}"))
+    assert len(verifier._cache) == 2
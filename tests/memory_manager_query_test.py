@@ -0,0 +1,38 @@
+import asyncio
+import httpx
+from src.memory.http_client import SupabaseHTTPClient
+from src.memory.memory_manager import MemoryManager
+
+
+def test_get_long_term_sends_projection_order_limit_and_keyset_cursor():
+    seen = {}
+
+    def handler(request):
+        seen["params"] = list(request.url.params.multi_items())
+        return httpx.Response(200, json=[])
+
+    async def run():
+        http = SupabaseHTTPClient(transport=httpx.MockTransport(handler))
+        manager = MemoryManager(http_client=http)
+        await manager.get_long_term(
+            table="conversations",
+            query={"session_id": "s1", "is_archived": False, "created_at": [("gte", "2024-01-01"), ("lt", "2024-02-01")]},
+            jwt_token="token",
+            select="role,content",
+            order="created_at.desc,id.desc",
+            limit=20,
+            before=("2024-01-15T10:00:00+00:00", "42")
+        )
+        await http.close()
+
+    asyncio.run(run())
+    assert seen["params"] == [
+        ("session_id", "eq.s1"),
+        ("is_archived", "eq.false"),
+        ("created_at", "gte.2024-01-01"),
+        ("created_at", "lt.2024-02-01"),
+        ("select", "role,content"),
+        ("order", "created_at.desc,id.desc"),
+        ("limit", "20"),
+        ("or", '(created_at.lt."2024-01-15T10:00:00+00:00",and(created_at.eq."2024-01-15T10:00:00+00:00",id.lt."42"))'),
+    ]
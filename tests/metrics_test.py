@@ -0,0 +1,92 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from jose import jwt
+from prometheus_client.parser import text_string_to_metric_families
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.api import main
+from src.config.settings import settings
+from src.memory.context_builder import ContextBuilder
+
+STAGES = [
+    "chat_auth_seconds",
+    "chat_history_fetch_seconds",
+    "chat_user_message_save_seconds",
+    "chat_time_to_first_token_seconds",
+    "chat_chunks_per_second",
+    "chat_final_save_seconds",
+    "chat_stream_duration_seconds",
+]
+
+
+class WordCounter:
+    def count_message(self, content):
+        return len(content.split())
+
+
+class WordLLM:
+    async def astream(self, messages):
+        for word in ["Revenue ", "grew ", "fast"]:
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(content=word)
+
+
+def make_agent():
+    context_builder = ContextBuilder(max_tokens=10_000, counter=WordCounter(),
+                                     summary_store=object(), summary_llm=object())
+    agent = BusinessAnalystAgent(memory=object(), history_cache=object(), write_behind=object(),
+                                 context_builder=context_builder, response_cache=None)
+    agent.response_cache = None
+    agent.retrieval = None
+    agent.llm = WordLLM()
+
+    async def get_conversation_history(*args, **kwargs):
+        return []
+
+    async def get_session_summary(*args, **kwargs):
+        return {}
+
+    async def save_conversation(*args, **kwargs):
+        pass
+
+    agent.get_conversation_history = get_conversation_history
+    agent.get_session_summary = get_session_summary
+    agent.save_conversation = save_conversation
+    return agent
+
+
+def stage_counts(client):
+    counts = {}
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        for sample in family.samples:
+            if sample.name.endswith("_count") and sample.name[:-len("_count")] in STAGES:
+                counts[sample.name[:-len("_count")]] = sample.value
+    return counts
+
+
+def test_a_streamed_turn_updates_every_stage_metric(monkeypatch):
+    for name, value in [("OPENAI_API_KEY", "test-key"), ("SINGLE_FLIGHT_ENABLED", False), ("WARMUP_ENABLED", False),
+                        ("ADMISSION_ENABLED", False), ("RESUMABLE_STREAMS_ENABLED", False)]:
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(main.jwt_verifier, "secret", "test-secret")
+    agent = make_agent()
+
+    async def provide_agent():
+        return agent
+
+    main.app.dependency_overrides[main.get_business_analyst] = provide_agent
+    token = jwt.encode({"sub": "u1", "exp": int(time.time()) + 60}, "test-secret", algorithm="HS256")
+    try:
+        with TestClient(main.app) as client:
+            before = stage_counts(client)
+            response = client.post("/chat/business-analyst", json={"message": "How did we do?"},
+                                   headers={"Authorization": f"Bearer {token}"})
+            after = stage_counts(client)
+    finally:
+        main.app.dependency_overrides.clear()
+
+    streamed = "".join(line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: "))
+    assert response.status_code == 200 and streamed.startswith("Revenue grew fast")
+    assert sorted(after) == sorted(STAGES)
+    assert all(after[stage] == before.get(stage, 0) + 1 for stage in STAGES), (before, after)
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from src.llm.router import AdaptiveLimiter, LimiterTimeout, ModelEndpoint, ModelRouter, NoModelAvailable
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class ThrottledModel:
+    """Fake streaming model that is rate limited before its first token"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        raise RateLimitError("Too Many Requests")
+        yield
+
+
+def fake_model(text):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+
+
+def limiter(name, **kwargs):
+    kwargs.setdefault("initial_limit", 4)
+    kwargs.setdefault("queue_timeout", 0.05)
+    return AdaptiveLimiter(name, **kwargs)
+
+
+def test_fails_over_to_secondary_before_first_token():
+    primary = ModelEndpoint("primary", ThrottledModel(), limiter("primary"))
+    secondary = ModelEndpoint("secondary", fake_model("hello from fallback"), limiter("secondary"))
+    router = ModelRouter([primary, secondary])
+
+    async def run():
+        return "".join([chunk.content async for chunk in router.astream(["hi"])])
+
+    assert asyncio.run(run()) == "hello from fallback"
+    assert primary.limiter.limit == 2.0
+    assert primary.limiter.in_flight == 0
+    assert secondary.limiter.in_flight == 0
+
+
+def test_raises_when_every_model_fails():
+    router = ModelRouter([ModelEndpoint("primary", ThrottledModel(), limiter("primary"))])
+
+    async def run():
+        return [chunk async for chunk in router.astream(["hi"])]
+
+    with pytest.raises(NoModelAvailable):
+        asyncio.run(run())
+
+
+def test_limiter_grows_on_fast_success_and_queues_over_limit():
+    async def run():
+        lim = limiter("p", initial_limit=1, max_queue=1, latency_target=1.0)
+        await lim.acquire()
+        waiting = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        assert lim.stats()["queued"] == 1
+        lim.release("success", latency=0.1)
+        await waiting
+        assert lim.limit == 2.0
+        assert lim.in_flight == 1
+
+        await lim.acquire()
+        with pytest.raises(LimiterTimeout):
+            await lim.acquire()
+        return lim
+
+    lim = asyncio.run(run())
+    assert lim.stats()["queued"] == 0
+
+
+class BatchModel:
+    """Fake model whose ainvoke records concurrency and throttles the prompts it is told to"""
+
+    def __init__(self, throttled=()):
+        self.throttled = set(throttled)
+        self.running = 0
+        self.peak = 0
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            if prompt in self.throttled:
+                raise RateLimitError("Too Many Requests")
+            return AIMessage(content=prompt)
+        finally:
+            self.running -= 1
+
+
+def test_batches_share_the_adaptive_limiter_and_back_off_on_429():
+    primary_model, secondary_model = BatchModel(throttled={"p6", "p7"}), BatchModel()
+    primary = ModelEndpoint("primary", primary_model, limiter("primary", initial_limit=3, min_limit=1))
+    secondary = ModelEndpoint("secondary", secondary_model, limiter("secondary", initial_limit=2, min_limit=1))
+    router = ModelRouter([primary, secondary])
+    prompts = [f"p{i}" for i in range(8)]
+
+    async def run():
+        return {index: result.content async for index, result in router.abatch_as_completed(prompts, max_concurrency=5)}
+
+    results = asyncio.run(run())
+    assert results == {i: f"p{i}" for i in range(8)}
+    # Held to the limiter rather than max_concurrency, and every slot was given back
+    assert primary_model.peak == 3 and secondary_model.peak <= 2
+    assert primary.limiter.in_flight == secondary.limiter.in_flight == 0
+    # The last two prompts were throttled, halving the primary's limit twice
+    assert primary.limiter.limit < 3
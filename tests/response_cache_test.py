@@ -0,0 +1,32 @@
+import asyncio
+from langchain.schema import HumanMessage, SystemMessage
+from src.llm.response_cache import ResponseCache, cache_key, split_for_replay
+
+
+def test_cache_key_ignores_whitespace_and_case():
+    a = [SystemMessage(content="You are helpful"), HumanMessage(content="What is  a KPI?")]
+    b = [SystemMessage(content="you are helpful"), HumanMessage(content=" what is a kpi? ")]
+    assert cache_key("gpt-4o", {"temperature": 0.7}, a) == cache_key("gpt-4o", {"temperature": 0.7}, b)
+    assert cache_key("gpt-4o", {"temperature": 0.7}, a) != cache_key("gpt-4o", {"temperature": 0.2}, a)
+
+
+def test_replay_chunks_reassemble_to_the_cached_text():
+    text = "A key performance indicator measures progress toward a goal.\nPick a few."
+    chunks = split_for_replay(text, 10)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+
+
+def test_stored_answer_is_replayed_and_counted():
+    messages = [SystemMessage(content="sys"), HumanMessage(content="hello")]
+
+    async def run():
+        cache = ResponseCache(max_entries=10, replay_chunk_chars=4)
+        assert await cache.lookup("gpt-4o", {}, messages) is None
+        await cache.store("gpt-4o", {}, messages, "hello there, how can I help?")
+        cached = await cache.lookup("gpt-4o", {}, messages)
+        return cache, [chunk async for chunk in cache.replay(cached)]
+
+    cache, chunks = asyncio.run(run())
+    assert "".join(chunks) == "hello there, how can I help?"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.api.resumable import ResumableStreams
+from src.api.sse import sse_stream
+from src.config.settings import settings
+from src.memory.context_builder import ContextBuilder
+
+
+class WordCounter:
+    def count_message(self, content):
+        return len(content.split())
+
+
+class EndlessLLM:
+    async def astream(self, messages):
+        index = 0
+        while True:
+            index += 1
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(content=f"t{index} ")
+
+
+def make_agent(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", False)
+    context_builder = ContextBuilder(max_tokens=10_000, counter=WordCounter(),
+                                     summary_store=object(), summary_llm=object())
+    agent = BusinessAnalystAgent(memory=object(), history_cache=object(), write_behind=object(),
+                                 context_builder=context_builder, response_cache=None)
+    agent.response_cache = None
+    agent.retrieval = None
+    agent.llm = EndlessLLM()
+    agent.saved = []
+
+    async def get_conversation_history(*args, **kwargs):
+        return []
+
+    async def get_session_summary(*args, **kwargs):
+        return {}
+
+    async def save_conversation(session_id, user_id, message, **kwargs):
+        agent.saved.append(message)
+
+    agent.get_conversation_history = get_conversation_history
+    agent.get_session_summary = get_session_summary
+    agent.save_conversation = save_conversation
+    return agent
+
+
+async def tokens(words):
+    for word in words:
+        await asyncio.sleep(0.005)
+        yield word
+
+
+def test_reconnect_replays_only_what_came_after_the_last_event_id():
+    streams = ResumableStreams(ttl=60, grace_seconds=1.0, max_local_streams=10)
+
+    async def run():
+        stream_id = await streams.start(tokens(["a", "b", "c"]), meta={"user_id": "u1"})
+        frames = [frame async for frame in sse_stream(streams.subscribe(stream_id), coalesce_ms=0, source_ids=True)]
+        resumed = [chunk async for chunk in streams.subscribe(stream_id, last_event_id="1")]
+        return frames, resumed, await streams.meta(stream_id)
+
+    frames, resumed, meta = asyncio.run(run())
+    assert frames[:3] == ["id: 1\ndata: a\n\n", "id: 2\ndata: b\n\n", "id: 3\ndata: c\n\n"]
+    # The done frame repeats the last chunk id, so resuming from it replays nothing
+    assert frames[3] == "id: 3\nevent: done\ndata: {}\n\n"
+    assert resumed == [("2", "b"), ("3", "c")]
+    assert meta == {"user_id": "u1"}
+
+
+def test_abandoned_generation_is_cancelled_and_its_partial_answer_saved(monkeypatch):
+    agent = make_agent(monkeypatch)
+    streams = ResumableStreams(ttl=60, grace_seconds=0.1, max_local_streams=10)
+
+    async def run():
+        stream_id = await streams.start(agent.generate_response("question", "s1", "u1", "jwt"))
+        received = []
+        async for _, chunk in streams.subscribe(stream_id):
+            received.append(chunk)
+            if len(received) == 3:
+                # The client disconnects; nobody reconnects within the grace period
+                break
+        await asyncio.sleep(0.5)
+        return received, streams.stats()
+
+    received, stats = asyncio.run(run())
+    assert stats["generating"] == 0
+    user, assistant = agent.saved
+    assert user == {"role": "user", "content": "question"}
+    assert assistant["interrupted"] is True
+    assert assistant["content"].startswith("".join(received))
+    assert BusinessAnalystAgent.conversation_row("s1", "u1", assistant)["metadata"]["interrupted"] is True
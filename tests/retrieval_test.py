@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from src.retrieval.service import RetrievalService
+from src.retrieval.vector_index import PersistentVectorIndex
+
+VOCABULARY = ["revenue", "churn", "pricing", "hiring", "market", "risk"]
+
+
+class KeywordEmbeddings:
+    """Deterministic stand-in: one dimension per vocabulary word"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, text):
+        words = text.lower().split()
+        return [float(words.count(word)) + 0.01 for word in VOCABULARY]
+
+    async def aembed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self.embed(text) for text in texts]
+
+
+def test_index_persists_and_readers_see_incremental_updates(tmp_path):
+    embeddings = KeywordEmbeddings()
+    writer = PersistentVectorIndex(str(tmp_path), writable=True)
+    writer.add("pricing.md", ["pricing pricing tiers", "market size"],
+               [embeddings.embed("pricing pricing tiers"), embeddings.embed("market size")], [{"source": "pricing.md"}, None])
+    writer.add("churn.md", ["churn churn drivers"], [embeddings.embed("churn churn drivers")])
+    writer.save()
+
+    reader = PersistentVectorIndex(str(tmp_path))
+    assert reader.ntotal == 3
+    hits = reader.search([embeddings.embed("pricing")], 2)[0]
+    assert hits[0]["doc_id"] == "pricing.md" and hits[0]["metadata"] == {"source": "pricing.md"}
+
+    # Re-adding a document replaces its chunks; deleting drops them, without a rebuild
+    writer.add("pricing.md", ["risk register"], [embeddings.embed("risk register")])
+    writer.delete("churn.md")
+    writer.save()
+    assert reader.refresh()
+    assert reader.ntotal == 1
+    assert [hit["content"] for hit in reader.search([embeddings.embed("churn")], 3)[0]] == ["risk register"]
+
+    with pytest.raises(Exception):
+        reader.add("x", ["text"], [embeddings.embed("text")])
+    with pytest.raises(Exception):
+        PersistentVectorIndex(str(tmp_path), writable=True)
+    writer.close()
+    reader.close()
+
+
+def test_concurrent_searches_share_one_embedding_batch(tmp_path):
+    embeddings = KeywordEmbeddings()
+
+    async def run():
+        writer = RetrievalService(index=PersistentVectorIndex(str(tmp_path), writable=True), embeddings=embeddings)
+        await writer.add_document("notes.md", ["revenue growth", "hiring plan", "churn analysis"])
+        writer.index.close()
+
+        service = RetrievalService(index=PersistentVectorIndex(str(tmp_path)), embeddings=embeddings,
+                                   k=1, batch_window_ms=20)
+        results = await asyncio.gather(*[service.search(q) for q in ("revenue", "hiring", "churn")])
+        await service.stop()
+        return results, service.stats()
+
+    results, stats = asyncio.run(run())
+    assert [hits[0]["content"] for hits in results] == ["revenue growth", "hiring plan", "churn analysis"]
+    assert embeddings.calls == [3, 3]
+    assert stats["batches"] == 1 and stats["queries"] == 3
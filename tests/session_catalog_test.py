@@ -0,0 +1,50 @@
+import asyncio
+import json
+import httpx
+from src.agents.business_analyst import BusinessAnalystAgent
+from src.memory.history_cache import HistoryCache
+from src.memory.http_client import SupabaseHTTPClient
+from src.memory.memory_manager import MemoryManager
+from src.memory.session_catalog import SessionCatalog
+
+
+def test_sessions_are_paged_from_the_catalog_and_archived_in_bulk():
+    requests = []
+    sessions = [
+        {"session_id": "s2", "title": "Pricing", "message_count": 4, "last_updated_at": "2026-10-02T00:00:00+00:00"},
+        {"session_id": "s1", "title": "Market size", "message_count": 2, "last_updated_at": "2026-10-01T00:00:00+00:00"},
+    ]
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path.endswith("/rpc/archive_sessions"):
+            return httpx.Response(200, json=1)
+        return httpx.Response(200, json=sessions)
+
+    async def run():
+        http = SupabaseHTTPClient(transport=httpx.MockTransport(handler))
+        history_cache = HistoryCache(max_sessions=10, max_messages=10, ttl=60)
+        await history_cache.set("u1", "s1", [{"role": "user", "content": "hi"}])
+        catalog = SessionCatalog(memory=MemoryManager(http_client=http), history_cache=history_cache)
+        page = await catalog.list_page("u1", "token", before=("2026-10-03T00:00:00+00:00", "s3"), limit=2)
+        archived = await catalog.archive("u1", ["s1", "s9"], "token")
+        await http.close()
+        return page, archived, await history_cache.get("u1", "s1")
+
+    page, archived, cached = asyncio.run(run())
+    assert page == {"sessions": sessions, "next_cursor": {"last_updated_at": "2026-10-01T00:00:00+00:00", "session_id": "s1"}}
+    listing, archive = requests
+    assert listing.url.path.endswith("/rest/v1/conversation_sessions")
+    params = dict(listing.url.params.multi_items())
+    assert (params["user_id"], params["archived"], params["limit"]) == ("eq.u1", "eq.false", "2")
+    assert params["order"] == "last_updated_at.desc,session_id.desc"
+    assert params["or"].startswith('(last_updated_at.lt."2026-10-03T00:00:00+00:00"')
+    assert json.loads(archive.content) == {"session_ids": ["s1", "s9"]}
+    assert archive.headers["authorization"] == "Bearer token"
+    assert archived == 1 and cached is None
+
+
+def test_message_metadata_is_stored_as_an_object():
+    row = BusinessAnalystAgent.conversation_row("s1", "u1", {"role": "user", "content": "hello"}, is_first_message=True)
+    assert row["metadata"] == {"message_type": "text", "formatting": "markdown", "is_first_message": True}
+    assert row["title"] == "hello"
@@ -0,0 +1,96 @@
+import asyncio
+from src.llm.single_flight import SingleFlight
+
+
+def test_concurrent_subscribers_share_one_upstream_stream():
+    calls = []
+    release = None
+
+    async def upstream():
+        calls.append(1)
+        for token in ["a", "b", "c"]:
+            await release.wait()
+            yield token
+
+    async def collect(flight):
+        return [chunk async for chunk in flight.stream("key", upstream)]
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        flight = SingleFlight()
+        first = asyncio.create_task(collect(flight))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(collect(flight))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+        return results, flight.in_flight
+
+    results, in_flight = asyncio.run(run())
+    assert results == [["a", "b", "c"], ["a", "b", "c"]]
+    assert calls == [1]
+    assert in_flight == 0
+
+
+def test_late_joiner_gets_buffered_chunks_first():
+    async def upstream():
+        yield "a"
+        await asyncio.sleep(0.01)
+        yield "b"
+
+    async def run():
+        flight = SingleFlight()
+        first = flight.stream("key", upstream)
+        assert await first.__anext__() == "a"
+        late = [chunk async for chunk in flight.stream("key", upstream)]
+        rest = [chunk async for chunk in first]
+        return late, rest
+
+    late, rest = asyncio.run(run())
+    assert late == ["a", "b"]
+    assert rest == ["b"]
+
+
+def test_upstream_error_reaches_every_subscriber():
+    async def upstream():
+        yield "a"
+        raise RuntimeError("rate limited")
+
+    async def collect(flight):
+        return [chunk async for chunk in flight.stream("key", upstream)]
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(collect(flight), collect(flight), return_exceptions=True)
+
+    for result in asyncio.run(run()):
+        assert isinstance(result, RuntimeError)
+
+
+def test_upstream_is_cancelled_when_the_last_subscriber_leaves():
+    stopped = []
+
+    async def upstream():
+        try:
+            for token in ["a", "b", "c"]:
+                yield token
+                await asyncio.sleep(0.05)
+        finally:
+            stopped.append(True)
+
+    async def run():
+        flight = SingleFlight()
+        first = flight.stream("key", upstream)
+        second = flight.stream("key", upstream)
+        assert await first.__anext__() == "a"
+        assert await second.__anext__() == "a"
+        await first.aclose()
+        # One reader is still attached, so the generation keeps going
+        assert await second.__anext__() == "b"
+        await second.aclose()
+        await asyncio.sleep(0.01)
+        return flight.in_flight
+
+    assert asyncio.run(run()) == 0
+    assert stopped == [True]
@@ -0,0 +1,46 @@
+import asyncio
+from src.api.sse import HEARTBEAT, format_event, sse_stream
+
+
+async def tokens(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+def test_format_event_splits_multiline_data():
+    assert format_event("a\nb", event="done", event_id="3") == "id: 3\nevent: done\ndata: a\ndata: b\n\n"
+
+
+def test_tokens_are_coalesced_by_size_and_stream_ends_with_done():
+    frames = asyncio.run(collect(sse_stream(tokens(["ab", "cd", "ef", "g"]), done_data={"session_id": "s1"},
+                                            coalesce_ms=1000, coalesce_bytes=4)))
+    assert frames == [
+        "id: 1\ndata: abcd\n\n",
+        "id: 2\ndata: efg\n\n",
+        'id: 3\nevent: done\ndata: {"session_id": "s1"}\n\n',
+    ]
+
+
+def test_time_threshold_flushes_slow_streams_and_idle_sends_heartbeats():
+    frames = asyncio.run(collect(sse_stream(tokens(["a", "b"], delay=0.05), coalesce_ms=1, coalesce_bytes=1024,
+                                            heartbeat_seconds=0.02)))
+    assert HEARTBEAT in frames
+    assert [f for f in frames if f.startswith("id:") and "event:" not in f] == ["id: 1\ndata: a\n\n", "id: 2\ndata: b\n\n"]
+
+
+def test_upstream_error_becomes_error_event():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+    frames = asyncio.run(collect(sse_stream(failing(), coalesce_ms=1000)))
+    assert frames == [
+        "id: 1\ndata: partial\n\n",
+        'id: 2\nevent: error\ndata: {"detail": "upstream failed"}\n\n',
+    ]
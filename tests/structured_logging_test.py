@@ -0,0 +1,76 @@
+import asyncio
+import io
+import json
+import logging
+from src.api.correlation import CorrelationIdMiddleware
+from src.config.settings import settings
+from src.monitoring.structured_logging import (
+    bind, configure_logging, log_context, payload_fields, sampled, stop_logging, unbind
+)
+
+
+def read_lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_carry_the_bound_context_and_sampling_keeps_whole_requests(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PAYLOADS", False)
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream, capture_uvicorn=False)
+    logger = logging.getLogger("tests.structured")
+    try:
+        token = bind(request_id="req-1", session_id="s1")
+        logger.info("Chat request received", extra=payload_fields("message", "secret plan"))
+        logger.debug("not at this level")
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("Failed")
+        unbind(token)
+        # Rate 0 drops sampled info events but never warnings
+        logger.info("noisy", extra=sampled(0.0))
+        logger.warning("important", extra=sampled(0.0))
+        for request_id in ("a", "b", "c", "d"):
+            token = bind(request_id=request_id)
+            logger.info("first", extra=sampled(0.5))
+            logger.info("second", extra=sampled(0.5))
+            unbind(token)
+    finally:
+        stop_logging()
+
+    lines = read_lines(stream)
+    first, error = lines[0], lines[1]
+    assert first["message"] == "Chat request received"
+    assert (first["request_id"], first["session_id"]) == ("req-1", "s1")
+    # The body is only logged as a size unless LOG_PAYLOADS is on
+    assert first["message_chars"] == 11 and "secret plan" not in json.dumps(lines)
+    assert error["level"] == "ERROR" and "RuntimeError: boom" in error["exception"]
+    assert "noisy" not in [line["message"] for line in lines]
+    assert "important" in [line["message"] for line in lines]
+    sampled_requests = [line["request_id"] for line in lines if line["message"] in ("first", "second")]
+    assert all(sampled_requests.count(request_id) == 2 for request_id in set(sampled_requests))
+
+
+def test_middleware_binds_and_echoes_the_request_id():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(log_context.get().get("request_id"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def call(headers):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await CorrelationIdMiddleware(app)({"type": "http", "headers": headers}, None, send)
+        return dict(sent[0]["headers"])[b"x-request-id"].decode()
+
+    echoed = asyncio.run(call([(b"x-request-id", b"abc-123")]))
+    generated = asyncio.run(call([(b"x-request-id", b"bad id\nwith newline")]))
+    assert echoed == "abc-123"
+    assert generated != "bad id\nwith newline" and len(generated) == 32
+    assert seen == [echoed, generated]
+    assert log_context.get() == {}
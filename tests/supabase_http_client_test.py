@@ -0,0 +1,79 @@
+import asyncio
+import httpx
+from src.memory.http_client import SupabaseHTTPClient
+
+
+def make_client(handler, **kwargs):
+    return SupabaseHTTPClient(transport=httpx.MockTransport(handler), retry_backoff=0, **kwargs)
+
+
+def test_get_retries_on_5xx_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) < 3:
+            return httpx.Response(500, json={"message": "boom"})
+        return httpx.Response(200, json=[{"id": 1}])
+
+    async def run():
+        client = make_client(handler, max_retries=2)
+        response = await client.get("https://example.supabase.co/rest/v1/conversations")
+        stats = client.pool_stats()
+        await client.close()
+        return response, stats
+
+    response, stats = asyncio.run(run())
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert stats["retries_total"] == 2
+    assert stats["in_flight_requests"] == 0
+
+
+def test_post_is_not_retried_on_plain_500():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(500)
+
+    async def run():
+        client = make_client(handler, max_retries=3)
+        response = await client.post("https://example.supabase.co/rest/v1/conversations", json={})
+        await client.close()
+        return response
+
+    assert asyncio.run(run()).status_code == 500
+    assert calls == ["POST"]
+
+
+def test_connection_reset_is_retried_only_where_a_retry_cannot_duplicate_a_write():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) in (1, 3):
+            # The server may already have committed the insert when the connection drops
+            raise httpx.RemoteProtocolError("Server disconnected", request=request)
+        if len(calls) == 4:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200, json=[])
+
+    async def run():
+        client = make_client(handler, max_retries=1)
+        get_response = await client.get("https://example.supabase.co/rest/v1/conversations")
+        post_error = None
+        try:
+            await client.post("https://example.supabase.co/rest/v1/conversations", json={})
+        except httpx.RemoteProtocolError as e:
+            post_error = e
+        post_response = await client.post("https://example.supabase.co/rest/v1/conversations", json={})
+        await client.close()
+        return get_response, post_error, post_response
+
+    get_response, post_error, post_response = asyncio.run(run())
+    assert get_response.status_code == 200
+    assert post_error is not None
+    # A refused connection never sent the insert, so it is retried
+    assert post_response.status_code == 200
+    assert calls == ["GET", "GET", "POST", "POST", "POST"]
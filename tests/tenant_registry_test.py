@@ -0,0 +1,131 @@
+import asyncio
+from langchain_core.messages import HumanMessage
+from src.config.settings import settings
+from src.llm.response_cache import cache_key
+from src.memory.context_builder import SessionSummaryStore
+from src.memory.history_cache import HistoryCache
+from src.memory.memory_manager import MemoryManager
+from src.memory.tenants import TenantRegistry
+from src.memory.write_behind import WriteBehindQueue
+
+
+def test_tenants_get_their_own_pooled_manager_without_touching_settings():
+    async def run():
+        default = MemoryManager()
+        registry = TenantRegistry(max_tenants=4, default=default)
+        first = await registry.get("https://a.supabase.co", "key-a")
+        again = await registry.get("https://a.supabase.co/", "key-a")
+        other = await registry.get("https://b.supabase.co", "key-b")
+        fallback = await registry.get(None, None)
+        await registry.close()
+        return default, first, again, other, fallback
+
+    default, first, again, other, fallback = asyncio.run(run())
+    assert first is again
+    assert first is not other and first.http is not other.http
+    assert (first.supabase_url, first.supabase_key) == ("https://a.supabase.co", "key-a")
+    assert fallback is default
+    assert settings.SUPABASE_URL == default.supabase_url
+
+
+def test_least_recently_used_tenant_is_closed_when_full():
+    async def run():
+        registry = TenantRegistry(max_tenants=2, default=MemoryManager())
+        await registry.get("https://a.supabase.co", "key")
+        await registry.get("https://b.supabase.co", "key")
+        await registry.get("https://a.supabase.co", "key")
+        await registry.get("https://c.supabase.co", "key")
+        urls = [manager.supabase_url for manager in registry._tenants.values()]
+        stats = registry.stats()
+        await registry.close()
+        return urls, stats
+
+    urls, stats = asyncio.run(run())
+    assert urls == ["https://a.supabase.co", "https://c.supabase.co"]
+    assert stats["evictions"] == 1
+
+
+def test_write_behind_writes_tenant_rows_through_the_tenant_manager():
+    writes = []
+
+    class Tenant(MemoryManager):
+        async def store_long_term(self, table, data, jwt_token, return_representation=True):
+            writes.append(("tenant", [row["n"] for row in data]))
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        writes.append(("default", [row["n"] for row in data]))
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, flush_interval=0.05)
+        tenant = Tenant(supabase_url="https://a.supabase.co", supabase_key="key", tenant="a")
+        await queue.enqueue("conversations", {"n": 1}, jwt_token="t")
+        await queue.enqueue("conversations", {"n": 2}, jwt_token="t", memory=tenant)
+        await queue.enqueue("conversations", {"n": 3}, jwt_token="t", memory=tenant)
+        # Queued rows keep the tenant's manager open until they are written
+        held = tenant.holds
+        await queue.stop()
+        return held, tenant.holds
+
+    assert asyncio.run(run()) == (2, 0)
+    assert sorted(writes) == [("default", [1]), ("tenant", [2, 3])]
+
+
+def test_a_held_tenant_is_not_closed_and_a_closed_pool_is_not_reopened():
+    async def run():
+        registry = TenantRegistry(max_tenants=1, default=MemoryManager())
+        busy = await registry.get("https://a.supabase.co", "key")
+        release = busy.hold()
+        await registry.get("https://b.supabase.co", "key")
+        kept = [manager.supabase_url for manager in registry._tenants.values()]
+        release()
+        release()
+        await registry.get("https://c.supabase.co", "key")
+        evicted = [manager.supabase_url for manager in registry._tenants.values()]
+        await registry.close()
+        try:
+            busy.http.client
+        except RuntimeError:
+            return kept, evicted, busy.holds, True
+        return kept, evicted, busy.holds, False
+
+    kept, evicted, holds, refused = asyncio.run(run())
+    # The held tenant survived while the registry was over its limit, then went once released
+    assert kept == ["https://a.supabase.co", "https://b.supabase.co"]
+    assert evicted == ["https://c.supabase.co"]
+    assert holds == 0 and refused
+
+
+def test_tenants_get_their_own_cache_namespace():
+    tenant = TenantRegistry.tenant("https://a.supabase.co")
+    assert HistoryCache.key("u1", "s1") == "history:u1:s1"
+    assert HistoryCache.key("u1", "s1", tenant) == f"history:{tenant}:u1:s1"
+    assert SessionSummaryStore.key("u1", "s1", tenant) != SessionSummaryStore.key("u1", "s1")
+    messages = [HumanMessage(content="hi")]
+    assert cache_key("gpt", {}, messages, tenant) != cache_key("gpt", {}, messages)
+
+
+def test_concurrent_evictions_close_each_idle_tenant_once():
+    closed = []
+
+    async def run():
+        registry = TenantRegistry(max_tenants=2, default=MemoryManager())
+        for url in ("https://a.supabase.co", "https://b.supabase.co"):
+            manager = await registry.get(url, "key")
+            original_close = manager.close
+
+            async def slow_close(manager=manager, original_close=original_close):
+                await asyncio.sleep(0.01)
+                closed.append(manager.supabase_url)
+                await original_close()
+
+            manager.close = slow_close
+        opened = await asyncio.gather(registry.get("https://c.supabase.co", "key"),
+                                      registry.get("https://d.supabase.co", "key"))
+        kept = [manager.supabase_url for manager in registry._tenants.values()]
+        await registry.close()
+        return [manager.supabase_url for manager in opened], kept, registry.stats()["evictions"]
+
+    opened, kept, evictions = asyncio.run(run())
+    assert opened == kept == ["https://c.supabase.co", "https://d.supabase.co"]
+    assert sorted(closed) == ["https://a.supabase.co", "https://b.supabase.co"]
+    assert evictions == 2
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from src.memory.memory_manager import SupabaseError
+from src.memory.write_behind import WriteBehindQueue
+
+
+def test_rows_are_batched_per_token_and_keep_order():
+    writes = []
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        writes.append((table, jwt_token, [row["n"] for row in data]))
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, batch_size=10, flush_interval=0.05)
+        for n in range(5):
+            await queue.enqueue("conversations", {"n": n}, jwt_token="a" if n % 2 == 0 else "b")
+        await queue.stop()
+
+    asyncio.run(run())
+    assert writes == [("conversations", "a", [0, 2, 4]), ("conversations", "b", [1, 3])]
+
+
+def test_durable_enqueue_waits_for_the_write_and_retries():
+    attempts = []
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        attempts.append(len(data))
+        if len(attempts) == 1:
+            raise SupabaseError("Failed to store in Supabase: upstream unavailable", 503)
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, flush_interval=0, max_retries=2, retry_backoff=0)
+        await queue.enqueue("conversations", {"n": 1}, jwt_token="a", durable=True)
+        written = queue.rows_written
+        await queue.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+    assert attempts == [1, 1]
+
+
+def test_failed_rows_are_dropped_and_reported():
+    failures = []
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        raise Exception("down")
+
+    async def on_failure(table, rows, memory):
+        failures.append(rows)
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, flush_interval=0, max_retries=1, retry_backoff=0, on_failure=on_failure)
+        await queue.enqueue("conversations", {"n": 1}, jwt_token="a")
+        await queue.stop()
+        return queue.rows_dropped
+
+    assert asyncio.run(run()) == 1
+    assert failures == [[{"n": 1}]]
+
+
+def test_rejected_bulk_insert_is_not_retried_and_drops_only_the_bad_row():
+    attempts = []
+    failures = []
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        attempts.append([row["n"] for row in data])
+        if any(row["n"] == 1 for row in data):
+            raise SupabaseError("Failed to store in Supabase: null value in column", 400)
+
+    async def on_failure(table, rows, memory):
+        failures.append(rows)
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, batch_size=10, flush_interval=0.05, max_retries=3,
+                                 retry_backoff=0, on_failure=on_failure)
+        for n in range(3):
+            await queue.enqueue("conversations", {"n": n}, jwt_token="a")
+        await queue.stop()
+        return queue.rows_written, queue.rows_dropped
+
+    assert asyncio.run(run()) == (2, 1)
+    # One rejected bulk insert, then each row once: the 400 itself is never retried
+    assert attempts == [[0, 1, 2], [0], [1], [2]]
+    assert failures == [[{"n": 1}]]
+
+
+def test_a_group_backing_off_does_not_hold_up_other_groups():
+    writes = []
+    failed_once = set()
+
+    async def writer(table, data, jwt_token, return_representation=True):
+        if jwt_token == "a" and "a" not in failed_once:
+            failed_once.add("a")
+            raise SupabaseError("Failed to store in Supabase: upstream unavailable", 503)
+        writes.append((jwt_token, [row["n"] for row in data]))
+
+    async def run():
+        queue = WriteBehindQueue(writer=writer, flush_interval=0, max_retries=2, retry_backoff=0.3)
+        await queue.enqueue("conversations", {"n": 1}, jwt_token="a")
+        await asyncio.sleep(0.05)
+        started_at = time.perf_counter()
+        await queue.enqueue("conversations", {"n": 2}, jwt_token="b", durable=True)
+        elapsed = time.perf_counter() - started_at
+        # Queued behind the write that is backing off, so it still lands after it
+        await queue.enqueue("conversations", {"n": 3}, jwt_token="a")
+        await queue.stop()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.2
+    assert writes == [("b", [2]), ("a", [1]), ("a", [3])]